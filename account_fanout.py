@@ -0,0 +1,189 @@
+"""
+یک موتور سیگنال، چند حساب: سیگنال ورود یک بار محاسبه می‌شود و به workerهای
+اجرای هر حساب ارسال می‌شود. هر worker یک پروسه مستقل با ترمینال MT5 خودش است،
+حجم را با calculate_volume_by_risk و ریسک همان حساب محاسبه می‌کند و نتیجه
+(fill) را به پروسه اصلی گزارش می‌دهد. سفارش همه حساب‌ها هم‌زمان ارسال می‌شود.
+"""
+import multiprocessing as mp
+import queue
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from typing import Optional, Dict, Any, List
+
+from metatrader5_config import ACCOUNTS_CONFIG, TRADING_CONFIG, MT5_CONFIG
+
+
+@dataclass
+class EntrySignal:
+    symbol: str
+    direction: str              # 'buy' یا 'sell'
+    fib1: float                 # SL پایه؛ هر حساب فاصله را نسبت به قیمت ورود خودش اصلاح می‌کند
+    comment: str = ""
+    fib_levels: Optional[Dict[str, float]] = None
+    signal_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    created_ts: float = field(default_factory=time.time)
+
+
+def _fill(account_name, sig, status, **extra) -> Dict[str, Any]:
+    return {
+        'account': account_name,
+        'signal_id': sig['signal_id'] if sig else None,
+        'symbol': sig['symbol'] if sig else None,
+        'direction': sig['direction'] if sig else None,
+        'status': status,
+        'reported_ts': time.time(),
+        'latency_ms': (time.time() - sig['created_ts']) * 1000.0 if sig else None,
+        **extra,
+    }
+
+
+def _account_worker(account: Dict[str, Any], signal_q, fill_q) -> None:
+    """
+    حلقه‌ی اجرای یک حساب (در پروسه جداگانه اجرا می‌شود). سفارش‌ها بدون TP باز می‌شوند،
+    پس بین سیگنال‌ها (هر manage_interval_sec) پوزیشن‌های همه نمادهای این حساب مثل حساب
+    اصلی با manage_open_positions مدیریت می‌شوند.
+    """
+    import MetaTrader5 as mt5
+    from mt5_connector import MT5Connector
+    from strategy import manage_open_positions
+
+    name = account.get('name') or str(account.get('login'))
+    session = MT5Connector()
+    if not session.initialize(path=account.get('path'), login=account.get('login'),
+                              password=account.get('password'), server=account.get('server')):
+        fill_q.put(_fill(name, None, 'init_failed', error=str(mt5.last_error())))
+        return
+    fill_q.put(_fill(name, None, 'ready'))
+
+    def log(message, color=None, **_):
+        print(f"[{name}] {message}")
+
+    risk_pct = float(account.get('risk_percent', 1.0)) / 100.0
+    manage_interval = float(ACCOUNTS_CONFIG.get('manage_interval_sec', 0.5))
+    # پوزیشن‌های نماد اصلی از همان ابتدا (مثلاً بعد از restart) مدیریت می‌شوند
+    conns: Dict[str, MT5Connector] = {MT5_CONFIG['symbol']: MT5Connector(MT5_CONFIG['symbol'])}
+    position_states: Dict[str, Dict[int, Dict[str, Any]]] = {MT5_CONFIG['symbol']: {}}
+    while True:
+        try:
+            sig = signal_q.get(timeout=manage_interval)
+        except queue.Empty:
+            sig = False
+        if sig is None:
+            break
+        if sig:
+            _execute_signal(name, sig, conns, position_states, risk_pct, fill_q)
+        for symbol, conn in conns.items():
+            try:
+                manage_open_positions(conn, position_states[symbol], log)
+            except Exception as e:
+                log(f"⚠️ Position management failed for {symbol}: {e}")
+
+    session.shutdown()
+
+
+def _execute_signal(name, sig, conns, position_states, risk_pct, fill_q) -> None:
+    """اجرای یک سیگنال روی این حساب و گزارش نتیجه (fill)."""
+    import MetaTrader5 as mt5
+    from mt5_connector import MT5Connector
+    from strategy import resolve_entry_stop, blocking_position_reason
+
+    try:
+        conn = conns.get(sig['symbol'])
+        if conn is None:
+            conn = conns[sig['symbol']] = MT5Connector(sig['symbol'])
+            position_states[sig['symbol']] = {}
+
+        if TRADING_CONFIG.get('prevent_multiple_positions', True):
+            skip_reason = blocking_position_reason(conn.get_positions(), sig['direction'],
+                                                   TRADING_CONFIG.get('position_check_mode', 'all'))
+            if skip_reason:
+                fill_q.put(_fill(name, sig, 'skipped', reason=skip_reason))
+                return
+
+        tick = mt5.symbol_info_tick(sig['symbol'])
+        if not tick:
+            fill_q.put(_fill(name, sig, 'failed', reason='no tick'))
+            return
+        entry = tick.ask if sig['direction'] == 'buy' else tick.bid
+        stop, skip_msg = resolve_entry_stop(sig['direction'], entry, sig['fib1'],
+                                            pip_size=conn.pip_size(), min_dist=conn.min_stop_distance())
+        if stop is None:
+            fill_q.put(_fill(name, sig, 'skipped', reason=skip_msg))
+            return
+
+        open_position = conn.open_buy_position if sig['direction'] == 'buy' else conn.open_sell_position
+        result = open_position(tick=tick, sl=stop, tp=None, comment=sig['comment'], risk_pct=risk_pct)
+        retcode = getattr(result, 'retcode', None)
+        fill_q.put(_fill(
+            name, sig, 'filled' if retcode == 10009 else 'failed',
+            retcode=retcode,
+            ticket=getattr(result, 'order', None),
+            price=getattr(result, 'price', None),
+            volume=getattr(result, 'volume', None),
+            sl=stop,
+            comment=getattr(result, 'comment', None),
+        ))
+    except Exception as e:
+        fill_q.put(_fill(name, sig, 'failed', reason=str(e)))
+
+
+class AccountFanout:
+    """مدیریت workerهای حساب‌ها: انتشار سیگنال و جمع‌آوری fillها."""
+
+    def __init__(self, accounts: Optional[List[Dict[str, Any]]] = None, queue_size: Optional[int] = None):
+        self.accounts = accounts if accounts is not None else ACCOUNTS_CONFIG.get('accounts', [])
+        self.queue_size = queue_size or ACCOUNTS_CONFIG.get('queue_size', 100)
+        self._ctx = mp.get_context('spawn')  # MT5 روی ویندوز؛ هر پروسه ماژول MetaTrader5 خودش را دارد
+        self._fill_q = self._ctx.Queue()
+        self._workers = []  # (name, process, signal_queue)
+
+    def start(self) -> None:
+        for account in self.accounts:
+            name = account.get('name') or str(account.get('login'))
+            signal_q = self._ctx.Queue(maxsize=self.queue_size)
+            proc = self._ctx.Process(target=_account_worker, args=(account, signal_q, self._fill_q),
+                                     name=f"account-{name}", daemon=True)
+            proc.start()
+            self._workers.append((name, proc, signal_q))
+
+    def publish(self, signal: EntrySignal) -> int:
+        """سیگنال را به صف همه workerهای زنده می‌فرستد؛ تعداد حساب‌های دریافت‌کننده برمی‌گردد."""
+        payload = asdict(signal)
+        sent = 0
+        for name, proc, signal_q in self._workers:
+            if not proc.is_alive():
+                continue
+            try:
+                signal_q.put_nowait(payload)
+                sent += 1
+            except queue.Full:
+                self._fill_q.put(_fill(name, payload, 'dropped', reason='signal queue full'))
+        return sent
+
+    def drain_fills(self, timeout: float = 0.0) -> List[Dict[str, Any]]:
+        """fillهای رسیده را برمی‌گرداند (بدون انتظار مگر timeout داده شود)."""
+        fills = []
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    fills.append(self._fill_q.get(timeout=remaining))
+                else:
+                    fills.append(self._fill_q.get_nowait())
+            except queue.Empty:
+                return fills
+
+    def stop(self, timeout: float = 10.0) -> None:
+        for _, proc, signal_q in self._workers:
+            if proc.is_alive():
+                try:
+                    signal_q.put(None, timeout=1.0)
+                except queue.Full:
+                    pass
+        for _, proc, _ in self._workers:
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+        self._workers = []
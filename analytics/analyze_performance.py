@@ -32,12 +32,17 @@ class TradingAnalyzer:
         self.trades_df = None
         self.combined_df = None
         
+    def _csv_files(self, subdir):
+        """CSVها به همراه نسخه‌های فشرده شده توسط housekeeping (.gz/.zst)"""
+        d = self.data_path / subdir
+        return sorted(f for pattern in ("*.csv", "*.csv.gz", "*.csv.zst") for f in d.glob(pattern))
+
     def load_data(self):
         """بارگذاری تمام فایل‌های CSV"""
         print("📊 Loading trading data...")
         
         # بارگذاری سیگنال‌ها
-        signals_files = list(self.data_path.glob("raw/trades_dir/*.csv"))
+        signals_files = self._csv_files("raw/trades_dir")
         if signals_files:
             signals_list = [pd.read_csv(f) for f in signals_files]
             self.signals_df = pd.concat(signals_list, ignore_index=True)
@@ -45,7 +50,7 @@ class TradingAnalyzer:
             print(f"✅ Loaded {len(self.signals_df)} signals from {len(signals_files)} files")
         
         # بارگذاری معاملات
-        trades_files = list(self.data_path.glob("raw/trades_dir/*.csv"))
+        trades_files = self._csv_files("raw/trades_dir")
         if trades_files:
             trades_list = [pd.read_csv(f) for f in trades_files]
             self.trades_df = pd.concat(trades_list, ignore_index=True)
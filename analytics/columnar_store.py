@@ -0,0 +1,193 @@
+"""
+ذخیره‌سازی ستونی تیک‌ها (جایگزین/مکمل CSV روزانه MARKET_DIR).
+
+ساختار روی دیسک:
+    <root>/<SYMBOL>/<YYYY-MM-DD>/meta.json
+    <root>/<SYMBOL>/<YYYY-MM-DD>/chunk_<first_ns>_<last_ns>_<writer>_<seq>.parquet      (اگر pyarrow نصب باشد)
+    <root>/<SYMBOL>/<YYYY-MM-DD>/chunk_<first_ns>_<last_ns>_<writer>_<seq>/<col>.npy   (در غیر این صورت)
+
+ستون‌ها: time_ns (int64، epoch-ns UTC)، bid، ask، last (float64). مقادیر ثابت
+مثل point/digits فقط یک بار در meta.json ذخیره می‌شوند. بازه‌ی زمانی هر chunk
+در نام آن است تا خواننده بدون باز کردن فایل‌ها chunkهای لازم را انتخاب کند؛ شناسه
+writer و شماره chunk نام را یکتا می‌کنند (دو chunk با بازه یکسان، مثلاً تیک‌های
+دوباره ثبت‌شده بعد از restart، هرگز روی هم نوشته نمی‌شوند).
+"""
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow اختیاری است
+    pa = None
+    pq = None
+
+COLUMNS = ("time_ns", "bid", "ask", "last")
+_DTYPES = {"time_ns": np.int64, "bid": np.float64, "ask": np.float64, "last": np.float64}
+
+
+def default_backend() -> str:
+    return "parquet" if pq is not None else "npy"
+
+
+def _day_of(time_ns: int) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(time_ns / 1e9))
+
+
+class ColumnarTickWriter:
+    """بافر تیک‌های یک نماد؛ هر chunk_rows ردیف یا در تغییر روز یک chunk نوشته می‌شود."""
+
+    def __init__(self, root, symbol: str, chunk_rows: int = 50000, backend: Optional[str] = None,
+                 max_chunk_age_sec: float = 600.0):
+        self.root = Path(root)
+        self.symbol = symbol
+        self.chunk_rows = int(chunk_rows)
+        self.backend = backend or default_backend()
+        if self.backend == "parquet" and pq is None:
+            self.backend = "npy"
+        self.max_chunk_age_sec = max_chunk_age_sec
+        self.writer_id = uuid.uuid4().hex[:8]
+        self._day = None
+        self._meta = None
+        self._buf = {c: [] for c in COLUMNS}
+        self._first_append = None
+        self.rows_written = 0
+        self.chunks_written = 0
+
+    def __len__(self):
+        return len(self._buf["time_ns"])
+
+    def append(self, time_ns: int, bid, ask, last=None, meta: Optional[dict] = None) -> None:
+        day = _day_of(time_ns)
+        if self._day is not None and day != self._day:
+            self.flush()
+        self._day = day
+        if meta:
+            self._meta = meta
+        if self._first_append is None:
+            self._first_append = time.monotonic()
+        self._buf["time_ns"].append(int(time_ns))
+        self._buf["bid"].append(np.nan if bid is None else bid)
+        self._buf["ask"].append(np.nan if ask is None else ask)
+        self._buf["last"].append(np.nan if last is None else last)
+        if len(self) >= self.chunk_rows or time.monotonic() - self._first_append >= self.max_chunk_age_sec:
+            self.flush()
+
+    def flush_if_stale(self) -> Optional[Path]:
+        if self._first_append is not None and time.monotonic() - self._first_append >= self.max_chunk_age_sec:
+            return self.flush()
+        return None
+
+    def flush(self) -> Optional[Path]:
+        if not len(self):
+            return None
+        cols = {c: np.asarray(self._buf[c], dtype=_DTYPES[c]) for c in COLUMNS}
+        if np.any(np.diff(cols["time_ns"]) < 0):
+            order = np.argsort(cols["time_ns"], kind="stable")
+            cols = {c: v[order] for c, v in cols.items()}
+        day_dir = self.root / self.symbol / self._day
+        day_dir.mkdir(parents=True, exist_ok=True)
+        meta_path = day_dir / "meta.json"
+        if self._meta and not meta_path.exists():
+            meta_path.write_text(json.dumps({"symbol": self.symbol, **self._meta}), encoding="utf-8")
+        seq = self.chunks_written
+        suffix = ".parquet" if self.backend == "parquet" else ""
+        while True:
+            name = f"chunk_{cols['time_ns'][0]}_{cols['time_ns'][-1]}_{self.writer_id}_{seq}"
+            final = day_dir / f"{name}{suffix}"
+            if not final.exists():
+                break
+            seq += 1
+        if self.backend == "parquet":
+            tmp = day_dir / f".{name}.parquet.tmp"
+            pq.write_table(pa.table(cols), tmp)
+            os.replace(tmp, final)
+        else:
+            tmp = day_dir / f".{name}.tmp"
+            tmp.mkdir(exist_ok=True)
+            for c, v in cols.items():
+                np.save(tmp / f"{c}.npy", v)
+            os.replace(tmp, final)
+        self.rows_written += len(cols["time_ns"])
+        self.chunks_written += 1
+        self._buf = {c: [] for c in COLUMNS}
+        self._first_append = None
+        return final
+
+
+def _chunk_span(p: Path):
+    # chunk_<first_ns>_<last_ns>[_<writer>_<seq>]
+    parts = p.name.split(".")[0].split("_")
+    return int(parts[1]), int(parts[2])
+
+
+def list_chunks(root, symbol: str, start_ns: Optional[int] = None, end_ns: Optional[int] = None) -> List[Path]:
+    """chunkهایی که با بازه [start_ns, end_ns] هم‌پوشانی دارند، به ترتیب زمان."""
+    sym_dir = Path(root) / symbol
+    if not sym_dir.exists():
+        return []
+    start_day = _day_of(start_ns) if start_ns is not None else None
+    end_day = _day_of(end_ns) if end_ns is not None else None
+    chunks = []
+    for day_dir in sorted(sym_dir.iterdir()):
+        if not day_dir.is_dir():
+            continue
+        if (start_day and day_dir.name < start_day) or (end_day and day_dir.name > end_day):
+            continue
+        for p in day_dir.glob("chunk_*"):
+            first, last = _chunk_span(p)
+            if (start_ns is not None and last < start_ns) or (end_ns is not None and first > end_ns):
+                continue
+            parts = p.name.split(".")[0].split("_")
+            seq = int(parts[4]) if len(parts) > 4 else 0
+            chunks.append((first, seq, p))
+    return [p for _, _, p in sorted(chunks)]
+
+
+def _read_chunk(p: Path, columns: Sequence[str]) -> Dict[str, np.ndarray]:
+    if p.suffix == ".parquet":
+        if pq is None:
+            raise ImportError(f"pyarrow is required to read {p}")
+        table = pq.read_table(p, columns=list(columns), memory_map=True)
+        return {c: table.column(c).to_numpy() for c in columns}
+    return {c: np.load(p / f"{c}.npy", mmap_mode="r") for c in columns}
+
+
+def read_ticks_range(root, symbol: str, start_ns: Optional[int] = None, end_ns: Optional[int] = None,
+                     columns: Sequence[str] = COLUMNS) -> Dict[str, np.ndarray]:
+    """
+    تیک‌های بازه [start_ns, end_ns] به صورت dict از آرایه‌های NumPy.
+    اگر فقط یک chunk درگیر باشد خروجی برش zero-copy از فایل memory-mapped است.
+    """
+    columns = list(dict.fromkeys(["time_ns", *columns]))
+    parts = []
+    for p in list_chunks(root, symbol, start_ns, end_ns):
+        data = _read_chunk(p, columns)
+        t = data["time_ns"]
+        lo = 0 if start_ns is None else int(np.searchsorted(t, start_ns, side="left"))
+        hi = len(t) if end_ns is None else int(np.searchsorted(t, end_ns, side="right"))
+        if hi > lo:
+            parts.append({c: v[lo:hi] for c, v in data.items()})
+    if not parts:
+        return {c: np.empty(0, dtype=_DTYPES.get(c, np.float64)) for c in columns}
+    if len(parts) == 1:
+        return parts[0]
+    return {c: np.concatenate([part[c] for part in parts]) for c in columns}
+
+
+def read_meta(root, symbol: str, day: str) -> dict:
+    p = Path(root) / symbol / day / "meta.json"
+    return json.loads(p.read_text(encoding="utf-8")) if p.exists() else {}
+
+
+def to_dataframe(ticks: Dict[str, np.ndarray]):
+    import pandas as pd
+    df = pd.DataFrame({c: v for c, v in ticks.items() if c != "time_ns"})
+    df.insert(0, "time", pd.to_datetime(ticks["time_ns"], unit="ns", utc=True))
+    return df
@@ -1,14 +1,16 @@
-import os, csv
-from datetime import datetime, timezone, timedelta
+import os, csv, time, queue, threading, atexit
 from pathlib import Path
 from typing import Optional
 
+from housekeeping import max_log_bytes, rotate_file
+
 ROOT = Path(__file__).resolve().parents[1]  # trading_project2
 RAW_DIR = ROOT / "trading-analytics-logger" / "data" / "raw"
 MARKET_DIR = RAW_DIR / "market"
 SIGNAL_DIR = RAW_DIR / "signals"
 TRADE_DIR  = RAW_DIR / "trades"
 EVENT_DIR  = RAW_DIR / "events"  # جدید: رویدادهای مدیریت ریسک / تغییر SL/TP
+COLUMNAR_DIR = RAW_DIR / "market_columnar"  # تیک‌ها به صورت ستونی (analytics.columnar_store)
 
 def _ensure_dirs():
     """Ensure required directories exist. If a file collides with a directory
@@ -40,57 +42,265 @@ def _ensure_dirs():
 # Perform a safe one-time ensure at import
 _ensure_dirs()
 
-def _iran_now_str():
-    tehran = timezone(timedelta(hours=3, minutes=30))
-    return datetime.now(tehran).strftime("%Y-%m-%d %H:%M:%S")
+# ---------- Background CSV writer ----------
+# مسیر داغ (ترید) فقط یک enqueue انجام می‌دهد؛ یک thread جداگانه فایل‌ها را باز
+# نگه می‌دارد، ردیف‌ها را دسته‌ای می‌نویسد و بر اساس تعداد/زمان flush می‌کند.
+QUEUE_MAXSIZE = 10000       # ردیف‌های بیشتر از این drop می‌شوند (ترید هرگز block نمی‌شود)
+FLUSH_ROWS = 200            # flush بعد از این تعداد ردیف
+FLUSH_INTERVAL_SEC = 2.0    # یا بعد از این مدت
+IRAN_OFFSET_SEC = 3 * 3600 + 30 * 60
+
+# ذخیره تیک‌ها: 'csv' (پیش‌فرض قبلی)، 'columnar' (Parquet/NPY در COLUMNAR_DIR) یا 'both'
+MARKET_STORAGE = "csv"
+COLUMNAR_CHUNK_ROWS = 50000
+
+# kind -> (نام متغیر دایرکتوری، پسوند نام فایل)
+_KINDS = {
+    "market": ("MARKET_DIR", "ticks"),
+    "signals": ("SIGNAL_DIR", "signals"),
+    "trades": ("TRADE_DIR", "trades"),
+    "events": ("EVENT_DIR", "position_events"),
+}
+
+_STOP = object()
+
+
+def _fmt_utc(ts: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts))
+
 
-def _utc_now_str():
-    return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+def _fmt_iran(ts: float) -> str:
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts + IRAN_OFFSET_SEC))
 
-def _append_csv(fp: Path, headers: list[str], row: dict):
-    file_exists = fp.exists()
-    with fp.open("a", newline="", encoding="utf-8") as f:
+
+class _AsyncCsvWriter:
+    def __init__(self, maxsize=QUEUE_MAXSIZE, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL_SEC):
+        self._q = queue.Queue(maxsize=maxsize)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._handles = {}      # (kind, symbol) -> [path, file, DictWriter]
+        self._columnar = {}     # symbol -> ColumnarTickWriter
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.errors = 0
+        self.rotations = 0
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="analytics-csv-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def submit(self, kind: str, symbol: str, headers: list[str], row: dict, ts: float):
+        self._ensure_started()
+        try:
+            self._q.put_nowait((kind, symbol, headers, row, ts))
+            self.enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _handle_for(self, kind, symbol, headers, ts):
+        dir_name, suffix = _KINDS[kind]
+        day = time.strftime("%Y-%m-%d", time.gmtime(ts))
+        fp = globals()[dir_name] / f"{symbol}_{suffix}_{day}.csv"
+        key = (kind, symbol)
+        h = self._handles.get(key)
+        if h is not None and h[0] == fp:
+            return h[2]
+        if h is not None:  # روز عوض شده
+            h[1].close()
+        file_exists = fp.exists() and fp.stat().st_size > 0
+        f = fp.open("a", newline="", encoding="utf-8")
         w = csv.DictWriter(f, fieldnames=headers, extrasaction="ignore")
         if not file_exists:
             w.writeheader()
-        w.writerow(row)
+        self._handles[key] = [fp, f, w]
+        return w
+
+    def _write_columnar(self, symbol, row):
+        from analytics.columnar_store import ColumnarTickWriter
+        w = self._columnar.get(symbol)
+        if w is None:
+            w = self._columnar[symbol] = ColumnarTickWriter(COLUMNAR_DIR, symbol, chunk_rows=COLUMNAR_CHUNK_ROWS)
+        time_ns, bid, ask, last, meta = row
+        w.append(time_ns, bid, ask, last, meta=meta)
+
+    def _write(self, item):
+        kind, symbol, headers, row, ts = item
+        if kind == "market_columnar":
+            try:
+                self._write_columnar(symbol, row)
+                self.written += 1
+            except Exception as e:
+                self.errors += 1
+                print(f"[analytics.hooks] columnar write error ({symbol}): {e}")
+            return
+        try:
+            row["dt_utc"] = _fmt_utc(ts)
+            row["dt_iran"] = _fmt_iran(ts)
+            self._handle_for(kind, symbol, headers, ts).writerow(row)
+            self.written += 1
+            self._pending += 1
+        except Exception as e:
+            self.errors += 1
+            print(f"[analytics.hooks] write error ({kind}/{symbol}): {e}")
+
+    def _flush(self):
+        max_bytes = max_log_bytes()
+        for key, (fp, f, _) in list(self._handles.items()):
+            try:
+                f.flush()
+                if f.tell() >= max_bytes:
+                    # چرخش بر اساس حجم؛ نوشتن بعدی فایل جدید با header باز می‌کند
+                    f.close()
+                    del self._handles[key]
+                    rotate_file(fp)
+                    self.rotations += 1
+            except Exception:
+                self.errors += 1
+        for w in self._columnar.values():
+            try:
+                w.flush_if_stale()
+            except Exception:
+                self.errors += 1
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self.flushes += 1
+
+    def _run(self):
+        stop = False
+        while not stop:
+            try:
+                item = self._q.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+            batch = []
+            while item is not None:
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+                if len(batch) >= self.flush_rows:
+                    break
+                try:
+                    item = self._q.get_nowait()
+                except queue.Empty:
+                    item = None
+            for it in batch:
+                self._write(it)
+            if (self._pending or self._columnar) and (stop or self._pending >= self.flush_rows
+                                  or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush()
+        for _, f, _ in self._handles.values():
+            try:
+                f.close()
+            except Exception:
+                pass
+        self._handles.clear()
+        for w in self._columnar.values():
+            try:
+                w.flush()
+            except Exception:
+                self.errors += 1
+        self._columnar.clear()
+
+    def close(self, timeout: float = 5.0):
+        """همه ردیف‌های صف را می‌نویسد و فایل‌ها را می‌بندد (در خروج برنامه هم صدا زده می‌شود)."""
+        t = self._thread
+        if t is None or not t.is_alive():
+            return
+        try:
+            self._q.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return
+        t.join(timeout)
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._q.qsize(),
+            "queue_capacity": self._q.maxsize,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "errors": self.errors,
+            "open_files": len(self._handles),
+            "rotations": self.rotations,
+            "columnar_buffered": sum(len(w) for w in self._columnar.values()),
+        }
+
+
+_writer = _AsyncCsvWriter()
+
+
+def writer_stats() -> dict:
+    """متریک‌های writer: عمق صف، ردیف‌های drop شده و ..."""
+    return _writer.stats()
+
+
+def flush_and_close(timeout: float = 5.0):
+    _writer.close(timeout)
+
+
+_MARKET_HEADERS = [
+    "dt_utc","dt_iran","symbol","bid","ask","last",
+    "spread_points","spread_pips","point","digits","source","session"
+]
+_SIGNAL_HEADERS = [
+    "dt_utc","dt_iran","symbol","strategy","direction","rr","entry","sl","tp",
+    "fib_0","fib_0705","fib_09","fib_1","confidence","features_json","note"
+]
+_TRADE_HEADERS = [
+    "dt_utc","dt_iran","symbol","side","req_price","req_vol","req_deviation","req_filling",
+    "retcode","order","deal","result_price","result_comment","sl","tp","magic","reason","risk_abs"
+]
+_EVENT_HEADERS = [
+    "dt_utc","dt_iran","symbol","ticket","event","direction","stage","entry","current_price",
+    "sl","tp","risk_abs","profit_R","locked_R","volume","note"
+]
 
-def log_market(symbol: str, bid: float, ask: float, last: Optional[float], point: float, digits: int, source="mt5", session="bot"):
+def log_market(symbol: str, bid: float, ask: float, last: Optional[float], point: float, digits: int, source="mt5", session="bot",
+               tick_time_msc: Optional[int] = None):
+    ts = time.time()
+    if MARKET_STORAGE in ("columnar", "both"):
+        time_ns = int(tick_time_msc) * 1_000_000 if tick_time_msc else int(ts * 1e9)
+        meta = {"point": point, "digits": digits, "source": source, "session": session}
+        _writer.submit("market_columnar", symbol, None, (time_ns, bid, ask, last, meta), ts)
+        if MARKET_STORAGE == "columnar":
+            return
     # 1 pip = 0.01 for 2/3 digits, else 0.0001
     pip = 0.01 if digits in (2,3) else 0.0001
     spread_points = (ask - bid) / point if (ask and bid and point) else None
     spread_pips = (ask - bid) / pip if (ask and bid) else None
     row = {
-        "dt_utc": _utc_now_str(),
-        "dt_iran": _iran_now_str(),
         "symbol": symbol,
         "bid": bid, "ask": ask, "last": last,
         "spread_points": spread_points, "spread_pips": spread_pips,
         "point": point, "digits": digits,
         "source": source, "session": session
     }
-    fp = MARKET_DIR / f"{symbol}_ticks_{datetime.utcnow():%Y-%m-%d}.csv"
-    _append_csv(fp, [
-        "dt_utc","dt_iran","symbol","bid","ask","last",
-        "spread_points","spread_pips","point","digits","source","session"
-    ], row)
+    _writer.submit("market", symbol, _MARKET_HEADERS, row, ts)
 
 def log_signal(symbol: str, strategy: str, direction: str, rr: float, entry: float, sl: float, tp: float,
                fib: Optional[dict]=None, confidence: Optional[float]=None, features_json: Optional[str]=None, note: Optional[str]=None):
     fib = fib or {}
     row = {
-        "dt_utc": _utc_now_str(),
-        "dt_iran": _iran_now_str(),
         "symbol": symbol, "strategy": strategy, "direction": direction, "rr": rr,
         "entry": entry, "sl": sl, "tp": tp,
         "fib_0": fib.get("0.0"), "fib_0705": fib.get("0.705"), "fib_09": fib.get("0.9"), "fib_1": fib.get("1.0"),
         "confidence": confidence, "features_json": features_json, "note": note
     }
-    fp = SIGNAL_DIR / f"{symbol}_signals_{datetime.utcnow():%Y-%m-%d}.csv"
-    _append_csv(fp, [
-        "dt_utc","dt_iran","symbol","strategy","direction","rr","entry","sl","tp",
-        "fib_0","fib_0705","fib_09","fib_1","confidence","features_json","note"
-    ], row)
+    _writer.submit("signals", symbol, _SIGNAL_HEADERS, row, time.time())
 
 def log_trade(symbol: str, side: str, request: dict, result, reason: str=""):
     # result می‌تواند آبجکت MT5 یا dict باشد
@@ -110,8 +320,6 @@ def log_trade(symbol: str, side: str, request: dict, result, reason: str=""):
         risk_abs = None
 
     row = {
-        "dt_utc": _utc_now_str(),
-        "dt_iran": _iran_now_str(),
         "symbol": symbol, "side": side,
         "req_price": req_price, "req_vol": request.get("volume"),
         "req_deviation": request.get("deviation"), "req_filling": request.get("type_filling"),
@@ -121,11 +329,7 @@ def log_trade(symbol: str, side: str, request: dict, result, reason: str=""):
         "magic": request.get("magic"), "reason": reason,
         "risk_abs": risk_abs
     }
-    fp = TRADE_DIR / f"{symbol}_trades_{datetime.utcnow():%Y-%m-%d}.csv"
-    _append_csv(fp, [
-        "dt_utc","dt_iran","symbol","side","req_price","req_vol","req_deviation","req_filling",
-        "retcode","order","deal","result_price","result_comment","sl","tp","magic","reason","risk_abs"
-    ], row)
+    _writer.submit("trades", symbol, _TRADE_HEADERS, row, time.time())
 
 def log_position_event(symbol: str, ticket: int, event: str, direction: str, entry: float, current_price: float,
                         sl: float, tp: float, profit_R: float | None, stage: int | None, risk_abs: float | None,
@@ -138,14 +342,7 @@ def log_position_event(symbol: str, ticket: int, event: str, direction: str, ent
     locked_R: اگر بخشی از سود قفل شده (مثلاً 0.5R) ثبت شود.
     stage: مرحله مدیریت (0=initial,1=breakeven,2=trail / extend ...)
     """
-    fp = EVENT_DIR / f"{symbol}_position_events_{datetime.utcnow():%Y-%m-%d}.csv"
-    headers = [
-        "dt_utc","dt_iran","symbol","ticket","event","direction","stage","entry","current_price",
-        "sl","tp","risk_abs","profit_R","locked_R","volume","note"
-    ]
     row = {
-        "dt_utc": _utc_now_str(),
-        "dt_iran": _iran_now_str(),
         "symbol": symbol,
         "ticket": ticket,
         "event": event,
@@ -161,4 +358,4 @@ def log_position_event(symbol: str, ticket: int, event: str, direction: str, ent
         "volume": volume,
         "note": note
     }
-    _append_csv(fp, headers, row)
\ No newline at end of file
+    _writer.submit("events", symbol, _EVENT_HEADERS, row, time.time())
\ No newline at end of file
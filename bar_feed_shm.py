@@ -0,0 +1,188 @@
+"""
+انتشار پنجره‌ی OHLC و آخرین تیک ربات در multiprocessing.shared_memory.
+
+پروسه‌های محلی دیگر (تحلیل، استراتژی سایه، UI مانیتورینگ) بدون باز کردن
+سشن MT5 جدید یا خواندن CSV به همان داده‌ای که ربات می‌بیند دسترسی دارند.
+سازگاری خواندن با یک seqlock تضمین می‌شود: نویسنده قبل و بعد از نوشتن
+شمارنده را یک واحد افزایش می‌دهد (فرد = در حال نوشتن)؛ همه داده‌ها (کندل‌ها،
+count، تیک) وقتی شمارنده فرد است نوشته می‌شوند و شمارنده زوج جداگانه و در آخر
+ذخیره می‌شود. خواننده تا وقتی شمارنده قبل و بعد از کپی برابر و زوج نباشد دوباره
+تلاش می‌کند.
+
+استفاده در پروسه دیگر:
+    reader = BarFeedReader('EURUSD')
+    snap = reader.snapshot()      # {'seq', 'bars' (structured array), 'tick'}
+"""
+import struct
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+MAGIC = 0x42464431  # 'BFD1'
+VERSION = 1
+
+# magic, version, capacity, count, seq, symbol[16], tick_time_msc, bid, ask, last
+HEADER_FMT = "<IIIIQ16sqddd"
+HEADER_SIZE = 128  # جا برای توسعه header بدون جابه‌جایی داده‌ها
+_COUNT_OFFSET = 12
+_SEQ_OFFSET = 16
+_TICK_FMT = "<qddd"
+_TICK_OFFSET = struct.calcsize("<IIIIQ16s")
+
+BAR_DTYPE = np.dtype([
+    ('time', '<i8'),      # epoch seconds (UTC) مطابق copy_rates
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+])
+
+
+def segment_name(symbol: str) -> str:
+    return f"bar_feed_{symbol.upper()}"
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    # خواننده نباید segment را هنگام خروج unlink کند (resource_tracker در POSIX)
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class BarFeedPublisher:
+    """نویسنده‌ی segment (فقط در پروسه ربات)."""
+
+    def __init__(self, symbol: str, capacity: int = 500):
+        self.symbol = symbol
+        self.capacity = int(capacity)
+        size = HEADER_SIZE + self.capacity * BAR_DTYPE.itemsize
+        name = segment_name(symbol)
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # باقی‌مانده از اجرای قبلی؛ اگر اندازه کافی است دوباره استفاده می‌شود
+            self.shm = shared_memory.SharedMemory(name=name)
+            if self.shm.size < size:
+                self.shm.close()
+                self.shm.unlink()
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._buf = self.shm.buf
+        self._bars = np.ndarray((self.capacity,), dtype=BAR_DTYPE, buffer=self._buf, offset=HEADER_SIZE)
+        self._seq = 0
+        self._count = 0
+        self._tick = (0, np.nan, np.nan, np.nan)
+        self._write_header()
+
+    def _write_header(self):
+        struct.pack_into(HEADER_FMT, self._buf, 0, MAGIC, VERSION, self.capacity, self._count, self._seq,
+                         self.symbol.encode()[:16], *self._tick)
+
+    def _begin(self):
+        self._seq += 1
+        struct.pack_into("<Q", self._buf, _SEQ_OFFSET, self._seq)
+
+    def _end(self):
+        # شمارنده زوج فقط بعد از کامل شدن داده‌ها و با یک store جداگانه
+        self._seq += 1
+        struct.pack_into("<Q", self._buf, _SEQ_OFFSET, self._seq)
+
+    def publish_bars(self, df) -> None:
+        """آخرین capacity کندل از DataFrame خروجی get_historical_data."""
+        n = min(len(df), self.capacity)
+        if n == 0:
+            return
+        tail = df.iloc[-n:]
+        self._begin()
+        self._bars['time'][:n] = tail.index.as_unit('s').asi8
+        for col in ('open', 'high', 'low', 'close', 'volume'):
+            self._bars[col][:n] = tail[col].to_numpy(dtype=float)
+        self._count = n
+        struct.pack_into("<I", self._buf, _COUNT_OFFSET, n)
+        self._end()
+
+    def publish_tick(self, tick) -> None:
+        if not tick:
+            return
+        time_msc = getattr(tick, 'time_msc', 0) or int(getattr(tick, 'time', 0)) * 1000
+        self._begin()
+        self._tick = (int(time_msc), float(tick.bid), float(tick.ask), float(getattr(tick, 'last', 0.0) or 0.0))
+        struct.pack_into(_TICK_FMT, self._buf, _TICK_OFFSET, *self._tick)
+        self._end()
+
+    def close(self, unlink: bool = True) -> None:
+        self._bars = None
+        self._buf = None
+        self.shm.close()
+        if unlink:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class BarFeedReader:
+    """خواننده‌ی فقط-خواندنی segment در هر پروسه محلی."""
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.shm = _attach(segment_name(symbol))
+        magic, version, capacity = struct.unpack_from("<III", self.shm.buf, 0)
+        if magic != MAGIC or version != VERSION:
+            self.shm.close()
+            raise ValueError(f"Unexpected bar feed layout for {symbol}: magic={magic:#x} version={version}")
+        self.capacity = capacity
+        self._bars = np.ndarray((capacity,), dtype=BAR_DTYPE, buffer=self.shm.buf, offset=HEADER_SIZE)
+
+    def seq(self) -> int:
+        return struct.unpack_from("<Q", self.shm.buf, _SEQ_OFFSET)[0]
+
+    def view(self):
+        """نمای zero-copy از کندل‌ها؛ بدون تضمین سازگاری (برای خواندن سریع)."""
+        count = struct.unpack_from("<I", self.shm.buf, _COUNT_OFFSET)[0]
+        return self._bars[:count]
+
+    def snapshot(self, max_retries: int = 1000):
+        """کپی سازگار از کندل‌ها و تیک (seqlock)."""
+        for _ in range(max_retries):
+            s1 = self.seq()
+            if s1 & 1:
+                time.sleep(0)
+                continue
+            header = struct.unpack_from(HEADER_FMT, self.shm.buf, 0)
+            count = header[3]
+            bars = self._bars[:count].copy()
+            if self.seq() == s1:
+                return {
+                    'seq': s1,
+                    'bars': bars,
+                    'tick': {'time_msc': header[6], 'bid': header[7], 'ask': header[8], 'last': header[9]},
+                }
+        return None
+
+    def close(self) -> None:
+        self._bars = None
+        self.shm.close()
+
+
+if __name__ == "__main__":
+    sym = sys.argv[1] if len(sys.argv) > 1 else 'EURUSD'
+    reader = BarFeedReader(sym)
+    snap = reader.snapshot()
+    if snap is None:
+        print("No consistent snapshot (writer busy)")
+    else:
+        bars = snap['bars']
+        print(f"{sym} seq={snap['seq']} bars={len(bars)} tick={snap['tick']}")
+        for row in bars[-5:]:
+            print(row)
+    reader.close()
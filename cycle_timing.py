@@ -0,0 +1,86 @@
+"""
+زمان‌سنجی مراحل هر دور حلقه اصلی با perf_counter_ns.
+
+مراحل همان PHASES در decision_trace هستند (fetch، legs، swing، fib، entry، manage)؛
+mark(phase) زمان سپری شده از mark قبلی را به آن مرحله اضافه می‌کند. در end()
+زمان‌ها در پنجره‌ی غلتان هر مرحله ذخیره می‌شوند، در histogram متریک‌ها ثبت
+می‌شوند و اگر کل دور از budget_ms بیشتر شود over_budget=True است. report()
+هر report_every دور p50/p95/p99/max هر مرحله را برمی‌گرداند.
+"""
+from collections import deque
+from time import perf_counter_ns
+
+import numpy as np
+
+import metrics
+from decision_trace import PHASES
+
+_PHASE_INDEX = {p: i for i, p in enumerate(PHASES)}
+
+
+class CycleTimer:
+    def __init__(self, window=500, budget_ms=250.0, report_every=120):
+        self.budget_ns = int(float(budget_ms) * 1e6)
+        self.report_every = int(report_every)
+        self.samples = [deque(maxlen=window) for _ in PHASES]
+        self.totals = deque(maxlen=window)
+        self.phase_ns = [0] * len(PHASES)
+        self.total_ns = 0
+        self.over_budget = False
+        self.cycles = 0
+        self.over_budget_cycles = 0
+        self._t0 = self._last = perf_counter_ns()
+        self._hist = [metrics.PHASE_SECONDS.labels(p) for p in PHASES]
+
+    def begin(self):
+        for k in range(len(self.phase_ns)):
+            self.phase_ns[k] = 0
+        self.over_budget = False
+        self._t0 = self._last = perf_counter_ns()
+
+    def mark(self, phase):
+        now = perf_counter_ns()
+        self.phase_ns[_PHASE_INDEX[phase]] += now - self._last
+        self._last = now
+
+    def end(self) -> int:
+        """پایان یک دور پردازش شده؛ کل زمان دور (نانوثانیه) را برمی‌گرداند."""
+        self.total_ns = perf_counter_ns() - self._t0
+        for k, ns in enumerate(self.phase_ns):
+            self.samples[k].append(ns)
+            if ns:
+                self._hist[k].observe_ns(ns)
+        self.totals.append(self.total_ns)
+        self.cycles += 1
+        metrics.CYCLE_SECONDS.observe_ns(self.total_ns)
+        metrics.CYCLES.inc()
+        if self.budget_ns and self.total_ns > self.budget_ns:
+            self.over_budget = True
+            self.over_budget_cycles += 1
+            metrics.OVER_BUDGET_CYCLES.inc()
+        return self.total_ns
+
+    def due(self) -> bool:
+        return self.report_every > 0 and self.cycles > 0 and self.cycles % self.report_every == 0
+
+    def breakdown(self) -> str:
+        """مراحل دور جاری به میلی‌ثانیه، برای لاگ دورهای کند."""
+        parts = ' '.join(f"{p}={ns / 1e6:.1f}" for p, ns in zip(PHASES, self.phase_ns))
+        return f"total={self.total_ns / 1e6:.1f}ms | {parts}"
+
+    def report(self):
+        """{phase: {'p50_ms','p95_ms','p99_ms','max_ms'}} روی پنجره غلتان (+ 'total')."""
+        out = {}
+        for name, values in list(zip(PHASES, self.samples)) + [('total', self.totals)]:
+            if not values:
+                continue
+            arr = np.fromiter(values, dtype=np.int64) / 1e6
+            p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+            out[name] = {'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99), 'max_ms': float(arr.max())}
+        return out
+
+    def format_report(self) -> str:
+        rows = [f"{name:<7} p50={s['p50_ms']:7.2f} p95={s['p95_ms']:7.2f} p99={s['p99_ms']:7.2f} max={s['max_ms']:7.2f} ms"
+                for name, s in self.report().items()]
+        head = f"⏱️ Cycle timing over last {len(self.totals)} cycles (over budget: {self.over_budget_cycles}/{self.cycles})"
+        return '\n'.join([head] + rows)
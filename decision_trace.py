@@ -0,0 +1,286 @@
+"""
+رکورد باینری با طول ثابت برای تصمیم هر دور استراتژی + ابزار خط فرمان برای بازخوانی.
+
+به جای جستجو در swing_logs متنی، هر دور پردازش یک رکورد RECORD_SIZE بایتی در
+traces/decision_trace_<SYMBOL>_<YYYY-MM-DD>.bin می‌نویسد: زمان کندل، تعداد
+legها، نوع سوئینگ، سطوح فیبو، وضعیت تاچ‌ها، اقدام انجام شده و زمان هر مرحله.
+هزینه نوشتن چند میکروثانیه است (یک struct.pack و write بافر شده).
+
+    python decision_trace.py decode traces/decision_trace_EURUSD_2025-01-02.bin
+    python decision_trace.py decode FILE --from "2025-01-02 10:00" --to "2025-01-02 12:00" --action buy,skip_buy
+    python decision_trace.py decode FILE --csv > cycles.csv
+    python decision_trace.py replay FILE --from "2025-01-02 10:00" --delay 0.2
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+MAGIC = b'DTR1'
+VERSION = 1
+# magic, version, record_size, symbol[16]
+FILE_HEADER_FMT = '<4sHH16s'
+FILE_HEADER_SIZE = struct.calcsize(FILE_HEADER_FMT)
+
+PHASES = ('fetch', 'legs', 'swing', 'fib', 'entry', 'manage')
+
+# cycle, wall_time_ns, bar_time, legs, swing, is_swing, flags, action, pad,
+# fib0, fib705, fib09, fib1, close, phase_us[6], total_us
+RECORD_FMT = '<Iqq BbBBB3x 5d 6I I'
+RECORD_SIZE = struct.calcsize(RECORD_FMT)
+RECORD_DTYPE = np.dtype([
+    ('cycle', '<u4'),
+    ('wall_time_ns', '<i8'),
+    ('bar_time', '<i8'),
+    ('legs', 'u1'),
+    ('swing', 'i1'),
+    ('is_swing', 'u1'),
+    ('flags', 'u1'),
+    ('action', 'u1'),
+    ('_pad', 'V3'),
+    ('fib0', '<f8'),
+    ('fib705', '<f8'),
+    ('fib09', '<f8'),
+    ('fib1', '<f8'),
+    ('close', '<f8'),
+    ('phase_us', '<u4', (len(PHASES),)),
+    ('total_us', '<u4'),
+])
+assert RECORD_DTYPE.itemsize == RECORD_SIZE
+
+# flags
+F_FIB = 1
+F_FIRST_TOUCH = 2
+F_SECOND_TOUCH = 4
+F_NEW_FIB = 8
+F_IN_POSITION = 16
+F_OVER_BUDGET = 32
+_FLAG_NAMES = ((F_FIB, 'fib'), (F_FIRST_TOUCH, 'touch1'), (F_SECOND_TOUCH, 'touch2'),
+               (F_NEW_FIB, 'new_fib'), (F_IN_POSITION, 'in_pos'), (F_OVER_BUDGET, 'slow'))
+
+ACTIONS = ('none', 'buy', 'sell', 'skip_buy', 'skip_sell', 'stop_rejected', 'order_failed')
+A_NONE, A_BUY, A_SELL, A_SKIP_BUY, A_SKIP_SELL, A_STOP_REJECTED, A_ORDER_FAILED = range(len(ACTIONS))
+
+_SWING_CODES = {None: 0, 'bullish': 1, 'bearish': -1}
+_SWING_NAMES = {0: '-', 1: 'bullish', -1: 'bearish'}
+_U32_MAX = 0xFFFFFFFF
+
+
+class CycleRecord:
+    """رکورد در حال ساخت یک دور؛ mark(phase) زمان سپری شده از mark قبلی را ثبت می‌کند."""
+
+    __slots__ = ('cycle', 'bar_time', 'legs', 'swing', 'is_swing', 'flags', 'action',
+                 'fib', 'close', 'phase_ns', '_t0', '_last')
+
+    def __init__(self, cycle):
+        self.cycle = cycle
+        self.bar_time = 0
+        self.legs = 0
+        self.swing = 0
+        self.is_swing = 0
+        self.flags = 0
+        self.action = A_NONE
+        self.fib = (np.nan, np.nan, np.nan, np.nan)
+        self.close = np.nan
+        self.phase_ns = [0] * len(PHASES)
+        self._t0 = self._last = time.perf_counter_ns()
+
+    def mark(self, phase):
+        now = time.perf_counter_ns()
+        self.phase_ns[PHASES.index(phase)] += now - self._last
+        self._last = now
+
+    def capture(self, state, last_swing_type, legs_count, is_swing=False, new_fib=False, bar=None):
+        """وضعیت BotState بعد از Phase 1-3 (قبل از reset احتمالی در بخش معاملات)."""
+        fib = state.fib_levels or {}
+        self.fib = (fib.get('0.0', np.nan), fib.get('0.705', np.nan), fib.get('0.9', np.nan), fib.get('1.0', np.nan))
+        self.legs = min(int(legs_count), 255)
+        self.swing = _SWING_CODES.get(last_swing_type, 0)
+        self.is_swing = 1 if is_swing else 0
+        flags = 0
+        if fib:
+            flags |= F_FIB
+        if state.first_touch:
+            flags |= F_FIRST_TOUCH
+        if state.second_touch:
+            flags |= F_SECOND_TOUCH
+        if new_fib:
+            flags |= F_NEW_FIB
+        self.flags |= flags
+        if bar is not None:
+            self.bar_time = int(bar.name.timestamp())
+            self.close = float(bar['close'])
+
+    def pack(self) -> bytes:
+        total = (time.perf_counter_ns() - self._t0) // 1000
+        phases = [min(ns // 1000, _U32_MAX) for ns in self.phase_ns]
+        return struct.pack(RECORD_FMT, self.cycle & _U32_MAX, time.time_ns(), self.bar_time, self.legs,
+                           self.swing, self.is_swing, self.flags, self.action,
+                           *(float(x) for x in self.fib), self.close, *phases, min(total, _U32_MAX))
+
+
+class DecisionTrace:
+    """نویسنده فایل روزانه؛ رکوردها بافر می‌شوند و هر flush_every رکورد flush می‌شوند."""
+
+    def __init__(self, directory, symbol, flush_every=20):
+        self.directory = directory
+        self.symbol = symbol
+        self.flush_every = flush_every
+        self._day = None
+        self._f = None
+        self._unflushed = 0
+        self.records = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, day):
+        return os.path.join(self.directory, f"decision_trace_{self.symbol}_{day}.bin")
+
+    def _open(self, day):
+        self.close()
+        path = self.path_for(day)
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._f = open(path, 'ab')
+        if new:
+            self._f.write(struct.pack(FILE_HEADER_FMT, MAGIC, VERSION, RECORD_SIZE, self.symbol.encode()[:16]))
+        self._day = day
+
+    def begin(self, cycle) -> CycleRecord:
+        return CycleRecord(cycle)
+
+    def write(self, rec: CycleRecord) -> None:
+        day = time.strftime('%Y-%m-%d', time.gmtime())
+        if day != self._day:
+            self._open(day)
+        self._f.write(rec.pack())
+        self.records += 1
+        self._unflushed += 1
+        if self._unflushed >= self.flush_every:
+            self._f.flush()
+            self._unflushed = 0
+
+    def close(self):
+        if self._f:
+            self._f.close()
+            self._f = None
+            self._unflushed = 0
+
+
+# ---------- Reading ----------
+def read_trace(path):
+    """(symbol، آرایه ساختاریافته RECORD_DTYPE) - فایل memory-map می‌شود."""
+    with open(path, 'rb') as f:
+        magic, version, rec_size, symbol = struct.unpack(FILE_HEADER_FMT, f.read(FILE_HEADER_SIZE))
+    if magic != MAGIC or version != VERSION or rec_size != RECORD_SIZE:
+        raise ValueError(f"{path}: unsupported trace (magic={magic!r} version={version} record={rec_size})")
+    n = (os.path.getsize(path) - FILE_HEADER_SIZE) // RECORD_SIZE
+    recs = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=FILE_HEADER_SIZE, shape=(n,)) if n else \
+        np.empty(0, dtype=RECORD_DTYPE)
+    return symbol.rstrip(b'\0').decode(), recs
+
+
+def _parse_ts(s):
+    dt = datetime.fromisoformat(s)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def filter_records(recs, start=None, end=None, actions=None):
+    mask = np.ones(len(recs), dtype=bool)
+    if start is not None:
+        mask &= recs['bar_time'] >= start
+    if end is not None:
+        mask &= recs['bar_time'] <= end
+    if actions:
+        codes = [ACTIONS.index(a) for a in actions]
+        mask &= np.isin(recs['action'], codes)
+    return recs[mask]
+
+
+def _fmt_time(sec):
+    return datetime.fromtimestamp(int(sec), tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S') if sec else '-'
+
+
+def _fmt_flags(flags):
+    return ','.join(name for bit, name in _FLAG_NAMES if flags & bit) or '-'
+
+
+def format_record(r):
+    phases = ' '.join(f"{p}={us}" for p, us in zip(PHASES, r['phase_us']) if us)
+    return (f"#{r['cycle']:<6} bar={_fmt_time(r['bar_time'])} legs={r['legs']} swing={_SWING_NAMES[int(r['swing'])]:<7} "
+            f"{'SWING ' if r['is_swing'] else ''}flags={_fmt_flags(r['flags']):<20} action={ACTIONS[r['action']]:<13} "
+            f"fib0={r['fib0']:.5f} fib705={r['fib705']:.5f} fib1={r['fib1']:.5f} close={r['close']:.5f} "
+            f"total={r['total_us']}us [{phases}]")
+
+
+def _cmd_decode(args):
+    symbol, recs = read_trace(args.file)
+    recs = filter_records(recs, args.start, args.end, args.actions)
+    if args.csv:
+        print('cycle,bar_time,legs,swing,is_swing,flags,action,fib0,fib705,fib09,fib1,close,'
+              + ','.join(f"{p}_us" for p in PHASES) + ',total_us')
+        for r in recs:
+            print(f"{r['cycle']},{_fmt_time(r['bar_time'])},{r['legs']},{_SWING_NAMES[int(r['swing'])]},{r['is_swing']},"
+                  f"{_fmt_flags(r['flags']).replace(',', '|')},{ACTIONS[r['action']]},{r['fib0']},{r['fib705']},{r['fib09']},{r['fib1']},"
+                  f"{r['close']}," + ','.join(str(v) for v in r['phase_us']) + f",{r['total_us']}")
+        return
+    print(f"{symbol}: {len(recs)} record(s)")
+    for r in recs:
+        print(format_record(r))
+    if len(recs):
+        total = recs['total_us'].astype(float)
+        print(f"total_us p50={np.percentile(total, 50):.0f} p95={np.percentile(total, 95):.0f} max={total.max():.0f}")
+
+
+def _cmd_replay(args):
+    """نمایش گام به گام تغییرات وضعیت (فیبو جدید، تاچ‌ها، اقدام‌ها) در بازه."""
+    symbol, recs = read_trace(args.file)
+    recs = filter_records(recs, args.start, args.end)
+    prev = None
+    for r in recs:
+        events = []
+        if prev is None or r['swing'] != prev['swing']:
+            events.append(f"swing -> {_SWING_NAMES[int(r['swing'])]}")
+        if r['flags'] & F_NEW_FIB or (prev is not None and r['fib1'] != prev['fib1'] and not np.isnan(r['fib1'])):
+            events.append(f"fib 1.0={r['fib1']:.5f} 0.705={r['fib705']:.5f} 0.0={r['fib0']:.5f}")
+        if prev is not None and (prev['flags'] & F_FIB) and not (r['flags'] & F_FIB):
+            events.append("fib cleared")
+        for bit, name in ((F_FIRST_TOUCH, 'first touch'), (F_SECOND_TOUCH, 'second touch')):
+            if r['flags'] & bit and (prev is None or not prev['flags'] & bit):
+                events.append(name)
+        if r['action'] != A_NONE:
+            events.append(f"ACTION {ACTIONS[r['action']].upper()}")
+        if events or args.all:
+            print(f"{_fmt_time(r['bar_time'])} #{r['cycle']:<6} close={r['close']:.5f} | " + ('; '.join(events) or '.'))
+            if args.delay:
+                time.sleep(args.delay)
+        prev = r
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decode and replay binary decision traces")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    for name in ('decode', 'replay'):
+        p = sub.add_parser(name)
+        p.add_argument('file')
+        p.add_argument('--from', dest='start', type=_parse_ts, help="bar time (UTC), e.g. '2025-01-02 10:00'")
+        p.add_argument('--to', dest='end', type=_parse_ts)
+    dec = sub.choices['decode']
+    dec.add_argument('--action', dest='actions', type=lambda s: s.split(','), help=f"comma list of {','.join(ACTIONS)}")
+    dec.add_argument('--csv', action='store_true')
+    rep = sub.choices['replay']
+    rep.add_argument('--delay', type=float, default=0.0, help="seconds between printed steps")
+    rep.add_argument('--all', action='store_true', help="print cycles without state changes too")
+    args = parser.parse_args(argv)
+    try:
+        (_cmd_decode if args.cmd == 'decode' else _cmd_replay)(args)
+    except BrokenPipeError:
+        sys.stderr.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,36 @@
-import os, smtplib, ssl
+"""
+ارسال ایمیل اطلاع‌رسانی با یک سشن SMTP پایدار، صف محدود اولویت‌دار و digest.
+
+قبلاً هر پیام یک اتصال SMTP_SSL و login جدید می‌ساخت و در یک ThreadPoolExecutor
+بدون محدودیت صف می‌شد. حالا یک thread پس‌زمینه:
+  - اتصال لاگین شده را نگه می‌دارد (بعد از idle_timeout_sec یا قطع شدن دوباره وصل می‌شود)،
+  - پیام‌های رسیده در batch_window_sec را در یک ایمیل digest ارسال می‌کند
+    (پیام با اولویت بالا مثل نتیجه سفارش بلافاصله ارسال می‌شود)،
+  - صف را به queue_size محدود می‌کند؛ وقتی پر باشد کم‌اهمیت‌ترین پیام
+    (مثلاً SIGNAL SKIPPED) کنار گذاشته می‌شود.
+
+برای تست با یک SMTP محلی: EMAIL_CONFIG['host']='127.0.0.1'، 'port'=1025، 'use_ssl'=False.
+"""
+import atexit
+import heapq
+import smtplib
+import ssl
+import threading
+import time
 from email.message import EmailMessage
-from concurrent.futures import ThreadPoolExecutor
 
 from email_config import EMAIL_HOST_PASSWORD_KEY, EMAIL_HOST_USER_NAME, EMAIL_RECIPIENT_USER_NAME
-
-_executor = ThreadPoolExecutor(max_workers=2)
+from metatrader5_config import EMAIL_CONFIG
 
 SENDER = EMAIL_HOST_USER_NAME
 PASSWORD = EMAIL_HOST_PASSWORD_KEY
 RECIPIENT = EMAIL_RECIPIENT_USER_NAME  # می‌توان چند گیرنده با جداکردن با کاما گذاشت
 
+PRIORITY_HIGH = 0     # سفارش/نتیجه سفارش
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2      # سیگنال رد شده
+
+
 def _build_message(subject: str, body: str) -> EmailMessage:
     msg = EmailMessage()
     msg["From"] = SENDER
@@ -18,18 +39,201 @@ def _build_message(subject: str, body: str) -> EmailMessage:
     msg.set_content(body)
     return msg
 
-def _send(subject: str, body: str):
-    if not (SENDER and PASSWORD and RECIPIENT):
-        print("Email env vars missing; skip sending.")
-        return
-    try:
-        msg = _build_message(subject, body)
-        context = ssl.create_default_context()
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465, context=context) as smtp:
+
+def _default_priority(subject: str) -> int:
+    s = subject.upper()
+    if s.startswith("SIGNAL SKIPPED"):
+        return PRIORITY_LOW
+    if "ORDER" in s:
+        return PRIORITY_HIGH
+    return PRIORITY_NORMAL
+
+
+def build_digest(items):
+    """items: [(priority, seq, ts, subject, body)] -> (subject, body)"""
+    if len(items) == 1:
+        return items[0][3], items[0][4]
+    items = sorted(items, key=lambda it: (it[0], it[1]))
+    subject = f"[digest] {len(items)} notifications: {items[0][3]}"
+    parts = []
+    for n, (_, _, ts, subj, body) in enumerate(items, 1):
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))
+        parts.append(f"===== {n}/{len(items)} | {stamp} | {subj} =====\n{body.rstrip()}\n")
+    return subject, "\n".join(parts)
+
+
+class _SmtpSession:
+    """اتصال SMTP لاگین شده که بین پیام‌ها باز می‌ماند."""
+
+    def __init__(self, host, port, use_ssl=True, starttls=False, timeout=30, idle_timeout_sec=240):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.starttls = starttls
+        self.timeout = timeout
+        self.idle_timeout_sec = idle_timeout_sec
+        self._smtp = None
+        self._last_used = 0.0
+        self.connects = 0
+
+    def _connect(self):
+        self.close()
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, context=ssl.create_default_context(), timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.starttls:
+                smtp.starttls(context=ssl.create_default_context())
+        if PASSWORD:
             smtp.login(SENDER, PASSWORD)
-            smtp.send_message(msg)
-    except Exception as e:
-        print(f"Email send error: {e}")
+        self._smtp = smtp
+        self.connects += 1
+
+    def send(self, msg: EmailMessage) -> None:
+        if self._smtp is None or time.monotonic() - self._last_used > self.idle_timeout_sec:
+            self._connect()
+        try:
+            self._smtp.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, smtplib.SMTPSenderRefused, OSError):
+            # سرور اتصال بیکار را بسته است؛ یک بار دوباره وصل می‌شویم
+            self._connect()
+            self._smtp.send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+
+class EmailNotifier:
+    def __init__(self, cfg=None):
+        cfg = dict(EMAIL_CONFIG, **(cfg or {}))
+        self.batch_window_sec = float(cfg.get('batch_window_sec', 5.0))
+        self.queue_size = int(cfg.get('queue_size', 200))
+        self.max_retries = int(cfg.get('max_retries', 3))
+        self.session = _SmtpSession(cfg.get('host', 'smtp.gmail.com'), int(cfg.get('port', 465)),
+                                    use_ssl=cfg.get('use_ssl', True), starttls=cfg.get('starttls', False),
+                                    timeout=cfg.get('timeout_sec', 30), idle_timeout_sec=cfg.get('idle_timeout_sec', 240))
+        self._heap = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+        self.enqueued = 0
+        self.sent = 0
+        self.digests = 0
+        self.dropped = 0
+        self.failed = 0
+
+    # ---------- Producer ----------
+    def submit(self, subject: str, body: str, priority=None) -> bool:
+        """False یعنی پیام به خاطر پر بودن صف کنار گذاشته شد."""
+        if priority is None:
+            priority = _default_priority(subject)
+        with self._cond:
+            self._ensure_started()
+            self._seq += 1
+            item = (priority, self._seq, time.time(), subject, body)
+            if len(self._heap) >= self.queue_size:
+                worst = max(self._heap)  # کم‌اهمیت‌ترین و جدیدترین
+                if item >= worst:
+                    self.dropped += 1
+                    return False
+                self._heap.remove(worst)
+                heapq.heapify(self._heap)
+                self.dropped += 1
+            heapq.heappush(self._heap, item)
+            self.enqueued += 1
+            self._cond.notify()
+        return True
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="email-notifier", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    # ---------- Worker ----------
+    def _take_batch(self):
+        with self._cond:
+            while not self._heap and not self._stopping:
+                self._cond.wait()
+            if not self._heap:
+                return []
+            # پیام فوری بلافاصله؛ بقیه تا پایان پنجره جمع می‌شوند
+            deadline = time.monotonic() + self.batch_window_sec
+            while not self._stopping and self._heap[0][0] != PRIORITY_HIGH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = [heapq.heappop(self._heap) for _ in range(len(self._heap))]
+        return batch
+
+    def _deliver(self, batch):
+        subject, body = build_digest(batch)
+        msg = _build_message(subject, body)
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                self.session.send(msg)
+                self.sent += len(batch)
+                if len(batch) > 1:
+                    self.digests += 1
+                return
+            except Exception as e:
+                self.session.close()
+                if attempt == self.max_retries:
+                    self.failed += len(batch)
+                    print(f"Email send error ({len(batch)} message(s) dropped): {e}")
+                    return
+                time.sleep(min(2 ** attempt, 30))
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch:
+                if SENDER and RECIPIENT:
+                    self._deliver(batch)
+                else:
+                    print("Email env vars missing; skip sending.")
+            with self._cond:
+                if self._stopping and not self._heap:
+                    break
+        self.session.close()
+
+    def close(self, timeout=10.0):
+        """ارسال باقی‌مانده صف (بدون انتظار پنجره) و بستن اتصال."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self):
+        with self._cond:
+            backlog = len(self._heap)
+        return {
+            'backlog': backlog,
+            'queue_capacity': self.queue_size,
+            'enqueued': self.enqueued,
+            'sent': self.sent,
+            'digests': self.digests,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'connects': self.session.connects,
+        }
+
+
+_notifier = EmailNotifier()
+
+
+def send_trade_email_async(subject: str, body: str, priority=None):
+    return _notifier.submit(subject, body, priority)
+
 
-def send_trade_email_async(subject: str, body: str):
-    _executor.submit(_send, subject, body)
\ No newline at end of file
+def notifier_stats():
+    return _notifier.stats()
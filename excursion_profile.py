@@ -0,0 +1,412 @@
+"""
+Per-trade excursion profiles: answer simulate_trade for any ExitParams without the raw ticks.
+
+With x = price for buys and x = -price for sells, the running maximum of x only changes
+at "record" ticks. The first tick reaching any favourable level (TP, BE trigger, scale-out,
+trailing start) is the first record at or above that level, i.e. a binary search over
+the records. Between two records the anchor of a trailing stop is constant, so adverse
+exits (SL, BE stop, trailing stop) are found from the per-segment minimum plus the
+running-minimum records inside the segment, again by binary search.
+
+Results are bit-identical to exit_optimizer_core.simulate_trade: comparisons are done on
+the same prices the per-tick loop uses (negation is exact).
+
+Profiles are cached as .npz files in ticks/profiles/, keyed by the trade and by the
+size/mtime of the monthly tick files it was built from. For parallel runs a list of
+profiles is packed once into one multiprocessing.shared_memory block that worker
+processes attach to and view in place.
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from exit_optimizer_core import (
+    EXIT_REASONS,
+    ExitParams,
+    SimResult,
+    TradePath,
+    _first_true,
+    be_stop_price,
+    path_level,
+    prepare_trade,
+    settle_trade,
+    slice_ticks_for_window,
+    tick_files_for_window,
+)
+
+PROFILE_VERSION = 1
+PROFILE_ARRAYS = ("up_idx", "up_val", "seg_min", "tail_ptr", "tail_idx", "tail_neg")
+
+
+@dataclass
+class ExcursionProfile:
+    entry: float
+    sl: float
+    risk: float
+    is_buy: bool
+    n: int              # number of valid (non-NaN) ticks
+    last_price: float
+    up_idx: np.ndarray  # ticks where x makes a new high (the first tick is always one)
+    up_val: np.ndarray  # x at those ticks, strictly increasing
+    seg_min: np.ndarray  # min x over each segment [up_idx[k], up_idx[k+1])
+    tail_ptr: np.ndarray  # CSR offsets of each segment's running-min records (start tick excluded)
+    tail_idx: np.ndarray
+    tail_neg: np.ndarray  # -x at those records, ascending within a segment
+
+    def to_x(self, price):
+        return price if self.is_buy else -price
+
+    def meta(self) -> np.ndarray:
+        return np.array([self.entry, self.sl, self.risk, float(self.is_buy), float(self.n), self.last_price])
+
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in PROFILE_ARRAYS)
+
+
+def _profile_from(meta, arrays) -> ExcursionProfile:
+    entry, sl, risk, is_buy, n, last_price = meta
+    return ExcursionProfile(float(entry), float(sl), float(risk), bool(is_buy), int(n), float(last_price),
+                            *(arrays[name] for name in PROFILE_ARRAYS))
+
+
+def build_profile(path: TradePath) -> ExcursionProfile:
+    x = path.prices if path.is_buy else -path.prices
+    n = x.size
+    if n == 0:
+        empty_i, empty_f = np.zeros(0, dtype=np.int64), np.zeros(0)
+        return ExcursionProfile(path.entry, path.sl, path.risk, path.is_buy, 0, path.last_price,
+                                empty_i, empty_f, empty_f, np.zeros(1, dtype=np.int64), empty_i, empty_f)
+    prev_max = np.empty(n)
+    prev_max[0] = -np.inf
+    np.maximum.accumulate(x[:-1], out=prev_max[1:])
+    is_up = x > prev_max
+    up_idx = np.flatnonzero(is_up)
+    seg_min = np.minimum.reduceat(x, up_idx)
+
+    # running min inside each segment, excluding its start tick (which is the segment's max)
+    seg = np.cumsum(is_up) - 1
+    tail = np.where(is_up, np.inf, x)
+    seg_cummin = pd.Series(tail).groupby(seg).cummin().to_numpy()
+    prev_min = np.empty(n)
+    prev_min[0] = np.inf
+    prev_min[1:] = seg_cummin[:-1]
+    is_tail_rec = ~is_up & (x < prev_min)
+    tail_idx = np.flatnonzero(is_tail_rec)
+    tail_ptr = np.append(np.searchsorted(tail_idx, up_idx), tail_idx.size)
+    return ExcursionProfile(path.entry, path.sl, path.risk, path.is_buy, n, path.last_price,
+                            up_idx.astype(np.int64), x[up_idx].copy(), seg_min, tail_ptr.astype(np.int64),
+                            tail_idx.astype(np.int64), -x[tail_idx])
+
+
+def _tail_hit(prof: ExcursionProfile, k: int, y: float) -> Optional[int]:
+    lo, hi = prof.tail_ptr[k], prof.tail_ptr[k + 1]
+    if lo == hi:
+        return None
+    j = int(np.searchsorted(prof.tail_neg[lo:hi], -y, 'left'))
+    return int(prof.tail_idx[lo + j]) if j < hi - lo else None
+
+
+def _first_at_or_below(prof: ExcursionProfile, y: float, k0: int, include_start: bool) -> int:
+    """First tick >= up_idx[k0] (> if not include_start) with x <= y, or n."""
+    if k0 >= prof.up_val.size:
+        return prof.n
+    if include_start and prof.up_val[k0] <= y:
+        return int(prof.up_idx[k0])
+    i = _tail_hit(prof, k0, y)
+    if i is not None:
+        return i
+    j = _first_true(prof.seg_min[k0 + 1:] <= y)
+    k = k0 + 1 + j
+    if k >= prof.up_val.size:
+        return prof.n
+    if prof.up_val[k] <= y:
+        return int(prof.up_idx[k])
+    return _tail_hit(prof, k, y)
+
+
+def _first_reach(prof: ExcursionProfile, r: Optional[float]) -> Tuple[int, int]:
+    """(tick, record) of the first tick at or beyond r in the favourable direction."""
+    K = prof.up_val.size
+    if r is None:
+        return prof.n, K
+    k = int(np.searchsorted(prof.up_val, prof.to_x(path_level(prof, r)), 'left'))
+    return (int(prof.up_idx[k]), k) if k < K else (prof.n, K)
+
+
+def trailing_exits(prof: ExcursionProfile, trailing_start_r: Optional[float], gaps_r) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Trailing-stop exit tick (n = never) and stop price for every trailing_gap_r in gaps_r at once.
+    After activation the anchor is the running peak, constant within a segment, so one
+    (segments x gaps) comparison against the segment minima finds the exit segment of
+    every gap; the exact tick is then a binary search inside that segment.
+    """
+    gaps_r = np.asarray(gaps_r, dtype=np.float64)
+    trail_i = np.full(gaps_r.size, prof.n, dtype=np.int64)
+    trail_stop = np.full(gaps_r.size, np.nan)
+    start_i, start_k = _first_reach(prof, trailing_start_r)
+    if start_i >= prof.n:
+        return trail_i, trail_stop
+    anchors = prof.to_x(prof.up_val[start_k:])[:, None]
+    gaps = gaps_r * prof.risk
+    stops = anchors - gaps if prof.is_buy else anchors + gaps
+    thr = prof.to_x(stops)
+    hit = prof.seg_min[start_k:, None] <= thr
+    first = hit.argmax(axis=0)
+    for j in np.flatnonzero(hit[first, np.arange(gaps_r.size)]):
+        kk = first[j]
+        k = start_k + kk
+        y = thr[kk, j]
+        trail_i[j] = prof.up_idx[k] if prof.up_val[k] <= y else _tail_hit(prof, k, y)
+        trail_stop[j] = stops[kk, j]
+    return trail_i, trail_stop
+
+
+def _fixed_exits(prof: ExcursionProfile, params: ExitParams):
+    """First-hit ticks that do not depend on trailing_gap_r."""
+    n = prof.n
+    tp_i, _ = _first_reach(prof, params.tp_r)
+    scale_i, scale_k = _first_reach(prof, params.scaleout_r)
+    be_i, be_k = _first_reach(prof, params.be_trigger_r)
+    start_i, _ = _first_reach(prof, params.trailing_start_r)
+
+    sl_i = _first_at_or_below(prof, prof.to_x(prof.sl), 0, True)
+    if sl_i > be_i:
+        sl_i = _first_at_or_below(prof, prof.to_x(be_stop_price(prof, params)), be_k, False)
+
+    scale_price = float(prof.to_x(prof.up_val[scale_k])) if scale_i < n else None
+    return start_i, be_i, scale_i, scale_price, tp_i, sl_i
+
+
+def evaluate_profile(prof: ExcursionProfile, params: ExitParams) -> Optional[SimResult]:
+    start_i, be_i, scale_i, scale_price, tp_i, sl_i = _fixed_exits(prof, params)
+    trail_i, trail_stop = trailing_exits(prof, params.trailing_start_r, [params.trailing_gap_r])
+    stop = float(trail_stop[0]) if trail_i[0] < prof.n else None
+    return settle_trade(prof, params, prof.n, start_i, be_i, scale_i, scale_price, tp_i, int(trail_i[0]), stop, sl_i)
+
+
+def _first_reach_many(prof: ExcursionProfile, r: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """_first_reach for an array of r (NaN = never)."""
+    K = prof.up_val.size
+    level = prof.entry + r * prof.risk if prof.is_buy else prof.entry - r * prof.risk
+    k = np.searchsorted(prof.up_val, prof.to_x(level), 'left')  # NaN sorts last -> K
+    i = np.where(k < K, prof.up_idx[np.minimum(k, K - 1)] if K else prof.n, prof.n)
+    return i.astype(np.int64), k
+
+
+def _trailing_many(prof: ExcursionProfile, start_k: np.ndarray, gaps_r: np.ndarray,
+                   max_cells: int = 4_000_000) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    trailing_exits for one (activation record, gap) per row: the (records x rows) comparison
+    against the segment minima is masked before each row's activation record, so rows with
+    different trailing_start_r share one matrix (split into column chunks of max_cells).
+    """
+    m, n, K = start_k.size, prof.n, prof.up_val.size
+    trail_i = np.full(m, n, dtype=np.int64)
+    trail_stop = np.full(m, np.nan)
+    active = np.flatnonzero(start_k < K)
+    if active.size == 0:
+        return trail_i, trail_stop
+    k0 = int(start_k[active].min())
+    anchors = prof.to_x(prof.up_val[k0:])[:, None]
+    record = np.arange(k0, K)[:, None]
+    step = max(1, max_cells // (K - k0))
+    for c0 in range(0, active.size, step):
+        rows = active[c0:c0 + step]
+        gaps = gaps_r[rows] * prof.risk
+        stops = anchors - gaps if prof.is_buy else anchors + gaps
+        thr = prof.to_x(stops)
+        hit = (prof.seg_min[k0:, None] <= thr) & (record >= start_k[rows])
+        first = hit.argmax(axis=0)
+        for c in np.flatnonzero(hit[first, np.arange(rows.size)]):
+            kk = first[c]
+            k = k0 + kk
+            y = thr[kk, c]
+            trail_i[rows[c]] = prof.up_idx[k] if prof.up_val[k] <= y else _tail_hit(prof, k, y)
+            trail_stop[rows[c]] = stops[kk, c]
+    return trail_i, trail_stop
+
+
+def evaluate_profile_batch(prof: ExcursionProfile, params: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    evaluate_profile for every row of an EXIT_PARAMS_DTYPE array at once.
+    Returns (r_total, exit_reason code into EXIT_REASONS, n_events); r_total is NaN where
+    evaluate_profile returns None. Favourable first passages are one searchsorted over
+    all rows, trailing exits one masked (records x rows) comparison, and BE stops are
+    searched once per distinct (be_trigger_r, be_back_r).
+    """
+    n, m = prof.n, len(params)
+    tp_i, _ = _first_reach_many(prof, params["tp_r"])
+    scale_i, scale_k = _first_reach_many(prof, params["scaleout_r"])
+    be_i, be_k = _first_reach_many(prof, params["be_trigger_r"])
+    start_i, start_k = _first_reach_many(prof, params["trailing_start_r"])
+
+    # SL: original stop until the BE trigger, then the BE stop from the trigger record on
+    be_back = params["be_back_r"] * prof.risk
+    be_stop = np.maximum(prof.sl, prof.entry - be_back) if prof.is_buy else np.minimum(prof.sl, prof.entry + be_back)
+    sl_i = np.full(m, _first_at_or_below(prof, prof.to_x(prof.sl), 0, True), dtype=np.int64)
+    after_be = np.flatnonzero(sl_i > be_i)
+    if after_be.size:
+        keys, inv = np.unique(np.stack([be_k[after_be].astype(np.float64), be_stop[after_be]], axis=1),
+                              axis=0, return_inverse=True)
+        hits = np.array([_first_at_or_below(prof, prof.to_x(y), int(k), False) for k, y in keys], dtype=np.int64)
+        sl_i[after_be] = hits[inv.reshape(-1)]
+
+    # one matrix column per distinct (activation record, gap): few on a grid, one per row for continuous params
+    gap_vals, gap_inv = np.unique(params["trailing_gap_r"], return_inverse=True)
+    keys, inv = np.unique(start_k * gap_vals.size + gap_inv.reshape(-1), return_inverse=True)
+    trail_i, trail_stop = _trailing_many(prof, keys // gap_vals.size, gap_vals[keys % gap_vals.size])
+    trail_i, trail_stop = trail_i[inv.reshape(-1)], trail_stop[inv.reshape(-1)]
+
+    # settle (same arithmetic and ordering as settle_trade)
+    exit_i = np.minimum(np.minimum(tp_i, trail_i), sl_i)
+    n_events = ((start_i < n) & (start_i <= exit_i)).astype(np.int64) + ((be_i < n) & (be_i <= exit_i)) \
+        + ((scale_i < n) & (scale_i <= exit_i))
+    sign = 1.0 if prof.is_buy else -1.0
+
+    def r_multiple(price):
+        return (price - prof.entry) / prof.risk if prof.is_buy else (prof.entry - price) / prof.risk
+
+    part = params["scaleout_frac"]
+    scaled = (scale_i < n) & (scale_i <= exit_i) & (part > 0)
+    scale_price = sign * prof.up_val[np.minimum(scale_k, max(prof.up_val.size - 1, 0))] if prof.up_val.size else np.zeros(m)
+    realized = np.where(scaled, 0.0 + part * r_multiple(scale_price), 0.0)
+    remaining = np.where(scaled, np.where(1.0 - part > 0.0, 1.0 - part, 0.0), 1.0)
+
+    is_tp = (exit_i < n) & (exit_i == tp_i)
+    is_trail = (exit_i < n) & ~is_tp & (exit_i == trail_i)
+    is_sl = (exit_i < n) & ~is_tp & ~is_trail
+    tp_price = prof.entry + params["tp_r"] * prof.risk if prof.is_buy else prof.entry - params["tp_r"] * prof.risk
+    sl_price = np.where(be_i <= exit_i, be_stop, prof.sl)
+    exit_price = np.select([is_tp, is_trail, is_sl], [tp_price, trail_stop, sl_price], prof.last_price)
+    r_total = realized + remaining * r_multiple(exit_price)
+
+    reason = np.select([is_tp, is_trail, is_sl], [EXIT_REASONS.index("tp_direct"), EXIT_REASONS.index("trail"),
+                                                  EXIT_REASONS.index("sl")], EXIT_REASONS.index("end_series"))
+    n_events = n_events + (exit_i < n)
+    if np.isnan(prof.last_price):
+        r_total[exit_i >= n] = np.nan
+    return r_total, reason.astype(np.int8), n_events
+
+
+# -----------------------------
+# Disk cache
+# -----------------------------
+
+def profile_dir(root: str) -> str:
+    return os.path.join(root, "ticks", "profiles")
+
+
+def _cache_key(row: pd.Series, symbol: str, start: pd.Timestamp, end: pd.Timestamp, sources) -> str:
+    parts = [str(PROFILE_VERSION), symbol, str(start), str(end), str(row["Type"]).lower(),
+             repr(float(row["Price"])), repr(float(row["S / L"]))]
+    for src in sources:
+        st = os.stat(src)
+        parts.append(f"{os.path.basename(src)}:{st.st_size}:{st.st_mtime_ns}")
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:20]
+
+
+def save_profile(path: str, n_ticks: int, prof: Optional[ExcursionProfile]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp.npz"
+    if prof is None:
+        np.savez(tmp, n_ticks=np.int64(n_ticks), ok=np.bool_(False))
+    else:
+        np.savez(tmp, n_ticks=np.int64(n_ticks), ok=np.bool_(True), meta=prof.meta(),
+                 **{name: getattr(prof, name) for name in PROFILE_ARRAYS})
+    os.replace(tmp, path)
+
+
+def load_profile(path: str) -> Tuple[int, Optional[ExcursionProfile]]:
+    with np.load(path) as z:
+        n_ticks = int(z["n_ticks"])
+        if not bool(z["ok"]):
+            return n_ticks, None
+        prof = _profile_from(z["meta"], {name: z[name] for name in PROFILE_ARRAYS})
+    return n_ticks, prof
+
+
+def load_trade_profile(row: pd.Series, symbol: str, start: pd.Timestamp, end: pd.Timestamp, root: str,
+                       use_cache: bool = True, stats: Optional[dict] = None) -> Tuple[int, Optional[ExcursionProfile]]:
+    """
+    (number of ticks in the window, profile or None if the trade cannot be simulated).
+    Reads the cached profile when the tick files are unchanged, otherwise slices the trade's
+    ticks once and builds it. stats (optional) accumulates cache_hits, built and slice_bytes.
+    """
+    stats = stats if stats is not None else {}
+    sources = tick_files_for_window(symbol, start, end, root)
+    if not sources:
+        return 0, None
+    cache_path = os.path.join(profile_dir(root), f"{symbol}_{_cache_key(row, symbol, start, end, sources)}.npz")
+    if use_cache and os.path.exists(cache_path):
+        try:
+            result = load_profile(cache_path)
+            stats["cache_hits"] = stats.get("cache_hits", 0) + 1
+            return result
+        except Exception:
+            pass  # corrupt/old file: rebuild
+    ticks = slice_ticks_for_window(symbol, start, end, root)
+    stats["built"] = stats.get("built", 0) + 1
+    stats["slice_bytes"] = stats.get("slice_bytes", 0) + ticks.nbytes
+    path = prepare_trade(row, ticks) if not ticks.empty else None
+    prof = build_profile(path) if path is not None else None
+    if use_cache:
+        save_profile(cache_path, len(ticks), prof)
+    return len(ticks), prof
+
+
+# -----------------------------
+# Shared memory (parallel grid)
+# -----------------------------
+
+def pack_profiles(profiles: List[ExcursionProfile]) -> Dict[str, np.ndarray]:
+    """Concatenate the arrays of all profiles; '<name>_off' holds each profile's offsets."""
+    packed = {"meta": np.array([p.meta() for p in profiles]).reshape(len(profiles), 6)}
+    for name in PROFILE_ARRAYS:
+        parts = [getattr(p, name) for p in profiles]
+        dtype = np.float64 if name in ("up_val", "seg_min", "tail_neg") else np.int64
+        packed[name] = np.concatenate(parts).astype(dtype, copy=False) if parts else np.zeros(0, dtype=dtype)
+        packed[name + "_off"] = np.concatenate([[0], np.cumsum([a.size for a in parts], dtype=np.int64)]).astype(np.int64)
+    return packed
+
+
+def unpack_profiles(packed: Dict[str, np.ndarray]) -> List[ExcursionProfile]:
+    """Profiles whose arrays are views into packed (no copies)."""
+    profiles = []
+    for t, meta in enumerate(packed["meta"]):
+        arrays = {}
+        for name in PROFILE_ARRAYS:
+            off = packed[name + "_off"]
+            arrays[name] = packed[name][off[t]:off[t + 1]]
+        profiles.append(_profile_from(meta, arrays))
+    return profiles
+
+
+def share_profiles(profiles: List[ExcursionProfile]) -> Tuple[shared_memory.SharedMemory, tuple]:
+    """
+    Copy the packed profiles into one shared memory block. Returns the block (the caller
+    closes and unlinks it) and a small picklable handle for attach_profiles.
+    """
+    packed = pack_profiles(profiles)
+    layout, size = [], 0
+    for key, arr in packed.items():
+        layout.append((key, arr.dtype.str, arr.shape, size))
+        size += -(-arr.nbytes // 64) * 64  # keep every array 64-byte aligned
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for (key, dtype, shape, offset), arr in zip(layout, packed.values()):
+        np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)[...] = arr
+    return shm, (shm.name, layout)
+
+
+def attach_profiles(handle: tuple) -> Tuple[shared_memory.SharedMemory, List[ExcursionProfile]]:
+    """Profiles viewing the block created by share_profiles; keep the block open while they are used."""
+    name, layout = handle
+    # pool workers share the parent's resource_tracker, so attaching here does not make
+    # them unlink the block on exit; the parent unlinks it once the pool is done
+    shm = shared_memory.SharedMemory(name=name)
+    packed = {key: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset) for key, dtype, shape, offset in layout}
+    return shm, unpack_profiles(packed)
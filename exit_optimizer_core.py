@@ -1,28 +1,113 @@
 import os
 import math
 import itertools
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Tuple, Callable, Iterable
 
 import pandas as pd
 import numpy as np
-import matplotlib
-matplotlib.use("Agg")  # ensure non-interactive backend
-import matplotlib.pyplot as plt
+
+from housekeeping import resolve_path
+from tick_store import MonthTicks, merge_sorted, open_month
 
 
 # -----------------------------
 # Data loading and parsing
 # -----------------------------
 
+DEFAULT_TICK_CACHE_MB = 2048
+
+
+def _cached_nbytes(value: Any) -> int:
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=False).sum())
+    return int(value.nbytes)
+
+
+class TickCache:
+    """
+    Loaded monthly tick files, bounded by max_bytes with least-recently-used eviction.
+    Pinned paths are never evicted; the entry just loaded is kept even if it alone
+    exceeds the budget. Memory-mapped months count their mapped size.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_TICK_CACHE_MB * 1024 * 1024):
+        self.max_bytes = int(max_bytes)
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items: "OrderedDict[Any, Tuple[Any, int]]" = OrderedDict()
+        self._pinned: set = set()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: Any, load: Callable[[], Any]) -> Any:
+        item = self._items.get(key)
+        if item is not None:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+        self.misses += 1
+        value = load()
+        size = _cached_nbytes(value)
+        self._items[key] = (value, size)
+        self.nbytes += size
+        self._evict()
+        return value
+
+    def _evict(self) -> None:
+        newest = next(reversed(self._items), None)
+        for key in list(self._items):
+            if self.nbytes <= self.max_bytes:
+                break
+            if key == newest or self._path(key) in self._pinned:
+                continue
+            self.nbytes -= self._items.pop(key)[1]
+            self.evictions += 1
+
+    @staticmethod
+    def _path(key: Any) -> str:
+        return key[1] if isinstance(key, tuple) else key
+
+    def pin(self, paths: Iterable[str]) -> None:
+        """Keep these tick files (once loaded) regardless of the budget."""
+        self._pinned.update(paths)
+
+    def unpin(self, paths: Optional[Iterable[str]] = None) -> None:
+        if paths is None:
+            self._pinned.clear()
+        else:
+            self._pinned.difference_update(paths)
+        self._evict()
+
+    def set_budget(self, max_bytes: int) -> None:
+        self.max_bytes = int(max_bytes)
+        self._evict()
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.nbytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._items), "nbytes": self.nbytes, "max_bytes": self.max_bytes,
+                "pinned": len(self._pinned), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def summary(self) -> str:
+        mb = 1024 * 1024
+        return (f"tick cache: {len(self._items)} months, {self.nbytes / mb:.1f}/{self.max_bytes / mb:.0f} MB, "
+                f"hits {self.hits}, misses {self.misses}, evictions {self.evictions}, pinned {len(self._pinned)}")
+
+
 # Global cache for tick files to avoid repeated loading
-_TICKS_CACHE: Dict[str, pd.DataFrame] = {}
+TICKS_CACHE = TickCache()
 
 
 def clear_ticks_cache() -> None:
     """Clear the global ticks cache to free memory."""
-    global _TICKS_CACHE
-    _TICKS_CACHE.clear()
+    TICKS_CACHE.clear()
 
 
 REPORT_TIME_FORMATS = ["%Y.%m.%d %H:%M:%S", "%Y.%m.%d %H:%M"]
@@ -74,34 +159,13 @@ def read_report_csv(path: str) -> pd.DataFrame:
     return df
 
 
-# Global cache for tick files to avoid repeated loading
-_TICKS_CACHE: Dict[str, pd.DataFrame] = {}
-
-
-def read_ticks_csv(path: str) -> pd.DataFrame:
-    # Check cache first
-    if path in _TICKS_CACHE:
-        return _TICKS_CACHE[path]
-    
-    if not os.path.exists(path):
-        empty_df = pd.DataFrame(columns=["time", "bid", "ask"])
-        _TICKS_CACHE[path] = empty_df
-        return empty_df
-    
-    df = pd.read_csv(path)
-    for c in ["time", "bid", "ask"]:
-        if c not in df.columns:
-            raise ValueError(f"Missing required ticks column: {c} in {path}")
-    df["time"] = pd.to_datetime(df["time"], errors="coerce")
-    df = df.dropna(subset=["time"]).copy()
-    df = df.sort_values("time")
-    
-    # Cache the loaded dataframe
-    _TICKS_CACHE[path] = df
-    return df
+def read_month_ticks(path: str) -> MonthTicks:
+    """Memory-mapped columns of a monthly tick file (tick_store; built from the CSV on first use)."""
+    return TICKS_CACHE.get(path, lambda: open_month(path))
 
 
-def load_ticks_for_window(symbol: str, start: pd.Timestamp, end: pd.Timestamp, root: str) -> pd.DataFrame:
+def tick_files_for_window(symbol: str, start: pd.Timestamp, end: pd.Timestamp, root: str) -> List[str]:
+    """Monthly tick files (plain or compressed by housekeeping) covering [start, end]."""
     # naive loader: look 3 surrounding months
     month_keys: List[Tuple[int, int]] = []
     cur = pd.Timestamp(year=start.year, month=start.month, day=1)
@@ -110,33 +174,69 @@ def load_ticks_for_window(symbol: str, start: pd.Timestamp, end: pd.Timestamp, r
         month_keys.append((cur.year, cur.month))
         cur = (cur + pd.offsets.MonthBegin(1))
 
-    frames: List[pd.DataFrame] = []
+    paths: List[str] = []
     ticks_dir = os.path.join(root, "ticks")
     for y, m in month_keys:
-        # Try both naming patterns
-        path1 = os.path.join(ticks_dir, f"Ticks_{symbol}_{y:04d}_{m:02d}.csv")
-        path2 = os.path.join(ticks_dir, f"{symbol}_{y:04d}_{m:02d}_ticks.csv")
-        
-        if os.path.exists(path1):
-            frames.append(read_ticks_csv(path1))
-        elif os.path.exists(path2):
-            frames.append(read_ticks_csv(path2))
+        # Try both naming patterns (plain or compressed by housekeeping)
+        path1 = resolve_path(os.path.join(ticks_dir, f"Ticks_{symbol}_{y:04d}_{m:02d}.csv"))
+        path2 = resolve_path(os.path.join(ticks_dir, f"{symbol}_{y:04d}_{m:02d}_ticks.csv"))
+        if path1 or path2:
+            paths.append(path1 or path2)
         # Skip else clause - don't append empty df if file doesn't exist
+    return paths
 
-    if not frames:
-        return pd.DataFrame(columns=["time", "bid", "ask"]).copy()
-    
-    # Filter out empty frames before concat to avoid FutureWarning
-    non_empty_frames = [f for f in frames if not f.empty]
-    if not non_empty_frames:
-        return pd.DataFrame(columns=["time", "bid", "ask"]).copy()
-        
-    merged = pd.concat(non_empty_frames, ignore_index=True) if len(non_empty_frames) > 1 else non_empty_frames[0]
-    if merged.empty:
-        return merged
-    # filter by window
-    mask = (merged["time"] >= start) & (merged["time"] <= end)
-    return merged.loc[mask].copy()
+
+@dataclass
+class TradeTicks:
+    """Compact tick slice of one trade window (what simulation needs, without a DataFrame)."""
+    times: np.ndarray  # int64 ns
+    bid: np.ndarray
+    ask: np.ndarray
+
+    def __len__(self) -> int:
+        return self.times.size
+
+    @property
+    def empty(self) -> bool:
+        return self.times.size == 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + self.bid.nbytes + self.ask.nbytes
+
+
+def slice_ticks_for_window(symbol: str, start: pd.Timestamp, end: pd.Timestamp, root: str) -> TradeTicks:
+    """
+    Ticks in [start, end] cut from each memory-mapped month with two searchsorted calls.
+    A window inside one month is a zero-copy view; months are combined with a k-way merge.
+    """
+    start_ns = pd.Timestamp(start).as_unit("ns").value
+    end_ns = pd.Timestamp(end).as_unit("ns").value
+    parts = [read_month_ticks(p).window(start_ns, end_ns) for p in tick_files_for_window(symbol, start, end, root)]
+    return TradeTicks(*merge_sorted(parts))
+
+
+def ticks_cache_nbytes() -> int:
+    """Bytes held by the tick cache (memory-mapped months count their mapped size)."""
+    return TICKS_CACHE.nbytes
+
+
+def trade_tick_files(df_report: pd.DataFrame, window, root: str) -> List[str]:
+    """Every monthly tick file the trades of a report need; window(row) -> (start, end)."""
+    paths: List[str] = []
+    for _, row in df_report.iterrows():
+        start, end = window(row)
+        for path in tick_files_for_window(str(row["Symbol"]).upper(), start, end, root):
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def load_ticks_for_window(symbol: str, start: pd.Timestamp, end: pd.Timestamp, root: str) -> pd.DataFrame:
+    ticks = slice_ticks_for_window(symbol, start, end, root)
+    if ticks.empty:
+        return pd.DataFrame(columns=["time", "bid", "ask"])
+    return pd.DataFrame({"time": ticks.times.view("datetime64[ns]"), "bid": ticks.bid, "ask": ticks.ask})
 
 
 # -----------------------------
@@ -154,6 +254,20 @@ class ExitParams:
     trailing_gap_r: float = 0.7
 
 
+PARAM_FIELDS = ("scaleout_r", "scaleout_frac", "be_trigger_r", "be_back_r", "tp_r", "trailing_start_r", "trailing_gap_r")
+# Many ExitParams at once (batch evaluation); None is stored as NaN
+EXIT_PARAMS_DTYPE = np.dtype([(k, "<f8") for k in PARAM_FIELDS])
+
+
+def params_array(params) -> np.ndarray:
+    """EXIT_PARAMS_DTYPE array from a sequence of ExitParams or parameter dicts."""
+    out = np.empty(len(params), dtype=EXIT_PARAMS_DTYPE)
+    for i, p in enumerate(params):
+        d = params_to_dict(p if isinstance(p, ExitParams) else ExitParams(**p))
+        out[i] = tuple(np.nan if d[k] is None else float(d[k]) for k in PARAM_FIELDS)
+    return out
+
+
 @dataclass
 class SimResult:
     r_total: float
@@ -161,6 +275,9 @@ class SimResult:
     n_events: int
 
 
+EXIT_REASONS = ("end_series", "tp_direct", "trail", "sl")
+
+
 def compute_risk(entry: float, sl: float) -> float:
     return abs(entry - sl)
 
@@ -172,7 +289,155 @@ def price_for_stream(row_type: str, bid: float, ask: float) -> float:
     return ask
 
 
+@dataclass
+class TradePath:
+    entry: float
+    sl: float
+    risk: float
+    is_buy: bool
+    prices: np.ndarray  # exit-side prices (bid for buy, ask for sell) with NaN ticks dropped
+    last_price: float   # exit-side price of the last tick, NaN included (end_series exit)
+
+
+def prepare_trade(report_row: pd.Series, ticks) -> Optional[TradePath]:
+    # ticks: DataFrame from load_ticks_for_window or TradeTicks from slice_ticks_for_window
+    entry = float(report_row["Price"]) if not math.isnan(report_row["Price"]) else None
+    sl = float(report_row["S / L"]) if not math.isnan(report_row["S / L"]) else None
+    row_type = str(report_row["Type"]).lower()
+
+    if entry is None or sl is None:
+        return None
+    risk = compute_risk(entry, sl)
+    if risk <= 0:
+        return None
+    if ticks.empty:
+        return None
+
+    is_buy = row_type == "buy"
+    col = "bid" if is_buy else "ask"
+    if isinstance(ticks, TradeTicks):
+        stream = getattr(ticks, col)
+    elif col in ticks.columns:
+        stream = ticks[col].to_numpy(dtype=np.float64)
+    else:
+        stream = np.full(len(ticks), np.nan)
+    valid = ~np.isnan(stream)
+    prices = stream if valid.all() else stream[valid]
+    return TradePath(entry=entry, sl=sl, risk=risk, is_buy=is_buy,
+                     prices=np.ascontiguousarray(prices), last_price=float(stream[-1]))
+
+
+def _first_true(mask: np.ndarray) -> int:
+    """Index of the first True in mask, or len(mask) if there is none."""
+    i = int(np.argmax(mask)) if mask.size else 0
+    return i if mask.size and mask[i] else mask.size
+
+
+def path_r_multiple(path, price: float) -> float:
+    if path.is_buy:
+        return (price - path.entry) / path.risk
+    else:
+        return (path.entry - price) / path.risk
+
+
+def path_level(path, r: float) -> float:
+    """Price at r multiples of risk in the trade's favourable direction."""
+    return path.entry + r * path.risk if path.is_buy else path.entry - r * path.risk
+
+
+def be_stop_price(path, params: ExitParams) -> float:
+    """Stop after the BE trigger: the tighter of the original SL and entry -/+ be_back_r."""
+    be_back = params.be_back_r * path.risk
+    be_price = path.entry - be_back if path.is_buy else path.entry + be_back
+    return max(path.sl, be_price) if path.is_buy else min(path.sl, be_price)
+
+
+def settle_trade(path, params: ExitParams, n: int, start_i: int, be_i: int, scale_i: int, scale_price: Optional[float],
+                 tp_i: int, trail_i: int, trail_stop: Optional[float], sl_i: int) -> Optional[SimResult]:
+    """
+    Turn first-hit indices (n = never) into the loop's SimResult. Same-tick ordering of
+    the loop: trailing start, BE and scale-out are applied before the TP, trail and SL exits.
+    """
+    exit_i = min(tp_i, trail_i, sl_i)
+    events_count = sum(1 for i in (start_i, be_i, scale_i) if i < n and i <= exit_i)
+
+    remaining_frac = 1.0
+    realized_r = 0.0
+    if scale_i < n and scale_i <= exit_i:
+        part = params.scaleout_frac
+        if part > 0:
+            realized_r += part * path_r_multiple(path, scale_price)
+            remaining_frac = max(0.0, 1.0 - part)
+
+    if exit_i >= n:
+        if np.isnan(path.last_price):
+            return None
+        realized_r += remaining_frac * path_r_multiple(path, path.last_price)
+        return SimResult(r_total=realized_r, exit_reason="end_series", n_events=events_count)
+
+    events_count += 1
+    if exit_i == tp_i:
+        realized_r += remaining_frac * path_r_multiple(path, path_level(path, params.tp_r))
+        return SimResult(r_total=realized_r, exit_reason="tp_direct", n_events=events_count)
+    if exit_i == trail_i:
+        realized_r += remaining_frac * path_r_multiple(path, trail_stop)
+        return SimResult(r_total=realized_r, exit_reason="trail", n_events=events_count)
+    sl_price = be_stop_price(path, params) if be_i <= exit_i else path.sl
+    realized_r += remaining_frac * path_r_multiple(path, sl_price)
+    return SimResult(r_total=realized_r, exit_reason="sl", n_events=events_count)
+
+
+def simulate_path(path: TradePath, params: ExitParams) -> Optional[SimResult]:
+    """
+    Vectorized equivalent of the per-tick loop: every event is a first-passage index
+    (argmax on a boolean mask) and the trailing anchor is a cumulative max/min.
+    SL is tested against the stop before BE tightening on the BE tick itself.
+    """
+    p = path.prices
+    n = p.size
+    fav = np.greater_equal if path.is_buy else np.less_equal
+    adv = np.less_equal if path.is_buy else np.greater_equal
+
+    def first_reach(r: Optional[float]) -> int:
+        return n if r is None else _first_true(fav(p, path_level(path, r)))
+
+    tp_i = first_reach(params.tp_r)
+    scale_i = first_reach(params.scaleout_r)
+    be_i = first_reach(params.be_trigger_r)
+    start_i = first_reach(params.trailing_start_r)
+
+    # SL: original stop up to and including the BE tick, tightened stop afterwards
+    sl_i = _first_true(adv(p[:be_i + 1], path.sl))
+    if sl_i >= min(be_i + 1, n):
+        sl_i = be_i + 1 + _first_true(adv(p[be_i + 1:], be_stop_price(path, params))) if be_i < n else n
+
+    # trailing: anchor is the running extreme since activation; no need to look past other exits
+    trail_i = n
+    trail_stop = None
+    if start_i < n:
+        seg = p[start_i:min(tp_i, sl_i, n - 1) + 1]
+        anchor = np.maximum.accumulate(seg) if path.is_buy else np.minimum.accumulate(seg)
+        gap = params.trailing_gap_r * path.risk
+        stops = anchor - gap if path.is_buy else anchor + gap
+        k = _first_true(adv(seg, stops))
+        if k < seg.size:
+            trail_i = start_i + k
+            trail_stop = float(stops[k])
+
+    scale_price = float(p[scale_i]) if scale_i < n else None
+    return settle_trade(path, params, n, start_i, be_i, scale_i, scale_price, tp_i, trail_i, trail_stop, sl_i)
+
+
 def simulate_trade(report_row: pd.Series, ticks: pd.DataFrame, params: ExitParams) -> Optional[SimResult]:
+    # inputs: report_row fields: Type, Price(entry), S / L, T / P(optional), Time, Time.1 (optional close window)
+    path = prepare_trade(report_row, ticks)
+    if path is None:
+        return None
+    return simulate_path(path, params)
+
+
+def simulate_trade_reference(report_row: pd.Series, ticks: pd.DataFrame, params: ExitParams) -> Optional[SimResult]:
+    """Original per-tick loop; the reference the vectorized kernels are checked against in tests/test_exit_kernels.py."""
     # inputs: report_row fields: Type, Price(entry), S / L, T / P(optional), Time, Time.1 (optional close window)
     entry = float(report_row["Price"]) if not math.isnan(report_row["Price"]) else None
     sl = float(report_row["S / L"]) if not math.isnan(report_row["S / L"]) else None
@@ -350,7 +615,17 @@ def monte_carlo_maxdd(r_values: List[float], runs: int = 1500, rng_seed: int = 4
 # Plotting
 # -----------------------------
 
+def _pyplot():
+    # matplotlib is only needed for the report plots; importing it lazily keeps the
+    # simulation kernels usable (and testable) without it.
+    import matplotlib
+    matplotlib.use("Agg")  # ensure non-interactive backend
+    import matplotlib.pyplot as plt
+    return plt
+
+
 def save_equity_curve(r_values: List[float], out_png: str) -> None:
+    plt = _pyplot()
     arr = np.array(r_values, dtype=float)
     equity = np.cumsum(arr) if arr.size > 0 else np.array([])
     plt.figure(figsize=(10, 4))
@@ -366,6 +641,7 @@ def save_equity_curve(r_values: List[float], out_png: str) -> None:
 
 
 def save_r_distribution(r_values: List[float], out_png: str) -> None:
+    plt = _pyplot()
     arr = np.array(r_values, dtype=float)
     plt.figure(figsize=(8, 4))
     plt.hist(arr, bins=40, alpha=0.8, edgecolor="black")
@@ -0,0 +1,197 @@
+"""
+Tree-structured Parzen Estimator (TPE) over continuous and conditional exit parameters,
+NumPy only.
+
+Every optional feature (scale-out, BE, TP, trailing) is either off (None) or on with a
+continuous level; dependent parameters (scaleout_frac, be_back_r, trailing_gap_r) are
+only sampled when their feature is on. Past evaluations are split into the best gamma
+fraction ("good") and the rest; candidates are drawn from the good density l(x) and the
+ones with the highest l(x) / g(x) are evaluated next.
+"""
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+@dataclass
+class Dim:
+    name: str
+    low: float
+    high: float
+    optional: bool = False         # None (feature off) is a value of its own
+    parent: Optional[str] = None   # only sampled when the parent is on, else default
+    default: Optional[float] = None
+
+
+SEARCH_SPACE: List[Dim] = [
+    Dim("scaleout_r", 0.5, 2.0, optional=True),
+    Dim("scaleout_frac", 0.1, 0.9, parent="scaleout_r", default=0.0),
+    Dim("be_trigger_r", 0.1, 1.5, optional=True),
+    Dim("be_back_r", 0.0, 0.3, parent="be_trigger_r", default=0.0),
+    Dim("tp_r", 0.8, 4.0, optional=True),
+    Dim("trailing_start_r", 0.5, 3.0, optional=True),
+    Dim("trailing_gap_r", 0.2, 1.5, parent="trailing_start_r", default=0.7),
+]
+
+_SQRT2 = math.sqrt(2.0)
+_erf = np.frompyfunc(math.erf, 1, 1)
+
+
+def _norm_cdf(z: np.ndarray) -> np.ndarray:
+    return 0.5 * (1.0 + _erf(np.asarray(z, dtype=np.float64) / _SQRT2).astype(np.float64))
+
+
+def is_valid(params: Dict[str, Any]) -> bool:
+    # same constraint as grid_space_iter
+    return not (params.get("tp_r") is None and params.get("trailing_start_r") is None)
+
+
+class Parzen:
+    """Mixture of truncated Gaussians at the observations plus a uniform prior component."""
+
+    def __init__(self, obs: Sequence[float], low: float, high: float):
+        self.low, self.high = low, high
+        self.mu = np.asarray(obs, dtype=np.float64)
+        width = high - low
+        n = self.mu.size
+        if n > 1:
+            bw = 1.06 * float(np.std(self.mu)) * n ** (-0.2)
+        else:
+            bw = width / 2
+        self.bw = min(max(bw, width / 50), width / 2)
+        self.prior_w = 1.0 / (n + 1)
+        mass = _norm_cdf((high - self.mu) / self.bw) - _norm_cdf((low - self.mu) / self.bw)
+        self.mass = np.maximum(mass, 1e-12)
+
+    def sample(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        out = rng.uniform(self.low, self.high, size)
+        if self.mu.size == 0:
+            return out
+        from_kde = rng.random(size) >= self.prior_w
+        comp = rng.integers(0, self.mu.size, size)
+        x = rng.normal(self.mu[comp], self.bw)
+        for _ in range(10):  # truncation by rejection, clipped as a last resort
+            bad = (x < self.low) | (x > self.high)
+            if not bad.any():
+                break
+            x[bad] = rng.normal(self.mu[comp[bad]], self.bw)
+        x = np.clip(x, self.low, self.high)
+        return np.where(from_kde, x, out)
+
+    def logpdf(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float64)
+        dens = np.full(x.shape, self.prior_w / (self.high - self.low))
+        if self.mu.size:
+            z = (x[:, None] - self.mu[None, :]) / self.bw
+            k = np.exp(-0.5 * z * z) / (self.bw * math.sqrt(2 * math.pi) * self.mass[None, :])
+            dens = dens + (1 - self.prior_w) * k.mean(axis=1)
+        return np.log(dens)
+
+
+class TPESampler:
+    def __init__(self, space: List[Dim] = None, gamma: float = 0.1, n_startup: int = 20,
+                 n_candidates: int = 64, seed: int = 42, decimals: int = 3):
+        self.space = space or SEARCH_SPACE
+        self.gamma = gamma
+        self.n_startup = n_startup
+        self.n_candidates = n_candidates
+        self.decimals = decimals
+        self.rng = np.random.default_rng(seed)
+
+    # ---------- sampling ----------
+    def _round(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: (None if v is None else round(float(v), self.decimals)) for k, v in params.items()}
+
+    def _random(self) -> Dict[str, Any]:
+        p: Dict[str, Any] = {}
+        for d in self.space:
+            if d.parent is not None and p.get(d.parent) is None:
+                p[d.name] = d.default
+            elif d.optional and self.rng.random() < 0.5:
+                p[d.name] = None
+            else:
+                p[d.name] = self.rng.uniform(d.low, d.high)
+        return p
+
+    def _split(self, history: List[Tuple[Dict[str, Any], float]]):
+        scores = np.array([s if s is not None and np.isfinite(s) else -np.inf for _, s in history])
+        order = np.argsort(-scores, kind="stable")
+        n_good = max(1, int(math.ceil(self.gamma * len(history))))
+        good = [history[i][0] for i in order[:n_good]]
+        bad = [history[i][0] for i in order[n_good:]]
+        return good, bad
+
+    def _models(self, group: List[Dict[str, Any]]):
+        models = {}
+        for d in self.space:
+            on = [p[d.name] for p in group
+                  if p.get(d.name) is not None and (d.parent is None or p.get(d.parent) is not None)]
+            p_on = (len(on) + 1) / (len(group) + 2) if d.optional else None
+            models[d.name] = (p_on, Parzen(on, d.low, d.high))
+        return models
+
+    def _draw(self, models, size: int) -> List[Dict[str, Any]]:
+        cols: Dict[str, np.ndarray] = {}
+        on: Dict[str, np.ndarray] = {}
+        for d in self.space:
+            p_on, kde = models[d.name]
+            if d.parent is not None:
+                on[d.name] = on[d.parent]
+            elif d.optional:
+                on[d.name] = self.rng.random(size) < p_on
+            else:
+                on[d.name] = np.ones(size, dtype=bool)
+            cols[d.name] = kde.sample(self.rng, size)
+        out = []
+        for i in range(size):
+            p = {}
+            for d in self.space:
+                if on[d.name][i]:
+                    p[d.name] = float(cols[d.name][i])
+                else:
+                    p[d.name] = d.default if d.parent is not None else None
+            out.append(p)
+        return out
+
+    def _log_ratio(self, cands: List[Dict[str, Any]], good, bad) -> np.ndarray:
+        score = np.zeros(len(cands))
+        for d in self.space:
+            (pl, kl), (pg, kg) = good[d.name], bad[d.name]
+            vals = np.array([np.nan if c[d.name] is None else c[d.name] for c in cands], dtype=np.float64)
+            parent_on = np.array([d.parent is None or c.get(d.parent) is not None for c in cands])
+            is_on = ~np.isnan(vals) & parent_on
+            if d.optional:
+                score += np.where(is_on, math.log(pl) - math.log(pg), math.log(1 - pl) - math.log(1 - pg))
+            if is_on.any():
+                score[is_on] += kl.logpdf(vals[is_on]) - kg.logpdf(vals[is_on])
+        return score
+
+    def suggest(self, history: List[Tuple[Dict[str, Any], float]], n: int) -> List[Dict[str, Any]]:
+        """n new parameter dicts given [(params, score)] history (higher score is better)."""
+        seen = {tuple(sorted(self._round(p).items(), key=lambda kv: kv[0])) for p, _ in history}
+        batch: List[Dict[str, Any]] = []
+        use_model = len(history) >= self.n_startup
+        if use_model:
+            good_hist, bad_hist = self._split(history)
+            good, bad = self._models(good_hist), self._models(bad_hist)
+        attempts = 0
+        while len(batch) < n and attempts < 50 * n:
+            attempts += 1
+            if use_model:
+                cands = [c for c in self._draw(good, self.n_candidates) if is_valid(c)]
+                if not cands:
+                    continue
+                p = cands[int(np.argmax(self._log_ratio(cands, good, bad)))]
+            else:
+                p = self._random()
+                if not is_valid(p):
+                    continue
+            p = self._round(p)
+            key = tuple(sorted(p.items(), key=lambda kv: kv[0]))
+            if key in seen:
+                continue
+            seen.add(key)
+            batch.append(p)
+        return batch
@@ -1,6 +1,6 @@
 from metatrader5_config import TRADING_CONFIG
 
-def get_legs(data, custom_threshold=None, verbose: bool=False):
+def get_legs(data, custom_threshold=None, verbose: bool=False, pip_multiplier: float=10000):
     threshold = custom_threshold if custom_threshold else TRADING_CONFIG['threshold']
     if verbose:
         print(f'Using threshold: {threshold}')
@@ -34,7 +34,7 @@ def get_legs(data, custom_threshold=None, verbose: bool=False):
 
     ##################                ###############################################################   
 
-        price_diff = abs(current_price - start_price) * 10000
+        price_diff = abs(current_price - start_price) * pip_multiplier
         
         if j>0:
             timestamp_value = legs[j-1]['start']
@@ -86,7 +86,7 @@ def get_legs(data, custom_threshold=None, verbose: bool=False):
                             start_price = row['high']
                         else:
                             start_price = row['low']
-                price_diff = abs(current_price - start_price) * 10000
+                price_diff = abs(current_price - start_price) * pip_multiplier
                 legs.append({
                     'start': start_index,
                     'start_value': start_price,
@@ -103,7 +103,7 @@ def get_legs(data, custom_threshold=None, verbose: bool=False):
         elif j>0 and legs[j-1]['direction'] == 'up' and data['high'].iloc[i] >= data['high'].loc[start_index] and price_diff < threshold:
             
             if j > 1 :
-                price_diff = custom_price_diff(data=data, j=j, current_price=current_price, legs=legs)
+                price_diff = custom_price_diff(data=data, j=j, current_price=current_price, legs=legs, pip_multiplier=pip_multiplier)
                 
             else:
                 price_diff += legs[j-1]['length']
@@ -118,7 +118,7 @@ def get_legs(data, custom_threshold=None, verbose: bool=False):
         elif j>0 and legs[j-1]['direction'] == 'down' and data['low'].iloc[i] <= data['low'].loc[start_index] and price_diff < threshold:
             
             if j > 1 :
-                price_diff = custom_price_diff(data=data, j=j, current_price=current_price, legs=legs)
+                price_diff = custom_price_diff(data=data, j=j, current_price=current_price, legs=legs, pip_multiplier=pip_multiplier)
                 
             else:
                 price_diff += legs[j-1]['length']
@@ -136,14 +136,14 @@ def get_legs(data, custom_threshold=None, verbose: bool=False):
     return legs
 
 
-def custom_price_diff(data, j, current_price=0, legs=[]):
+def custom_price_diff(data, j, current_price=0, legs=[], pip_multiplier=10000):
     
     timestamp_value = legs[j-2]['end']
     row = data.loc[timestamp_value]
     
     if legs[j-2]['direction'] == 'up':
-        price_diff = abs(current_price - row['high']) * 10000
+        price_diff = abs(current_price - row['high']) * pip_multiplier
         return price_diff
     else:
-        price_diff = abs(current_price - row['low']) * 10000
+        price_diff = abs(current_price - row['low']) * pip_multiplier
         return price_diff
@@ -1,21 +1,36 @@
 import os
+import argparse
 import json
-from typing import List, Dict, Any, Optional
+import multiprocessing as mp
+from typing import List, Dict, Any, Optional, Tuple
 
 import pandas as pd
 import numpy as np
 
 from exit_optimizer_core import (
     read_report_csv,
-    load_ticks_for_window,
     ExitParams,
-    simulate_trade,
     compute_metrics,
     monte_carlo_maxdd,
     save_equity_curve,
     save_r_distribution,
-    params_to_dict,
+    params_array,
     grid_space_iter,
+    EXIT_REASONS,
+    clear_ticks_cache,
+    ticks_cache_nbytes,
+    trade_tick_files,
+    DEFAULT_TICK_CACHE_MB,
+    TICKS_CACHE,
+)
+from exit_param_tpe import TPESampler
+from excursion_profile import (
+    ExcursionProfile,
+    attach_profiles,
+    evaluate_profile,
+    evaluate_profile_batch,
+    load_trade_profile,
+    share_profiles,
 )
 
 
@@ -26,6 +41,7 @@ OUTPUT_TOP20 = os.path.join(PROJECT_ROOT, "exit_grid_top20.csv")
 OUTPUT_BEST_TXT = os.path.join(PROJECT_ROOT, "best_config.txt")
 OUTPUT_BEST_EQUITY = os.path.join(PROJECT_ROOT, "equity_curve_best.png")
 OUTPUT_BEST_DIST = os.path.join(PROJECT_ROOT, "r_distribution_best.png")
+OUTPUT_TPE_HISTORY = os.path.join(PROJECT_ROOT, "exit_tpe_history.json")
 
 
 def get_trade_window(row: pd.Series) -> (pd.Timestamp, pd.Timestamp):
@@ -35,74 +51,154 @@ def get_trade_window(row: pd.Series) -> (pd.Timestamp, pd.Timestamp):
     return start, end
 
 
-def run_grid_search() -> None:
-    df_report = read_report_csv(REPORT_PATH)
-    if df_report.empty:
-        print("No trades in report after filtering. Exiting.")
-        return
+def evaluate_chunk(profiles: List[ExcursionProfile], params: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(trades x params) r_total (NaN = not simulated) and exit reason codes for a params_array chunk."""
+    r = np.full((len(profiles), len(params)), np.nan)
+    codes = np.zeros((len(profiles), len(params)), dtype=np.int8)
+    for t, prof in enumerate(profiles):
+        r[t], codes[t], _ = evaluate_profile_batch(prof, params)
+    return r, codes
 
-    print(f"🔄 Starting grid search with {len(df_report)} trades")
-    print("📦 Tick file caching is enabled - first iteration will be slower, subsequent ones faster")
-
-    # grid space definition per user spec
-    grid_space = {
-        "scaleout_r": [None, 1.0],
-        "scaleout_frac": [0.0, 0.5, 0.6],
-        "be_trigger_r": [None, 0.2, 0.5, 0.7],
-        "be_back_r": [0.0, 0.1],
-        "tp_r": [1.2, 1.5, 2.0, None],
-        "trailing_start_r": [1.5, 2.0, None],
-        "trailing_gap_r": [0.4, 0.5, 0.7],
-    }
 
-    all_results: List[Dict[str, Any]] = []
+# Worker state: profiles are views into the parent's shared memory block, attached once per process
+_WORKER: Dict[str, Any] = {}
 
-    # Pre-group report trades by symbol to limit tick IO
-    df_report = df_report.sort_values("Time")
-    skipped_no_ticks = 0
-    total_considered = 0
-    
-    # Count total parameter combinations
-    total_combinations = sum(1 for _ in grid_space_iter(grid_space))
-    print(f"🎯 Testing {total_combinations} parameter combinations")
-
-    combination_num = 0
-    for params_dict in grid_space_iter(grid_space):
-        combination_num += 1
-        params = ExitParams(**params_dict)
-        r_values: List[float] = []
-        reasons: List[str] = []
-        
-        # Print progress every 10 combinations
-        if combination_num % 10 == 0 or combination_num == 1:
-            print(f"⏳ Progress: {combination_num}/{total_combinations} combinations tested...")
-
-        for _, row in df_report.iterrows():
-            total_considered += 1
-            symbol = str(row["Symbol"]).upper()
-            start, end = get_trade_window(row)
-            ticks = load_ticks_for_window(symbol, start, end, PROJECT_ROOT)
-            if ticks.empty:
-                skipped_no_ticks += 1
-                continue
-            sim = simulate_trade(row, ticks, params)
-            if sim is None:
-                continue
-            r_values.append(sim.r_total)
-            reasons.append(sim.exit_reason)
 
-        metrics = compute_metrics(r_values)
-        all_results.append({
-            **params_dict,
-            "n_trades": len(r_values),
-            "skipped_no_ticks": skipped_no_ticks,
-            **metrics,
-            "reasons_sample": reasons[:5],
-        })
+def _init_worker(handle: tuple) -> None:
+    _WORKER["shm"], _WORKER["profiles"] = attach_profiles(handle)
+
+
+def _select(profiles: List[ExcursionProfile], trades: Optional[np.ndarray]) -> List[ExcursionProfile]:
+    return profiles if trades is None else [profiles[t] for t in trades]
+
+
+def _evaluate_task(task: Tuple[int, np.ndarray, Optional[np.ndarray]]):
+    start, params, trades = task
+    return start, *evaluate_chunk(_select(_WORKER["profiles"], trades), params)
+
+
+class ProfilePool:
+    """
+    Evaluates params_array chunks on the prepared profiles. With workers > 1 the profiles are
+    put in shared memory once and a process pool attached to them serves every call until
+    close(), so repeated evaluations (halving rungs, TPE batches) do not restart workers.
+    """
+
+    def __init__(self, profiles: List[ExcursionProfile], workers: int = 1):
+        self.profiles = profiles
+        self.workers = workers
+        self._shm = None
+        self._pool = None
+        if workers > 1:
+            self._shm, handle = share_profiles(profiles)
+            self._pool = mp.Pool(workers, initializer=_init_worker, initargs=(handle,))
+            print(f"🚀 Parallel mode: {workers} workers, profiles shared in memory")
 
+    def __enter__(self) -> "ProfilePool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def iter_chunks(self, tasks: list):
+        """Yield (start, r, codes) per (start, params, trades) task, in completion order."""
+        if self._pool is None:
+            for start, params, trades in tasks:
+                yield (start, *evaluate_chunk(_select(self.profiles, trades), params))
+            return
+        chunksize = max(1, len(tasks) // (self.workers * 8))
+        yield from self._pool.imap_unordered(_evaluate_task, tasks, chunksize=chunksize)
+
+
+# grid space definition per user spec
+GRID_SPACE = {
+    "scaleout_r": [None, 1.0],
+    "scaleout_frac": [0.0, 0.5, 0.6],
+    "be_trigger_r": [None, 0.2, 0.5, 0.7],
+    "be_back_r": [0.0, 0.1],
+    "tp_r": [1.2, 1.5, 2.0, None],
+    "trailing_start_r": [1.5, 2.0, None],
+    "trailing_gap_r": [0.4, 0.5, 0.7],
+}
+
+
+def prepare_profiles(df_report: pd.DataFrame, tick_cache_mb: int = DEFAULT_TICK_CACHE_MB,
+                     pin_months: bool = False) -> Tuple[List[ExcursionProfile], int]:
+    """
+    Prepare every trade once: its excursion profile comes from the disk cache or from a single
+    slice of its ticks; all combinations and the best-config re-simulation reuse it.
+    Returns (profiles in report order, number of trades without ticks).
+    """
+    TICKS_CACHE.set_budget(tick_cache_mb * 1024 * 1024)
+    if pin_months:
+        TICKS_CACHE.pin(trade_tick_files(df_report, get_trade_window, PROJECT_ROOT))
+    prep_stats: Dict[str, int] = {}
+    n_no_ticks = 0
+    profiles: List[ExcursionProfile] = []
+    for _, row in df_report.iterrows():
+        start, end = get_trade_window(row)
+        n_ticks, prof = load_trade_profile(row, str(row["Symbol"]).upper(), start, end, PROJECT_ROOT, stats=prep_stats)
+        if n_ticks == 0:
+            n_no_ticks += 1
+        elif prof is not None:
+            profiles.append(prof)
+    mb = 1024 * 1024
+    print(f"🧮 Prepared {len(profiles)} trades ({n_no_ticks} without ticks): "
+          f"{prep_stats.get('cache_hits', 0)} profiles from cache, {prep_stats.get('built', 0)} built | "
+          f"memory: profiles {sum(p.nbytes() for p in profiles) / mb:.2f} MB, "
+          f"tick slices {prep_stats.get('slice_bytes', 0) / mb:.1f} MB (released), "
+          f"monthly tick cache {ticks_cache_nbytes() / mb:.1f} MB (released)")
+    print(f"🗃️ {TICKS_CACHE.summary()}")
+    TICKS_CACHE.unpin()
+    clear_ticks_cache()
+    return profiles, n_no_ticks
+
+
+def evaluate_combos(pool: ProfilePool, params: np.ndarray, trades: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (trades x combinations) r_total and exit reason codes over all profiles of the pool, or the
+    given profile indices; every trade evaluates a chunk of combinations in one batch call.
+    """
+    total = len(params)
+    chunk = 256 if pool.workers <= 1 else max(1, -(-total // (pool.workers * 8)))
+    tasks = [(start, params[start:start + chunk], trades) for start in range(0, total, chunk)]
+    n_trades = len(pool.profiles) if trades is None else len(trades)
+    r = np.full((n_trades, total), np.nan)
+    codes = np.zeros((n_trades, total), dtype=np.int8)
+    done = 0
+    for start, r_chunk, codes_chunk in pool.iter_chunks(tasks):
+        print(f"⏳ Progress: {done}/{total} combinations tested...")
+        done += r_chunk.shape[1]
+        r[:, start:start + r_chunk.shape[1]] = r_chunk
+        codes[:, start:start + r_chunk.shape[1]] = codes_chunk
+    return r, codes
+
+
+def result_row(params_dict: Dict[str, Any], ci: int, r: np.ndarray, codes: np.ndarray, n_no_ticks: int) -> Dict[str, Any]:
+    """One line of exit_grid_results.csv from the r/codes column of a combination (trades in report order)."""
+    valid = ~np.isnan(r)
+    return {
+        **params_dict,
+        "n_trades": int(valid.sum()),
+        "skipped_no_ticks": (ci + 1) * n_no_ticks,  # cumulative over combinations, as before
+        **compute_metrics(r[valid].tolist()),
+        "reasons_sample": [EXIT_REASONS[c] for c in codes[valid][:5]],
+    }
+
+
+def write_outputs(df_all: pd.DataFrame, profiles: List[ExcursionProfile]) -> None:
+    """Results CSVs, best_config.txt and the best config's charts; df_all is already ranked."""
     # Save full grid
-    df_all = pd.DataFrame(all_results)
-    df_all = df_all.sort_values(by=["average_R"], ascending=False)
     df_all.to_csv(OUTPUT_ALL, index=False)
 
     # Top 20
@@ -120,13 +216,8 @@ def run_grid_search() -> None:
         # Re-simulate best to get full r_values
         params = ExitParams(**best_params)
         r_values: List[float] = []
-        for _, row in df_report.iterrows():
-            symbol = str(row["Symbol"]).upper()
-            start, end = get_trade_window(row)
-            ticks = load_ticks_for_window(symbol, start, end, PROJECT_ROOT)
-            if ticks.empty:
-                continue
-            sim = simulate_trade(row, ticks, params)
+        for prof in profiles:
+            sim = evaluate_profile(prof, params)
             if sim is None:
                 continue
             r_values.append(sim.r_total)
@@ -152,11 +243,219 @@ def run_grid_search() -> None:
         save_equity_curve(r_values, OUTPUT_BEST_EQUITY)
         save_r_distribution(r_values, OUTPUT_BEST_DIST)
 
+
+def load_report() -> Optional[pd.DataFrame]:
+    df_report = read_report_csv(REPORT_PATH)
+    if df_report.empty:
+        print("No trades in report after filtering. Exiting.")
+        return None
+    # Pre-group report trades by symbol to limit tick IO
+    return df_report.sort_values("Time")
+
+
+def run_grid_search(workers: int = 1, tick_cache_mb: int = DEFAULT_TICK_CACHE_MB, pin_months: bool = False) -> None:
+    df_report = load_report()
+    if df_report is None:
+        return
+
+    print(f"🔄 Starting grid search with {len(df_report)} trades")
+    print("📦 Excursion profiles are cached in ticks/profiles - first run builds them from ticks, later runs skip raw ticks")
+    profiles, n_no_ticks = prepare_profiles(df_report, tick_cache_mb, pin_months)
+
+    combos = list(grid_space_iter(GRID_SPACE))
+    print(f"🎯 Testing {len(combos)} parameter combinations")
+    with ProfilePool(profiles, workers) as pool:
+        r, codes = evaluate_combos(pool, params_array(combos))
+
+    all_results = [result_row(d, ci, r[:, ci], codes[:, ci], n_no_ticks) for ci, d in enumerate(combos)]
+    df_all = pd.DataFrame(all_results)
+    df_all = df_all.sort_values(by=["average_R"], ascending=False)
+    write_outputs(df_all, profiles)
+
     print("Grid search complete.")
     print(f"Results -> {OUTPUT_ALL}\nTop20 -> {OUTPUT_TOP20}\nBest -> {OUTPUT_BEST_TXT}")
 
 
-if __name__ == "__main__":
-    run_grid_search()
+def halving_rungs(n_trades: int, min_trades: int, eta: int) -> List[int]:
+    """Trade counts per rung: min_trades * eta^k, the last rung always uses every trade."""
+    rungs = []
+    size = max(1, min_trades)
+    while size < n_trades:
+        rungs.append(size)
+        size *= eta
+    return rungs + [n_trades]
+
 
+def run_halving_search(workers: int = 1, tick_cache_mb: int = DEFAULT_TICK_CACHE_MB, pin_months: bool = False,
+                       eta: int = 3, min_trades: int = 10, z: float = 0.5, seed: int = 42) -> None:
+    """
+    Successive halving over the grid: every rung evaluates the surviving combinations on a
+    larger random subset of trades (only the trades they have not seen yet) and keeps the
+    best 1/eta ranked by the upper confidence bound average_R + z * stderr (profit_factor
+    breaks ties), so combinations that are uncertain rather than bad get another rung.
+    Survivors of the last rung are evaluated on every trade. Output files are the grid's;
+    rows are ranked by the rung a combination reached, then by average_R, and n_trades
+    shows how many trades each row is based on.
+    """
+    if eta < 2:
+        raise ValueError(f"eta must be >= 2, got {eta}")
+    if min_trades < 1:
+        raise ValueError(f"min_trades must be >= 1, got {min_trades}")
+    df_report = load_report()
+    if df_report is None:
+        return
+
+    print(f"🔄 Starting successive-halving search with {len(df_report)} trades (eta={eta}, min_trades={min_trades})")
+    profiles, n_no_ticks = prepare_profiles(df_report, tick_cache_mb, pin_months)
+    combos = list(grid_space_iter(GRID_SPACE))
+    params_all = params_array(combos)
+    n_trades, n_combos = len(profiles), len(combos)
+
+    # trades are added in a random order, metrics always use them in report order
+    order = np.random.default_rng(seed).permutation(n_trades)
+    r = np.full((n_trades, n_combos), np.nan)
+    codes = np.zeros((n_trades, n_combos), dtype=np.int8)
+    reached = np.zeros(n_combos, dtype=np.int64)
+    alive = np.arange(n_combos)
+    seen = 0
+    rungs = halving_rungs(n_trades, min_trades, eta)
+    evaluations = 0
+    with ProfilePool(profiles, workers) as pool:
+        for rung, size in enumerate(rungs):
+            new = order[seen:size]
+            print(f"🪜 Rung {rung + 1}/{len(rungs)}: {alive.size} combinations on {size} trades")
+            if new.size:
+                r_new, codes_new = evaluate_combos(pool, params_all[alive], new)
+                r[np.ix_(new, alive)] = r_new
+                codes[np.ix_(new, alive)] = codes_new
+                evaluations += new.size * alive.size
+            seen = size
+            reached[alive] = rung + 1
+            if rung == len(rungs) - 1:
+                break
 
+            sub = r[np.sort(order[:size])][:, alive]
+            valid = ~np.isnan(sub)
+            count = valid.sum(axis=0)
+            values = np.where(valid, sub, 0.0)
+            mean = values.sum(axis=0) / np.maximum(count, 1)
+            var = np.where(valid, (sub - mean) ** 2, 0.0).sum(axis=0) / np.maximum(count - 1, 1)
+            ucb = np.where(count > 0, mean + z * np.sqrt(var / np.maximum(count, 1)), -np.inf)
+            gains = np.where(valid & (sub > 0), sub, 0.0).sum(axis=0)
+            losses = -np.where(valid & (sub <= 0), sub, 0.0).sum(axis=0)
+            pf = np.where(losses > 0, gains / np.where(losses > 0, losses, 1.0), np.inf)
+            keep = max(1, -(-alive.size // eta))
+            ranked = np.lexsort((-pf, -ucb))
+            alive = np.sort(alive[ranked[:keep]])
+
+    all_results = []
+    for ci, d in enumerate(combos):
+        rows = np.sort(order[:rungs[reached[ci] - 1]])
+        all_results.append({**result_row(d, ci, r[rows, ci], codes[rows, ci], n_no_ticks), "rung": int(reached[ci])})
+    df_all = pd.DataFrame(all_results)
+    df_all = df_all.sort_values(by=["rung", "average_R"], ascending=False)
+    write_outputs(df_all, profiles)
+
+    print(f"Successive-halving search complete: {evaluations} trade evaluations "
+          f"({evaluations / max(n_trades * n_combos, 1):.0%} of the full grid).")
+    print(f"Results -> {OUTPUT_ALL}\nTop20 -> {OUTPUT_TOP20}\nBest -> {OUTPUT_BEST_TXT}")
+
+
+def _report_fingerprint(n_profiles: int) -> Dict[str, Any]:
+    st = os.stat(REPORT_PATH)
+    return {"report_size": st.st_size, "report_mtime_ns": st.st_mtime_ns, "n_profiles": n_profiles}
+
+
+def _load_tpe_history(fingerprint: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if not os.path.exists(OUTPUT_TPE_HISTORY):
+        return []
+    try:
+        with open(OUTPUT_TPE_HISTORY, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Ignoring unreadable TPE checkpoint {OUTPUT_TPE_HISTORY}: {e}")
+        return []
+    if state.get("fingerprint") != fingerprint:
+        print("⚠️ TPE checkpoint was made for a different report/tick set - starting over")
+        return []
+    return state.get("history", [])
+
+
+def _save_tpe_history(fingerprint: Dict[str, Any], history: List[Dict[str, Any]]) -> None:
+    tmp = OUTPUT_TPE_HISTORY + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "history": history}, f, indent=1)
+    os.replace(tmp, OUTPUT_TPE_HISTORY)
+
+
+def run_tpe_search(workers: int = 1, tick_cache_mb: int = DEFAULT_TICK_CACHE_MB, pin_months: bool = False,
+                   budget: int = 200, batch: int = 16, seed: int = 42, restart: bool = False) -> None:
+    """
+    Budgeted TPE search over continuous/conditional exit parameters (exit_param_tpe):
+    candidates are evaluated batch by batch on every trade (in parallel with workers > 1),
+    maximizing average_R. The history is checkpointed to exit_tpe_history.json after each
+    batch and resumed on the next run for the same report; output files are the grid's,
+    ranked by average_R over all evaluated candidates.
+    """
+    df_report = load_report()
+    if df_report is None:
+        return
+
+    print(f"🔄 Starting TPE search with {len(df_report)} trades (budget={budget}, batch={batch})")
+    profiles, n_no_ticks = prepare_profiles(df_report, tick_cache_mb, pin_months)
+    fingerprint = _report_fingerprint(len(profiles))
+    history = [] if restart else _load_tpe_history(fingerprint)
+    if history:
+        print(f"♻️ Resuming from {len(history)} checkpointed evaluations")
+
+    # the sampler's random state follows the history length so a resumed run continues deterministically
+    keys = list(GRID_SPACE)
+    with ProfilePool(profiles, workers) as pool:
+        while len(history) < budget:
+            sampler = TPESampler(seed=seed + len(history))
+            observed = [({k: h[k] for k in keys}, h["average_R"]) for h in history]
+            candidates = sampler.suggest(observed, min(batch, budget - len(history)))
+            if not candidates:
+                break
+            r, codes = evaluate_combos(pool, params_array(candidates))
+            for j, d in enumerate(candidates):
+                row = result_row(d, len(history), r[:, j], codes[:, j], n_no_ticks)
+                history.append({k: (v.item() if isinstance(v, np.generic) else v) for k, v in row.items()})
+            _save_tpe_history(fingerprint, history)
+            best = max(history, key=lambda h: h["average_R"] if np.isfinite(h["average_R"]) else -np.inf)
+            print(f"🧪 {len(history)}/{budget} evaluated, best average_R {best['average_R']:.4f}")
+
+    df_all = pd.DataFrame(history)
+    df_all = df_all.sort_values(by=["average_R"], ascending=False)
+    write_outputs(df_all, profiles)
+
+    print("TPE search complete.")
+    print(f"Results -> {OUTPUT_ALL}\nTop20 -> {OUTPUT_TOP20}\nBest -> {OUTPUT_BEST_TXT}\nHistory -> {OUTPUT_TPE_HISTORY}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grid search over exit parameters on tick data")
+    parser.add_argument("--search", choices=("grid", "halving", "tpe"), default="grid",
+                        help="full grid, successive halving on growing trade subsets, or TPE over continuous parameters")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes for the grid (0 = all cores, 1 = serial)")
+    parser.add_argument("--tick-cache-mb", type=int, default=DEFAULT_TICK_CACHE_MB, help="memory budget of the tick cache")
+    parser.add_argument("--pin-months", action="store_true", help="never evict the tick months this run needs")
+    parser.add_argument("--eta", type=int, default=3, help="halving: keep 1/eta of the combinations per rung")
+    parser.add_argument("--min-trades", type=int, default=10, help="halving: trades in the first rung")
+    parser.add_argument("--budget", type=int, default=200, help="tpe: total evaluations (resumed runs count the checkpoint)")
+    parser.add_argument("--batch", type=int, default=16, help="tpe: candidates evaluated per batch")
+    parser.add_argument("--restart", action="store_true", help="tpe: ignore the checkpointed history")
+    args = parser.parse_args()
+    if args.eta < 2:
+        parser.error("--eta must be >= 2")
+    if args.min_trades < 1:
+        parser.error("--min-trades must be >= 1")
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    if args.search == "halving":
+        run_halving_search(workers, args.tick_cache_mb, args.pin_months, eta=args.eta, min_trades=args.min_trades)
+    elif args.search == "tpe":
+        run_tpe_search(workers, args.tick_cache_mb, args.pin_months, budget=args.budget, batch=args.batch,
+                       restart=args.restart)
+    else:
+        run_grid_search(workers, args.tick_cache_mb, args.pin_months)
@@ -0,0 +1,234 @@
+"""
+نگهداری فایل‌های لاگ: فشرده‌سازی فایل‌های بسته شده و حذف فایل‌های قدیمی.
+
+فایل‌های swing_logs_YYYY-MM-DD.txt و CSVهای analytics/raw بدون محدودیت رشد
+می‌کردند. چرخش (rotation) بر اساس روز و حجم LOG_CONFIG['max_log_size'] در خود
+نویسنده‌ها انجام می‌شود (save_file.log و analytics.hooks) و این ماژول در یک
+thread کم‌اولویت:
+  - فایل‌هایی که روزشان گذشته یا قطعه‌ی چرخیده (.1، .2، ...) هستند را با gzip
+    (یا zstd اگر zstandard نصب باشد) فشرده می‌کند،
+  - فایل‌های قدیمی‌تر از retention_days را حذف می‌کند.
+
+خواننده‌ها (tick_store.parse_ticks_csv، analyze_performance) فایل‌های .gz/.zst را با
+resolve_path / iter_log_files و pd.read_csv(compression='infer') می‌خوانند.
+
+اجرای دستی:
+    python housekeeping.py --once
+"""
+import argparse
+import gzip
+import os
+import re
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd اختیاری است
+    zstandard = None
+
+from metatrader5_config import LOG_CONFIG, HOUSEKEEPING_CONFIG
+
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
+_DAY_RE = re.compile(r'(\d{4}-\d{2}-\d{2})')
+_PART_RE = re.compile(r'\.\d+\.(csv|txt)$')
+
+
+def max_log_bytes() -> int:
+    return int(float(LOG_CONFIG.get('max_log_size', 10)) * 1024 * 1024)
+
+
+def rotated_path(path: Path) -> Path:
+    """اولین نام آزاد path.1.ext، path.2.ext، ... (بدون فشرده یا فشرده شده)."""
+    n = 1
+    while True:
+        candidate = path.with_name(f"{path.stem}.{n}{path.suffix}")
+        if not any(Path(str(candidate) + s).exists() for s in ('',) + COMPRESSED_SUFFIXES):
+            return candidate
+        n += 1
+
+
+def rotate_file(path: Path) -> Optional[Path]:
+    """فایل فعلی را به قطعه‌ی بعدی تغییر نام می‌دهد (نویسنده باید فایل را بسته باشد)."""
+    path = Path(path)
+    if not path.exists():
+        return None
+    target = rotated_path(path)
+    os.replace(path, target)
+    return target
+
+
+def resolve_path(path: str) -> Optional[str]:
+    """path یا نسخه فشرده‌ی آن (.gz/.zst)، هر کدام که وجود داشته باشد."""
+    for p in (path,) + tuple(path + s for s in COMPRESSED_SUFFIXES):
+        if os.path.exists(p):
+            return p
+    return None
+
+
+def iter_log_files(directory: Path, pattern: str) -> List[Path]:
+    """فایل‌های pattern به همراه نسخه‌های فشرده آن‌ها."""
+    directory = Path(directory)
+    files = list(directory.glob(pattern))
+    for s in COMPRESSED_SUFFIXES:
+        files.extend(directory.glob(pattern + s))
+    return sorted(files)
+
+
+def default_codec() -> str:
+    return 'zstd' if zstandard is not None else 'gzip'
+
+
+def compress_file(path: Path, codec: str = 'gzip', throttle_sec: float = 0.0) -> Path:
+    """فشرده‌سازی در فایل موقت و سپس os.replace؛ فایل اصلی بعد از موفقیت حذف می‌شود."""
+    path = Path(path)
+    if codec == 'zstd' and zstandard is None:
+        codec = 'gzip'
+    out = Path(str(path) + ('.zst' if codec == 'zstd' else '.gz'))
+    tmp = Path(str(out) + '.tmp')
+    chunk = 1024 * 1024
+    with open(path, 'rb') as src:
+        if codec == 'zstd':
+            with open(tmp, 'wb') as raw:
+                with zstandard.ZstdCompressor(level=10).stream_writer(raw) as dst:
+                    for block in iter(lambda: src.read(chunk), b''):
+                        dst.write(block)
+                        if throttle_sec:
+                            time.sleep(throttle_sec)
+        else:
+            with gzip.open(tmp, 'wb', compresslevel=6) as dst:
+                for block in iter(lambda: src.read(chunk), b''):
+                    dst.write(block)
+                    if throttle_sec:
+                        time.sleep(throttle_sec)
+    shutil.copystat(path, tmp)
+    os.replace(tmp, out)
+    os.remove(path)
+    return out
+
+
+def _file_day(name: str) -> Optional[str]:
+    m = _DAY_RE.search(name)
+    return m.group(1) if m else None
+
+
+def is_closed(path: Path, today: str) -> bool:
+    """قطعه‌ی چرخیده یا فایلی که روزش (در نام فایل) گذشته است؛ فایل فعال هرگز فشرده نمی‌شود."""
+    name = path.name
+    if name.endswith(COMPRESSED_SUFFIXES) or name.endswith('.tmp'):
+        return False
+    if _PART_RE.search(name):
+        return True
+    day = _file_day(name)
+    return day is not None and day < today
+
+
+class Housekeeper:
+    def __init__(self, targets: Iterable[tuple], codec: Optional[str] = None, retention_days: Optional[float] = 30,
+                 interval_sec: float = 900.0, throttle_sec: float = 0.01, log=None):
+        # targets: [(directory, glob pattern), ...]
+        self.targets = [(Path(d), p) for d, p in targets]
+        self.codec = codec or default_codec()
+        self.retention_days = retention_days
+        self.interval_sec = interval_sec
+        self.throttle_sec = throttle_sec
+        self.log = log
+        self.compressed = 0
+        self.deleted = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _today(self) -> str:
+        # کوچک‌ترین تاریخ محلی/UTC تا فایل روز جاری در هیچ‌کدام از نویسنده‌ها بسته فرض نشود
+        return min(time.strftime('%Y-%m-%d'), time.strftime('%Y-%m-%d', time.gmtime()))
+
+    def _emit(self, msg, color='cyan'):
+        if self.log:
+            try:
+                self.log(msg, color=color, save_to_file=False)
+            except Exception:
+                pass
+
+    def run_once(self) -> None:
+        today = self._today()
+        cutoff = time.time() - self.retention_days * 86400 if self.retention_days else None
+        for directory, pattern in self.targets:
+            if not directory.exists():
+                continue
+            for path in iter_log_files(directory, pattern):
+                if self._stop.is_set():
+                    return
+                try:
+                    closed = is_closed(path, today)
+                    old = cutoff is not None and path.stat().st_mtime < cutoff
+                    if old and (closed or path.name.endswith(COMPRESSED_SUFFIXES)):
+                        path.unlink()
+                        self.deleted += 1
+                        continue
+                    if closed:
+                        compress_file(path, self.codec, self.throttle_sec)
+                        self.compressed += 1
+                except FileNotFoundError:
+                    continue
+                except Exception as e:
+                    self._emit(f"⚠️ Housekeeping failed for {path}: {e}", color='yellow')
+
+    def _run(self) -> None:
+        try:
+            os.nice(10)  # در لینوکس فقط همین thread کم‌اولویت می‌شود
+        except (AttributeError, OSError):
+            pass
+        while not self._stop.is_set():
+            before = (self.compressed, self.deleted)
+            self.run_once()
+            if (self.compressed, self.deleted) != before:
+                self._emit(f"🧹 Housekeeping: compressed={self.compressed} deleted={self.deleted}")
+            self._stop.wait(self.interval_sec)
+
+    def start(self) -> 'Housekeeper':
+        self._thread = threading.Thread(target=self._run, name="housekeeping", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def default_targets() -> List[tuple]:
+    from analytics import hooks
+    targets = [(Path.cwd(), 'swing_logs_*.txt')]
+    for d in (hooks.MARKET_DIR, hooks.SIGNAL_DIR, hooks.TRADE_DIR, hooks.EVENT_DIR):
+        targets.append((d, '*.csv'))
+    return targets
+
+
+def start_housekeeper(log=None) -> Optional[Housekeeper]:
+    cfg = HOUSEKEEPING_CONFIG
+    if not cfg.get('enable', True):
+        return None
+    codec = None if cfg.get('compression', 'auto') == 'auto' else cfg['compression']
+    return Housekeeper(default_targets(), codec=codec, retention_days=cfg.get('retention_days'),
+                       interval_sec=cfg.get('interval_sec', 900), log=log).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compress closed log files and enforce retention")
+    parser.add_argument("--once", action="store_true", help="run a single pass and exit")
+    args = parser.parse_args()
+    cfg = HOUSEKEEPING_CONFIG
+    codec = None if cfg.get('compression', 'auto') == 'auto' else cfg['compression']
+    hk = Housekeeper(default_targets(), codec=codec, retention_days=cfg.get('retention_days'),
+                     interval_sec=cfg.get('interval_sec', 900))
+    if args.once:
+        hk.run_once()
+        print(f"🧹 compressed={hk.compressed} deleted={hk.deleted} codec={hk.codec}")
+    else:
+        hk.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            hk.stop()
@@ -1,20 +1,29 @@
 import MetaTrader5 as mt5
 from datetime import datetime
-from fibo_calculate import fibonacci_retracement
 import numpy as np
 import pandas as pd
-from time import sleep
+from time import sleep, perf_counter_ns
 from colorama import init, Fore
 from get_legs import get_legs
 from mt5_connector import MT5Connector
 from swing import get_swing_points
 from utils import BotState
-from save_file import log
-import inspect, os
-from metatrader5_config import MT5_CONFIG, TRADING_CONFIG
+from save_file import log, debug, is_enabled
+import os
+from metatrader5_config import MT5_CONFIG, TRADING_CONFIG, ACCOUNTS_CONFIG, BAR_FEED_CONFIG, SNAPSHOT_CONFIG, SESSION_CONFIG, TRACE_CONFIG, METRICS_CONFIG, CYCLE_TIMING_CONFIG, PROFILER_CONFIG
 from live_exit_controller import LiveExitController
 from email_notifier import send_trade_email_async
-from analytics.hooks import log_signal, log_position_event
+from analytics.hooks import log_signal
+from account_fanout import AccountFanout, EntrySignal
+from bar_feed_shm import BarFeedPublisher
+from session_calendar import wait_for_session
+from state_snapshot import SnapshotManager, load_snapshot, validate_position_states, bars_from_array
+from strategy import apply_swing, advance_fib_state, resolve_entry_stop, manage_open_positions, blocking_position_reason
+from housekeeping import start_housekeeper
+import decision_trace as dtrace
+import metrics
+from cycle_timing import CycleTimer
+import runtime_profiler
 
 
 
@@ -78,33 +87,21 @@ def main():
     mt5_conn.check_market_state()
     print("-" * 50)
 
-    # --- Contextual logging wrapper: prefix logs with file:function:line ---
-    # Import original log function with alias to avoid conflict
-    from save_file import log as original_log
-    
-    def log(message: str, color: str | None = None, save_to_file: bool = True):
-        try:
-            frame = inspect.currentframe()
-            # Walk back to the caller outside this wrapper
-            caller = frame.f_back if frame else None
-            lineno = getattr(caller, 'f_lineno', None)
-            func = getattr(caller, 'f_code', None)
-            fname = getattr(func, 'co_filename', None) if func else None
-            funcname = getattr(func, 'co_name', None) if func else None
-            base = os.path.basename(fname) if fname else 'unknown'
-            prefix = f"[{base}:{funcname}:{lineno}] "
-            return original_log(prefix + str(message), color=color, save_to_file=save_to_file)
-        except Exception:
-            # Fallback to original log if anything goes wrong
-            return original_log(message, color=color, save_to_file=save_to_file)
-
     # اضافه کردن متغیر برای ذخیره آخرین داده
     last_data_time = None
+    cache_data = None
     wait_count = 0
     max_wait_cycles = 120  # پس از 60 ثانیه (120 * 0.5) اجبار به پردازش
     # نگهداری وضعیت قبلی قابلیت معامله برای ریست در انتهای ساعات ترید
     last_can_trade_state = None
 
+    def session_warmup():
+        # قبل از باز شدن جلسه: مشخصات نماد و تاریخچه کندل‌ها را در ترمینال گرم کن
+        log("🔥 Session warm-up: refreshing symbol specs and prefetching bars", color='cyan')
+        mt5_conn.check_symbol_properties()
+        mt5_conn.refresh_symbol_specs()
+        mt5_conn.get_historical_data(count=window_size * 2)
+
     # بعد از تعریف متغیرها در main()
     def reset_state_and_window():
         nonlocal start_index
@@ -133,32 +130,90 @@ def main():
         print(f"   ⚠️  best_config.txt not found - optimizer disabled")
     print("-" * 50)
 
-    def _digits():
-        info = mt5.symbol_info(MT5_CONFIG['symbol'])
-        return info.digits if info else 5
-
-    def _round(p):
-        return float(f"{p:.{_digits()}f}")
-
-    def has_open_positions():
-        """بررسی وجود پوزیشن‌های باز"""
-        positions = mt5_conn.get_positions()
-        return positions is not None and len(positions) > 0
+    # راه‌اندازی مجدد گرم: بازیابی BotState و position_states از آخرین snapshot
+    snapshots = None
+    if SNAPSHOT_CONFIG.get('enable'):
+        snap_path = os.path.join(project_root, SNAPSHOT_CONFIG['path'].format(symbol=mt5_conn.symbol))
+        snapshots = SnapshotManager(snap_path, mt5_conn.symbol,
+                                    interval_sec=SNAPSHOT_CONFIG.get('interval_sec', 30),
+                                    max_bars=SNAPSHOT_CONFIG.get('max_bars', 200))
+        payload, reason = load_snapshot(snap_path, mt5_conn.symbol, SNAPSHOT_CONFIG.get('max_age_sec'))
+        if payload:
+            state.load_dict(payload['state'])
+            last_swing_type = payload.get('last_swing_type')
+            position_states.update(validate_position_states(payload.get('position_states'), mt5_conn.get_positions()))
+            # پنجره کندل‌ها تا اولین دریافت موفق از MT5 (و برای snapshotهای بعدی) از snapshot می‌آید
+            cache_data = bars_from_array(payload.get('bars'), mt5_conn.iran_tz)
+            last_data_time = payload.get('last_data_time')
+            if last_data_time is None and cache_data is not None:
+                last_data_time = cache_data.index[-1]
+            print(f"♻️  Warm restart ({reason}): swing={last_swing_type} fib={'yes' if state.fib_levels else 'no'} "
+                  f"touches={int(state.first_touch)}/{int(state.second_touch)} positions={len(position_states)} "
+                  f"bars={0 if cache_data is None else len(cache_data)} last_bar={last_data_time}")
+        else:
+            print(f"♻️  Cold start: {reason}")
+
+    # ارسال سیگنال به حساب‌های دیگر (هر حساب پروسه و ترمینال خودش)
+    fanout = None
+    if ACCOUNTS_CONFIG.get('enable') and ACCOUNTS_CONFIG.get('accounts'):
+        fanout = AccountFanout()
+        fanout.start()
+        print(f"📡 Account fan-out: {len(fanout.accounts)} account worker(s) started")
+
+    # انتشار کندل‌ها/تیک برای پروسه‌های محلی دیگر (بدون بار اضافه روی ترمینال)
+    bar_feed = None
+    if BAR_FEED_CONFIG.get('enable'):
+        try:
+            bar_feed = BarFeedPublisher(mt5_conn.symbol, capacity=BAR_FEED_CONFIG.get('capacity', 500))
+            print(f"🧩 Bar feed shared memory: {bar_feed.shm.name}")
+        except Exception as e:
+            print(f"⚠️ Bar feed disabled: {e}")
+
+    # فشرده‌سازی لاگ‌های بسته شده و حذف لاگ‌های قدیمی در پس‌زمینه
+    housekeeper = start_housekeeper(log)
+
+    # رکورد باینری تصمیم هر دور (python decision_trace.py decode/replay)
+    tracer = None
+    cycle = None
+    timer = CycleTimer(**CYCLE_TIMING_CONFIG)
+    if TRACE_CONFIG.get('enable'):
+        tracer = dtrace.DecisionTrace(os.path.join(project_root, TRACE_CONFIG.get('dir', 'traces')), mt5_conn.symbol,
+                                      flush_every=TRACE_CONFIG.get('flush_every', 20))
+
+    # endpoint محلی Prometheus (curl http://127.0.0.1:9108/metrics)
+    metrics_server = None
+    if METRICS_CONFIG.get('enable'):
+        metrics_server = metrics.start_metrics_server(METRICS_CONFIG.get('host', '127.0.0.1'), METRICS_CONFIG.get('port', 9108))
+
+    # پروفایل روی درخواست: فایل profile.request یا SIGUSR1/SIGUSR2
+    profiler = runtime_profiler.from_config(PROFILER_CONFIG, project_root, log)
+
+    def end_cycle(action=None):
+        timer.end()
+        if timer.over_budget:
+            log(f"🐢 Slow cycle {i}: {timer.breakdown()} (budget {timer.budget_ns / 1e6:.0f}ms)", level='warning', color='yellow')
+        if timer.due():
+            log(timer.format_report(), color='cyan')
+        if cycle is None:
+            return
+        if action is not None:
+            cycle.action = action
+        cycle.phase_ns[:] = timer.phase_ns
+        if timer.over_budget:
+            cycle.flags |= dtrace.F_OVER_BUDGET
+        try:
+            tracer.write(cycle)
+        except Exception:
+            pass
 
-    def has_conflicting_positions(intended_direction):
-        """بررسی وجود پوزیشن‌های مخالف با جهت مورد نظر
-        intended_direction: 'buy' یا 'sell'
-        """
-        positions = mt5_conn.get_positions()
-        if not positions:
-            return False
-        
-        for pos in positions:
-            if intended_direction == 'buy' and pos.type == mt5.POSITION_TYPE_SELL:
-                return True
-            elif intended_direction == 'sell' and pos.type == mt5.POSITION_TYPE_BUY:
-                return True
-        return False
+    def report_fills():
+        if not fanout:
+            return
+        for fill in fanout.drain_fills():
+            color = 'green' if fill['status'] in ('filled', 'ready') else 'yellow'
+            log(f"📡 [{fill['account']}] {fill['status']} {fill.get('direction') or ''} {fill.get('symbol') or ''} "
+                f"ticket={fill.get('ticket')} price={fill.get('price')} vol={fill.get('volume')} "
+                f"reason={fill.get('reason')} latency={fill.get('latency_ms') or 0:.0f}ms", color=color)
 
     def log_open_positions():
         """نمایش جزئیات پوزیشن‌های باز"""
@@ -183,149 +238,28 @@ def main():
         
         return f"{len(positions)} open position(s):\n" + "\n".join(summary)
 
-    def register_position(pos):
-        # محاسبه R (ریسک اولیه)
-        risk = abs(pos.price_open - pos.sl) if pos.sl else None
-        if not risk or risk == 0:
-            return
-        position_states[pos.ticket] = {
-            'entry': pos.price_open,
-            'risk': risk,
-            'direction': 'buy' if pos.type == mt5.POSITION_TYPE_BUY else 'sell',
-            'done_stages': set(),
-            'base_tp_R': 2.0,  # مقدار پیش‌فرض برای مرجع
-            'commission_locked': False
-        }
-        # رویداد ثبت پوزیشن
-        try:
-            log_position_event(
-                symbol=MT5_CONFIG['symbol'],
-                ticket=pos.ticket,
-                event='open',
-                direction=position_states[pos.ticket]['direction'],
-                entry=pos.price_open,
-                current_price=pos.price_open,
-                sl=pos.sl,
-                tp=pos.tp,
-                profit_R=0.0,
-                stage=0,
-                risk_abs=risk,
-                locked_R=None,
-                volume=pos.volume,
-                note='position registered'
-            )
-        except Exception:
-            pass
-
-    def manage_open_positions():
-        """
-        مدیریت پوزیشن‌های باز با Trailing Stop
-        فقط از EXIT_MANAGEMENT_CONFIG استفاده می‌کند (DYNAMIC_RISK_CONFIG غیرفعال)
-        """
-        # بررسی فعال بودن مدیریت خروج
-        from metatrader5_config import EXIT_MANAGEMENT_CONFIG
-        if not EXIT_MANAGEMENT_CONFIG.get('enable'):
-            return
-        
-        # بررسی فعال بودن Trailing Stop
-        if not EXIT_MANAGEMENT_CONFIG.get('trailing_stop', {}).get('enable'):
-            return
-            
-        positions = mt5_conn.get_positions()
-        if not positions:
-            return
-        tick = mt5.symbol_info_tick(MT5_CONFIG['symbol'])
-        if not tick:
-            return
-        
-        # تنظیمات Trailing Stop
-        trailing_start_r = EXIT_MANAGEMENT_CONFIG['trailing_stop']['start_r']
-        trailing_gap_r = EXIT_MANAGEMENT_CONFIG['trailing_stop']['gap_r']
-        
-        for pos in positions:
-            # ثبت پوزیشن اگر جدید است
-            if pos.ticket not in position_states:
-                register_position(pos)
-            
-            st = position_states.get(pos.ticket)
-            if not st:
-                continue
-            
-            entry = st['entry']
-            risk = st['risk']
-            direction = st['direction']
-            cur_price = tick.bid if direction == 'buy' else tick.ask
-            
-            # محاسبه سود بر حسب R
-            if direction == 'buy':
-                price_profit = cur_price - entry
-            else:
-                price_profit = entry - cur_price
-            profit_R = price_profit / risk if risk else 0.0
-            
-            # بررسی فعال شدن Trailing Stop
-            trailing_active = st.get('trailing_active', False)
-            
-            # فعال‌سازی Trailing Stop اگر به 1.5R رسید
-            if not trailing_active and profit_R >= trailing_start_r:
-                st['trailing_active'] = True
-                trailing_active = True
-                log(f'🔥 Trailing Stop ACTIVATED for ticket {pos.ticket} at {profit_R:.2f}R', color='yellow')
-            
-            # اگر Trailing فعال است، SL را جابجا کن
-            if trailing_active:
-                # محاسبه Trailing Stop با فاصله gap_r از قیمت فعلی
-                gap = trailing_gap_r * risk
-                if direction == 'buy':
-                    trail_sl = cur_price - gap
-                else:
-                    trail_sl = cur_price + gap
-                
-                trail_sl_r = _round(trail_sl)
-                
-                # فقط اگر SL جدید بهتر از قبلی باشد
-                apply = False
-                if direction == 'buy' and trail_sl_r > pos.sl:
-                    apply = True
-                elif direction == 'sell' and trail_sl_r < pos.sl:
-                    apply = True
-                
-                if apply:
-                    res = mt5_conn.modify_sl_tp(pos.ticket, new_sl=trail_sl_r, new_tp=pos.tp)
-                    if res and getattr(res, 'retcode', None) == 10009:
-                        log(f'⬆️ Trailing Stop updated: ticket={pos.ticket} | Profit: {profit_R:.2f}R | New SL: {trail_sl_r}', color='cyan')
-                        try:
-                            log_position_event(
-                                symbol=MT5_CONFIG['symbol'],
-                                ticket=pos.ticket,
-                                event='trailing_update',
-                                direction=direction,
-                                entry=entry,
-                                current_price=cur_price,
-                                sl=trail_sl_r,
-                                tp=pos.tp,
-                                profit_R=profit_R,
-                                stage=None,
-                                risk_abs=risk,
-                                locked_R=(trail_sl_r - entry) / risk if direction == 'buy' else (entry - trail_sl_r) / risk,
-                                volume=pos.volume,
-                                note=f'trailing stop update at {profit_R:.2f}R'
-                            )
-                        except Exception:
-                            pass
-            
-            # ذخیره وضعیت
-            position_states[pos.ticket] = st
-
     while True:
         try:
-            # بررسی ساعات معاملاتی
-            can_trade, trade_message = mt5_conn.can_trade()
+            if profiler:
+                profiler.poll()
+            # بررسی ساعات معاملاتی: تقویم از پیش محاسبه شده، IPC فقط داخل جلسه
+            # next_change (چند localize) فقط در مسیر بسته بودن جلسه محاسبه می‌شود
+            now_iran = mt5_conn.get_iran_time()
+            in_session = mt5_conn.session_calendar.is_open(now_iran)
+            if in_session:
+                can_trade, trade_message = mt5_conn.can_trade()
+            else:
+                next_change = mt5_conn.session_calendar.next_change(now_iran)
+                next_open = f"{next_change:%Y-%m-%d %H:%M}" if next_change else "unknown"
+                can_trade, trade_message = False, f"Session closed - next open {next_open} (Iran)"
             # اگر از حالت قابل معامله به غیرقابل معامله تغییر کرد => ریست کامل BotState
             try:
                 if last_can_trade_state is True and not can_trade:
                     log("🧹 Trading hours ended -> resetting BotState to avoid stale context", color='magenta')
                     state.reset()
+                    if snapshots:
+                        snapshots.maybe_save(state, last_swing_type, position_states,
+                                             bars_df=cache_data, last_data_time=last_data_time, force=True)
             except Exception:
                 pass
             finally:
@@ -333,18 +267,38 @@ def main():
             
             if not can_trade:
                 log(f"⏰ {trade_message}", color='yellow', save_to_file=False)
-                sleep(60)
+                if in_session:
+                    sleep(60)
+                else:
+                    wait_for_session(
+                        mt5_conn.session_calendar, mt5_conn.get_iran_time,
+                        warmup_sec=SESSION_CONFIG.get('warmup_sec', 60),
+                        warmup=session_warmup,
+                        max_chunk_sec=SESSION_CONFIG.get('max_sleep_chunk_sec', 900),
+                        log=log,
+                    )
                 continue
             
             # دریافت داده از MT5
-            cache_data = mt5_conn.get_historical_data(count=window_size * 2)
+            timer.begin()
+            cycle = tracer.begin(i) if tracer else None
+            fetched = mt5_conn.get_historical_data(count=window_size * 2)
+            timer.mark('fetch')
             
-            if cache_data is None:
+            if fetched is None:
+                # پنجره قبلی (یا پنجره snapshot) برای ذخیره بعدی حفظ می‌شود
                 log("❌ Failed to get data from MT5", color='red')
                 sleep(5)
                 continue
+            cache_data = fetched
                 
             cache_data['status'] = np.where(cache_data['open'] > cache_data['close'], 'bearish', 'bullish')
+            if bar_feed:
+                try:
+                    bar_feed.publish_bars(cache_data)
+                    bar_feed.publish_tick(mt5.symbol_info_tick(mt5_conn.symbol))
+                except Exception:
+                    pass
             
             # بررسی تغییر داده - مشابه main_saver_copy2.py
             current_time = cache_data.index[-1]
@@ -372,27 +326,25 @@ def main():
                     process_data = False
             
             if process_data:
-                log((' ' * 80 + '\n') * 3)
-                log(f'Log number {i}:', color='lightred_ex')
-                log(f'📊 Processing {len(cache_data)} data points | Window: {window_size}', color='cyan')
-                log(f'Current time: {cache_data.index[-1]}', color='yellow')
-                log(f'Start index: {start_index}  value: {cache_data.iloc[0].timestamp}  end data: {cache_data.iloc[-2].timestamp}', color='yellow')
-                log(f'len data: {len(cache_data)} ', color='yellow')
-                log(f'Current data status: {cache_data.iloc[-1]["status"]} open: {cache_data.iloc[-1]["open"]} close: {cache_data.iloc[-1]["close"]} time: {cache_data.index[-1]}')
-                log(f'Last data status: {cache_data.iloc[-2]["status"]} open: {cache_data.iloc[-2]["open"]} close: {cache_data.iloc[-2]["close"]} time: {cache_data.index[-2]}')
-                log(f' ' * 80)
+                if is_enabled('debug'):  # iloc روی DataFrame در هر دور فقط وقتی خروجی debug فعال است
+                    debug('Log number %s: processing %s data points | Window: %s', i, len(cache_data), window_size, color='lightred_ex')
+                    debug('Start index: %s  value: %s  end data: %s', start_index, cache_data.index[0], cache_data.index[-2], color='yellow')
+                    last_bar, prev_bar = cache_data.iloc[-1], cache_data.iloc[-2]
+                    debug('Current data status: %s open: %s close: %s time: %s', last_bar['status'], last_bar['open'], last_bar['close'], last_bar.name)
+                    debug('Last data status: %s open: %s close: %s time: %s', prev_bar['status'], prev_bar['open'], prev_bar['close'], prev_bar.name)
                 i += 1
                 
-                legs = get_legs(cache_data)
-                log(f'First len legs: {len(legs)}', color='green')
-                log(f' ' * 80)
+                t_legs = perf_counter_ns()
+                legs = get_legs(cache_data, pip_multiplier=mt5_conn.pip_multiplier())
+                metrics.GET_LEGS_SECONDS.observe_ns(perf_counter_ns() - t_legs)
+                debug('First len legs: %s', len(legs), color='green')
+                timer.mark('legs')
+                is_swing = new_fib = False
 
                 if len(legs) > 2:
-                    log(f'legs > 2', color='blue')
                     legs = legs[-3:]
-                    log(f"{cache_data.loc[legs[0]['start']].name} {cache_data.loc[legs[0]['end']].name} "
-                        f"{cache_data.loc[legs[1]['start']].name} {cache_data.loc[legs[1]['end']].name} "
-                        f"{cache_data.loc[legs[2]['start']].name} {cache_data.loc[legs[2]['end']].name}", color='yellow')
+                    if is_enabled('debug'):
+                        debug('legs > 2: %s', ' '.join(f"{leg['start']} {leg['end']}" for leg in legs), color='yellow')
                     swing_type, is_swing = get_swing_points(data=cache_data, legs=legs)
 
 
@@ -403,71 +355,17 @@ def main():
 
 
                     # Phase 1 Initialization fib_levels or change by new fib
-                    
                     if is_swing:
-                        log(f"is_swing: {swing_type}")
-                        if swing_type == 'bullish' and cache_data.iloc[-2]['close'] > legs[1]['start_value']:
-                            state.reset()
-                            state.fib_levels = fibonacci_retracement(start_price=legs[2]['end_value'], end_price=legs[2]['start_value'])
-                            state.fib0_time = legs[2]['start']
-                            state.fib1_time = legs[2]['end']
-                            last_swing_type = swing_type
-                            log(f"📈 New fibonacci created: fib1:{state.fib_levels['1.0']} time:{legs[2]['start']} - fib0.705:{state.fib_levels['0.705']} - fib0:{state.fib_levels['0.0']} time:{legs[2]['end']}", color='green')
-
-                        elif swing_type == 'bearish' and cache_data.iloc[-2]['close'] < legs[1]['start_value']:
-                            state.reset()
-                            state.fib_levels = fibonacci_retracement(start_price=legs[2]['end_value'], end_price=legs[2]['start_value'])
-                            state.fib0_time = legs[2]['start']
-                            state.fib1_time = legs[2]['end']
-                            last_swing_type = swing_type
-                            log(f"📉 New fibonacci created: fib1:{state.fib_levels['1.0']} time:{legs[2]['start']} - fib0.705:{state.fib_levels['0.705']} - fib0:{state.fib_levels['0.0']} time:{legs[2]['end']}", color='green')
+                        new_swing_type = apply_swing(state, cache_data, legs, swing_type, log)
+                        if new_swing_type:
+                            last_swing_type = new_swing_type
+                            new_fib = True
+                    timer.mark('swing')
 
                     # Phase 2
                     if state.fib_levels:
-                        log(f'📊 Phase 2', color='blue')
-                        if last_swing_type == 'bullish':
-                            if cache_data.iloc[-2]['high'] > state.fib_levels['0.0']:
-                                state.fib_levels = fibonacci_retracement(start_price=cache_data.iloc[-2]['high'], end_price=state.fib_levels['1.0'])
-                                state.fib0_time = cache_data.iloc[-2]['timestamp']
-                                state.first_touch = False
-                                state.first_touch_value = None
-                                # Should it be reset???
-                                log(f"📈 Updated fibonacci: fib1:{state.fib_levels['1.0']} - fib0.705:{state.fib_levels['0.705']} - fib0:{state.fib_levels['0.0']}", color='green')
-                            elif cache_data.iloc[-2]['low'] < state.fib_levels['1.0']:
-                                state.reset()
-                                log(f"📈 Price dropped below fib1 on bullish and reset fib levels", color='red')
-                            elif cache_data.iloc[-2]['low'] <= state.fib_levels['0.705']:
-                                log(f"📈 Price touched fib0.705 on bullish -- cache_data status is {cache_data.iloc[-2]['status']}", color='red')
-                                if not state.first_touch:
-                                    state.first_touch_value = cache_data.iloc[-2]
-                                    state.first_touch = True
-                                    log(f"📈 First touch on bullish: {state.first_touch_value['timestamp']}  first touch status is {state.first_touch_value['status']}", color='green')
-                                elif state.first_touch and not state.second_touch and cache_data.iloc[-2]['status'] != state.first_touch_value['status']:
-                                    state.second_touch_value = cache_data.iloc[-2]
-                                    state.second_touch = True
-                                    log(f"📈 Second touch on bullish: {state.second_touch_value['timestamp']}  second touch status is {state.second_touch_value['status']}", color='green')
-
-                        elif last_swing_type == 'bearish':
-                            if cache_data.iloc[-2]['low'] < state.fib_levels['0.0']:
-                                state.fib_levels = fibonacci_retracement(start_price=cache_data.iloc[-2]['low'], end_price=state.fib_levels['1.0'])
-                                state.fib0_time = cache_data.iloc[-2]['timestamp']
-                                state.first_touch = False
-                                state.first_touch_value = None
-                                # Should it be reset???
-                                log(f"📉 Updated fibonacci: fib1:{state.fib_levels['1.0']} - fib0.705:{state.fib_levels['0.705']} - fib0:{state.fib_levels['0.0']}", color='green')
-                            elif cache_data.iloc[-2]['high'] > state.fib_levels['1.0']:
-                                state.reset()
-                                log(f"📉 Price dropped below fib1 on bearish and reset fib levels", color='red')
-                            elif cache_data.iloc[-2]['high'] >= state.fib_levels['0.705']:
-                                log(f"📉 Price touched fib0.705 on bearish -- cache_data status is {cache_data.iloc[-2]['status']}", color='red')
-                                if not state.first_touch:
-                                    state.first_touch_value = cache_data.iloc[-2]
-                                    state.first_touch = True
-                                    log(f"📉 First touch on bearish: {state.first_touch_value['timestamp']}  first touch status is {state.first_touch_value['status']}", color='red')
-                                elif state.first_touch and not state.second_touch and cache_data.iloc[-2]['status'] != state.first_touch_value['status']:
-                                    state.second_touch_value = cache_data.iloc[-2]
-                                    state.second_touch = True
-                                    log(f"📉 Second touch on bearish: {state.second_touch_value['timestamp']}  second touch status is {state.second_touch_value['status']}", color='red')
+                        debug('📊 Phase 2', color='blue')
+                        advance_fib_state(state, cache_data, last_swing_type, log)
 
                     elif not is_swing and not state.fib_levels:
                         pass
@@ -475,76 +373,34 @@ def main():
                 if len(legs) < 3:
                     # Phase 3
                     if state.fib_levels:
-                        log(f"📊 Phase 3", color='blue')
-                        if last_swing_type == 'bullish':
-                            if cache_data.iloc[-2]['high'] > state.fib_levels['0.0']:
-                                state.fib_levels = fibonacci_retracement(start_price=cache_data.iloc[-2]['high'], end_price=state.fib_levels['1.0'])
-                                state.fib0_time = cache_data.iloc[-2]['timestamp']
-                                state.first_touch = False
-                                state.first_touch_value = None
-                                # Should it be reset???
-                                log(f"📈 Updated fibonacci: fib1:{state.fib_levels['1.0']} - fib0.705:{state.fib_levels['0.705']} - fib0:{state.fib_levels['0.0']}", color='green')
-                            elif cache_data.iloc[-2]['low'] < state.fib_levels['1.0']:
-                                state.reset()
-                                log(f"📈 Price dropped below fib1 on bullish and reset fib levels", color='red')
-                            elif cache_data.iloc[-2]['low'] <= state.fib_levels['0.705']:
-                                log(f"📈 Price touched fib0.705 on bullish -- cache_data status is {cache_data.iloc[-2]['status']}", color='red')
-                                if not state.first_touch:
-                                    state.first_touch = True
-                                    state.first_touch_value = cache_data.iloc[-2]
-                                    log(f"📈 First touch on bullish: {state.first_touch_value['timestamp']}  first touch status is {state.first_touch_value['status']}", color='green')
-                                elif state.first_touch and not state.second_touch and cache_data.iloc[-2]['status'] != state.first_touch_value['status']:
-                                    state.second_touch = True
-                                    state.second_touch_value = cache_data.iloc[-2]
-                                    log(f"📈 Second touch on bullish: {state.second_touch_value['timestamp']}  second touch status is {state.second_touch_value['status']}", color='green')
-
-                        elif last_swing_type == 'bearish':
-                            if cache_data.iloc[-2]['low'] < state.fib_levels['0.0']:
-                                state.fib_levels = fibonacci_retracement(start_price=cache_data.iloc[-2]['low'], end_price=state.fib_levels['1.0'])
-                                state.fib0_time = cache_data.iloc[-2]['timestamp']
-                                state.first_touch = False
-                                state.first_touch_value = None
-                                # Should it be reset???
-                                log(f"📉 Updated fibonacci: fib1:{state.fib_levels['1.0']} - fib0.705:{state.fib_levels['0.705']} - fib0:{state.fib_levels['0.0']}", color='green')
-                            elif cache_data.iloc[-2]['high'] > state.fib_levels['1.0']:
-                                state.reset()
-                                log(f"📉 Price dropped below fib1 on bearish and reset fib levels", color='red')
-                            elif cache_data.iloc[-2]['high'] >= state.fib_levels['0.705']:
-                                log(f"📉 Price touched fib0.705 on bearish -- cache_data status is {cache_data.iloc[-2]['status']}", color='red')
-                                if not state.first_touch:
-                                    state.first_touch_value = cache_data.iloc[-2]
-                                    state.first_touch = True
-                                    log(f"📉 First touch on bearish: {state.first_touch_value['timestamp']}  first touch status is {state.first_touch_value['status']}", color='red')
-                                elif state.first_touch and not state.second_touch and cache_data.iloc[-2]['status'] != state.first_touch_value['status']:
-                                    state.second_touch_value = cache_data.iloc[-2]
-                                    state.second_touch = True
-                                    log(f"📉 Second touch on bearish: {state.second_touch_value['timestamp']}  second touch status is {state.second_touch_value['status']}", color='red')
+                        debug('📊 Phase 3', color='blue')
+                        advance_fib_state(state, cache_data, last_swing_type, log)
 
                     if len(legs) == 2:
-                        log(f'legs = 2', color='blue')
-                        log(f'leg0: {legs[0]["start"]}, {legs[0]["end"]}, leg1: {legs[1]["start"]}, {legs[1]["end"]}', color='lightcyan_ex')
+                        debug('legs = 2 | leg0: %s, %s, leg1: %s, %s', legs[0]["start"], legs[0]["end"], legs[1]["start"], legs[1]["end"], color='lightcyan_ex')
                     elif len(legs) == 1:
-                        log(f'legs = 1', color='blue')
-                        log(f'leg0: {legs[0]["start"]}, {legs[0]["end"]}', color='lightcyan_ex')
+                        debug('legs = 1 | leg0: %s, %s', legs[0]["start"], legs[0]["end"], color='lightcyan_ex')
+
+                timer.mark('fib')
+                if cycle:
+                    cycle.capture(state, last_swing_type, len(legs), is_swing, new_fib, bar=cache_data.iloc[-2])
                 
                 # بخش معاملات - buy statement (مطابق منطق main_saver_copy2.py)
                 if last_swing_type == 'bullish' and state.second_touch:
+                    if fanout:
+                        # سیگنال مستقل از وضعیت حساب اصلی به همه حساب‌ها می‌رسد؛ هر worker پوزیشن‌های باز
+                        # و SL خودش را بررسی می‌کند (skip یا continue حساب اصلی روی بقیه اثری ندارد)
+                        fanout.publish(EntrySignal(
+                            symbol=mt5_conn.symbol, direction='buy', fib1=float(state.fib_levels['1.0']),
+                            comment=f"Bullish Swing {last_swing_type}", fib_levels=dict(state.fib_levels),
+                        ))
                     # بررسی پوزیشن‌های باز قبل از ایجاد سیگنال جدید (اگر فعال باشد)
                     if TRADING_CONFIG.get('prevent_multiple_positions', True):
                         check_mode = TRADING_CONFIG.get('position_check_mode', 'all')
-                        should_skip = False
-                        skip_reason = ""
-                        
-                        if check_mode == 'all' and has_open_positions():
-                            log(f"🚫 Skip BUY signal: Position(s) already open (mode: all positions)", color='yellow')
-                            should_skip = True
-                            skip_reason = f"Position(s) already open (mode: {check_mode})"
-                        elif check_mode == 'conflicting' and has_conflicting_positions('buy'):
-                            log(f"🚫 Skip BUY signal: Conflicting SELL position(s) detected", color='yellow')
-                            should_skip = True
-                            skip_reason = "Conflicting SELL position(s) detected"
+                        skip_reason = blocking_position_reason(mt5_conn.get_positions(), 'buy', check_mode)
                         
-                        if should_skip:
+                        if skip_reason:
+                            log(f"🚫 Skip BUY signal: {skip_reason}", color='yellow')
                             log_open_positions()
                             
                             # ارسال ایمیل اطلاع‌رسانی skip شدن سیگنال BUY
@@ -576,6 +432,7 @@ def main():
                             
                             state.reset()
                             reset_state_and_window()
+                            end_cycle(dtrace.A_SKIP_BUY)
                             continue
                     
                     log(f"📈 Buy signal triggered", color='green')
@@ -615,39 +472,17 @@ def main():
                     except Exception:
                         pass
 
-                    pip_size = _pip_size_for(MT5_CONFIG['symbol'])
-                    two_pips = 2.0 * pip_size
-                    min_dist = _min_stop_distance(MT5_CONFIG['symbol'])
-
-                    # همیشه از fib 1.0 استفاده می‌کنیم
-                    candidate_sl = state.fib_levels['1.0']
-
-                    min_pip_dist = 2  # حداقل 2 پیپ واقعی
-                    pip_size = _pip_size_for(MT5_CONFIG['symbol'])
-                    min_abs_dist = max(min_pip_dist * pip_size, min_dist)
-
-                    # گارد جهت - fib 1.0 همیشه باید زیر entry باشد
-                    if candidate_sl >= buy_entry_price:
-                        log("🚫 Skip BUY: fib 1.0 is above entry price", color='red')
-                        state.reset()
-                        reset_state_and_window()
-                        continue
-                    # اطمینان از فاصله
-                    if (buy_entry_price - candidate_sl) < min_abs_dist:
-                        # اگر فاصله خیلی کم است، یا SL را جابه‌جا کن یا معامله را لغو کن
-                        adj = buy_entry_price - min_abs_dist
-                        if adj <= 0:
-                            log("🚫 Skip BUY: invalid SL distance", color='red')
-                            state.reset()
-                            reset_state_and_window()
-                            continue
-                        candidate_sl = float(adj)
-
-                    stop = float(candidate_sl)
-                    if stop >= buy_entry_price:
-                        log("🚫 Skip BUY: SL still >= entry after adjust", color='red')
+                    # همیشه از fib 1.0 استفاده می‌کنیم (با حداقل فاصله 2 پیپ / stops_level)
+                    stop, skip_msg = resolve_entry_stop(
+                        'buy', buy_entry_price, state.fib_levels['1.0'],
+                        pip_size=mt5_conn.pip_size(),
+                        min_dist=mt5_conn.min_stop_distance(),
+                    )
+                    if stop is None:
+                        log(skip_msg, color='red')
                         state.reset()
                         reset_state_and_window()
+                        end_cycle(dtrace.A_STOP_REJECTED)
                         continue
 
                     stop_distance = abs(buy_entry_price - stop)
@@ -680,6 +515,8 @@ def main():
                     except Exception as _e:
                         log(f'Email dispatch failed: {_e}', color='red')
 
+                    if cycle:
+                        cycle.action = dtrace.A_BUY if result and getattr(result, 'retcode', None) == 10009 else dtrace.A_ORDER_FAILED
                     if result and getattr(result, 'retcode', None) == 10009:
                         log(f'✅ BUY order executed successfully', color='green')
                         log(f'📊 Ticket={result.order} Price={result.price} Volume={result.volume}', color='cyan')
@@ -707,22 +544,20 @@ def main():
 
                 # بخش معاملات - sell statement (مطابق منطق main_saver_copy2.py)
                 if last_swing_type == 'bearish' and state.second_touch:
+                    if fanout:
+                        # سیگنال مستقل از وضعیت حساب اصلی به همه حساب‌ها می‌رسد؛ هر worker پوزیشن‌های باز
+                        # و SL خودش را بررسی می‌کند (skip یا continue حساب اصلی روی بقیه اثری ندارد)
+                        fanout.publish(EntrySignal(
+                            symbol=mt5_conn.symbol, direction='sell', fib1=float(state.fib_levels['1.0']),
+                            comment=f"Bearish Swing {last_swing_type}", fib_levels=dict(state.fib_levels),
+                        ))
                     # بررسی پوزیشن‌های باز قبل از ایجاد سیگنال جدید (اگر فعال باشد)
                     if TRADING_CONFIG.get('prevent_multiple_positions', True):
                         check_mode = TRADING_CONFIG.get('position_check_mode', 'all')
-                        should_skip = False
-                        skip_reason = ""
-                        
-                        if check_mode == 'all' and has_open_positions():
-                            log(f"🚫 Skip SELL signal: Position(s) already open (mode: all positions)", color='yellow')
-                            should_skip = True
-                            skip_reason = f"Position(s) already open (mode: {check_mode})"
-                        elif check_mode == 'conflicting' and has_conflicting_positions('sell'):
-                            log(f"🚫 Skip SELL signal: Conflicting BUY position(s) detected", color='yellow')
-                            should_skip = True
-                            skip_reason = "Conflicting BUY position(s) detected"
+                        skip_reason = blocking_position_reason(mt5_conn.get_positions(), 'sell', check_mode)
                         
-                        if should_skip:
+                        if skip_reason:
+                            log(f"🚫 Skip SELL signal: {skip_reason}", color='yellow')
                             log_open_positions()
                             
                             # ارسال ایمیل اطلاع‌رسانی skip شدن سیگنال SELL
@@ -754,6 +589,7 @@ def main():
                             
                             state.reset()
                             reset_state_and_window()
+                            end_cycle(dtrace.A_SKIP_SELL)
                             continue
                     
                     log(f"📉 Sell signal triggered", color='red')
@@ -790,32 +626,17 @@ def main():
                     except Exception:
                         pass
 
-                    pip_size = _pip_size_for(MT5_CONFIG['symbol'])
-                    two_pips = 2.0 * pip_size
-                    min_dist = _min_stop_distance(MT5_CONFIG['symbol'])
-
-                    # همیشه از fib 1.0 استفاده می‌کنیم
-                    candidate_sl = state.fib_levels['1.0']
-
-                    min_pip_dist = 2.0
-                    pip_size = _pip_size_for(MT5_CONFIG['symbol'])
-                    min_abs_dist = max(min_pip_dist * pip_size, min_dist)
-
-                    # گارد جهت - fib 1.0 همیشه باید بالای entry باشد
-                    if candidate_sl <= sell_entry_price:
-                        log("🚫 Skip SELL: fib 1.0 is below entry price", color='red')
-                        state.reset()
-                        reset_state_and_window()
-                        continue
-                    if (candidate_sl - sell_entry_price) < min_abs_dist:
-                        adj = sell_entry_price + min_abs_dist
-                        candidate_sl = float(adj)
-
-                    stop = float(candidate_sl)
-                    if stop <= sell_entry_price:
-                        log("🚫 Skip SELL: SL still <= entry after adjust", color='red')
+                    # همیشه از fib 1.0 استفاده می‌کنیم (با حداقل فاصله 2 پیپ / stops_level)
+                    stop, skip_msg = resolve_entry_stop(
+                        'sell', sell_entry_price, state.fib_levels['1.0'],
+                        pip_size=mt5_conn.pip_size(),
+                        min_dist=mt5_conn.min_stop_distance(),
+                    )
+                    if stop is None:
+                        log(skip_msg, color='red')
                         state.reset()
                         reset_state_and_window()
+                        end_cycle(dtrace.A_STOP_REJECTED)
                         continue
 
                     stop_distance = abs(sell_entry_price - stop)
@@ -849,6 +670,8 @@ def main():
                     except Exception as _e:
                         log(f'Email dispatch failed: {_e}', color='red')
                     
+                    if cycle:
+                        cycle.action = dtrace.A_SELL if result and getattr(result, 'retcode', None) == 10009 else dtrace.A_ORDER_FAILED
                     if result and getattr(result, 'retcode', None) == 10009:
                         log(f'✅ SELL order executed successfully', color='green')
                         log(f'📊 Ticket={result.order} Price={result.price} Volume={result.volume}', color='cyan')
@@ -876,10 +699,8 @@ def main():
                 
                 # log(f'cache_data.iloc[-1].name: {cache_data.iloc[-1].name}', color='lightblue_ex')
                 # log(f'Total cache_data len: {len(cache_data)} | window_size: {window_size}', color='cyan')
-                log(f'len(legs): {len(legs)} | start_index: {start_index} | {cache_data.iloc[start_index].name}', color='lightred_ex')
-                log(f' ' * 80)
-                log(f'-'* 80)
-                log(f' ' * 80)
+                debug('len(legs): %s | start_index: %s | %s', len(legs), start_index, cache_data.index[start_index], color='lightred_ex')
+                timer.mark('entry')
 
                 # ذخیره آخرین زمان داده
                 # last_data_time = cache_data.index[-1]  # این خط حذف شد چون بالا انجام شد
@@ -896,36 +717,54 @@ def main():
                     log_open_positions()
                     position_open = True
 
-            manage_open_positions()
+            manage_open_positions(mt5_conn, position_states, log)
+            report_fills()
+            if process_data:
+                timer.mark('manage')
+                if cycle and position_open:
+                    cycle.flags |= dtrace.F_IN_POSITION
+                end_cycle()
+
+            if snapshots:
+                if process_data:
+                    snapshots.mark_dirty()
+                try:
+                    snapshots.maybe_save(state, last_swing_type, position_states,
+                                         bars_df=cache_data, last_data_time=last_data_time)
+                except Exception as e:
+                    log(f"⚠️ Snapshot save failed: {e}", color='yellow')
 
             sleep(0.5)  # مطابق main_saver_copy2.py
 
         except KeyboardInterrupt:
             log("🛑 Bot stopped by user", color='yellow')
+            if snapshots:
+                try:
+                    snapshots.maybe_save(state, last_swing_type, position_states,
+                                         bars_df=cache_data, last_data_time=last_data_time, force=True)
+                except Exception:
+                    pass
             mt5_conn.close_all_positions()
             break
         except Exception as e:
-            log(f' ' * 80)
-            log(f"❌ Error: {e}", color='red')
+            log(f"❌ Error: {e}", level='error', color='red')
             sleep(5)
 
+    if bar_feed:
+        bar_feed.close()
+    if tracer:
+        tracer.close()
+    if housekeeper:
+        housekeeper.stop()
+    if metrics_server:
+        metrics_server.shutdown()
+    if profiler:
+        profiler.stop()
+    if fanout:
+        fanout.stop()
+        report_fills()
     mt5_conn.shutdown()
     print("🔌 MT5 connection closed")
 
-def _pip_size_for(symbol: str) -> float:
-    info = mt5.symbol_info(symbol)
-    if not info:
-        return 0.0001
-    # برای 5/3 رقمی: 1 pip = 10 * point
-    return info.point * (10.0 if info.digits in (3, 5) else 1.0)
-
-def _min_stop_distance(symbol: str) -> float:
-    info = mt5.symbol_info(symbol)
-    if not info:
-        return 0.0003
-    point = info.point
-    # حداقل فاصله مجاز بروکر (stops_level) یا 3 پوینت به‌عنوان فfallback
-    return max((getattr(info, 'trade_stops_level', 0) or 0) * point, 3 * point)
-
 if __name__ == "__main__":
     main()
@@ -61,6 +61,66 @@ MT5_CONFIG = {
     'trading_hours': MY_CUSTOM_TIME_IRAN,
 }
 
+# اجرای چند نماد در یک پروسه (multi_symbol_engine.py) - یک سشن MT5 مشترک
+MULTI_SYMBOL_CONFIG = {
+    'symbols': ['EURUSD', 'GBPUSD', 'AUDUSD', 'USDJPY'],
+    'schedule': 'event',            # 'event': فقط نمادهایی که کندل جدید دارند، 'round_robin': در هر دور symbols_per_pass نماد به نوبت
+    'symbols_per_pass': 0,          # فقط در 'round_robin': تعداد نمادهای هر دور (0 = همه نمادها)
+    'poll_interval': 0.5,           # فاصله بین دورها (ثانیه)
+    'latency_window': 200,          # تعداد نمونه‌های نگهداری شده برای آمار تاخیر هر نماد
+    'latency_report_every': 120,    # گزارش تاخیر هر N دور
+}
+
+# ارسال یک سیگنال به چند حساب (account_fanout.py) - هر حساب یک ترمینال MT5 و یک پروسه جداگانه
+# حجم هر حساب جداگانه با calculate_volume_by_risk و risk_percent همان حساب محاسبه می‌شود
+ACCOUNTS_CONFIG = {
+    'enable': False,
+    'accounts': [
+        # {
+        #     'name': '100$ account',
+        #     'path': r'C:\Program Files\MetaTrader 5 - Account A\terminal64.exe',
+        #     'login': 12345678,
+        #     'password': '',
+        #     'server': 'Broker-Server',
+        #     'risk_percent': 1.0,
+        # },
+    ],
+    'queue_size': 100,
+    # هر worker بین سیگنال‌ها پوزیشن‌های حساب خودش را با manage_open_positions (Trailing Stop) مدیریت می‌کند
+    'manage_interval_sec': 0.5,
+}
+
+# انتشار کندل‌ها و آخرین تیک در shared memory برای پروسه‌های محلی (bar_feed_shm.py)
+BAR_FEED_CONFIG = {
+    'enable': False,
+    'capacity': 500,   # حداکثر تعداد کندل در segment
+}
+
+# Snapshot وضعیت برای راه‌اندازی مجدد گرم (state_snapshot.py)
+SNAPSHOT_CONFIG = {
+    'enable': True,
+    'path': 'bot_state_{symbol}.pkl',
+    'interval_sec': 30,          # حداکثر فاصله بین دو ذخیره
+    'max_age_sec': 4 * 3600,     # snapshot قدیمی‌تر از این نادیده گرفته می‌شود
+    'max_bars': 200,             # تعداد کندل ذخیره شده
+}
+
+# زمان‌بندی خارج از ساعات معاملاتی (session_calendar.py)
+SESSION_CONFIG = {
+    'warmup_sec': 60,            # چند ثانیه قبل از باز شدن: دریافت کندل‌ها و مشخصات نماد
+    'max_sleep_chunk_sec': 900,  # خواب طولانی در تکه‌های حداکثر 15 دقیقه‌ای
+}
+
+# ضبط پیوسته تیک‌ها برای بهینه‌ساز خروج (tick_recorder.py) - پروسه جدا از ربات
+TICK_RECORDER_CONFIG = {
+    'symbols': ['EURUSD'],
+    'ticks_dir': 'ticks',        # فایل‌های ماهانه Ticks_{symbol}_{YYYY}_{MM}.csv همین‌جا ساخته می‌شوند
+    'poll_interval': 0.2,        # فاصله بین درخواست‌های copy_ticks_from (ثانیه)
+    'batch_size': 100000,        # حداکثر تیک در هر درخواست
+    'lookback_min': 10,          # اولین اجرا بدون فایل روزانه: از چند دقیقه قبل شروع شود
+    'roll_on_day_change': True,  # بعد از بسته شدن هر روز، فایل ماهانه دوباره ساخته شود
+}
+
 # تنظیمات استراتژی
 TRADING_CONFIG = {
     'threshold': 6,  # Changed from 6 to 60 to detect major legs (6 pips minimum)
@@ -222,9 +282,62 @@ DYNAMIC_RISK_CONFIG = {
     ]
 }
 
+# ارسال ایمیل (email_notifier.py) - اتصال SMTP پایدار، digest و صف محدود
+# برای تست با SMTP محلی: host='127.0.0.1'، port=1025، use_ssl=False
+EMAIL_CONFIG = {
+    'host': 'smtp.gmail.com',
+    'port': 465,
+    'use_ssl': True,            # SMTP_SSL؛ اگر False باشد SMTP ساده (با starttls اختیاری)
+    'starttls': False,
+    'timeout_sec': 30,
+    'idle_timeout_sec': 240,    # اتصال بیکار بیشتر از این مدت دوباره ساخته می‌شود
+    'batch_window_sec': 5.0,    # پیام‌های این بازه در یک digest ارسال می‌شوند
+    'queue_size': 200,          # پیام‌های کم‌اهمیت (SIGNAL SKIPPED) اول حذف می‌شوند
+    'max_retries': 3,
+}
+
+# رکورد باینری تصمیم هر دور (decision_trace.py) - برای بازخوانی بدون لاگ متنی پرحجم
+TRACE_CONFIG = {
+    'enable': True,
+    'dir': 'traces',            # decision_trace_<SYMBOL>_<YYYY-MM-DD>.bin
+    'flush_every': 20,          # flush بعد از این تعداد رکورد
+}
+
+# زمان‌سنجی مراحل هر دور حلقه اصلی (fetch/legs/swing/fib/entry/manage)
+CYCLE_TIMING_CONFIG = {
+    'window': 500,              # تعداد دورهای نگهداری شده برای صدک‌ها
+    'report_every': 120,        # گزارش p50/p95/p99 هر N دور پردازش شده
+    'budget_ms': 250,           # دورهای کندتر از این مقدار با هشدار و پرچم slow در trace ثبت می‌شوند
+}
+
+# پروفایل ربات در حال اجرا (فایل profile.request یا SIGUSR1/SIGUSR2؛ runtime_profiler.py)
+PROFILER_CONFIG = {
+    'enable': True,
+    'control_file': 'profile.request',  # محتوا: "<sample|cprofile|both> <seconds>"
+    'default_mode': 'sample',
+    'default_seconds': 60,
+    'sample_interval_ms': 5,            # فاصله نمونه‌برداری stack
+    'check_interval_sec': 1.0,          # فاصله بررسی وجود فایل کنترل
+}
+
+# endpoint متریک‌ها (متن Prometheus روی http://host:port/metrics)
+METRICS_CONFIG = {
+    'enable': True,
+    'host': '127.0.0.1',        # فقط محلی؛ برای scrape از شبکه 0.0.0.0
+    'port': 9108,
+}
+
 # تنظیمات لاگ
 LOG_CONFIG = {
     'log_level': 'INFO',        # DEBUG, INFO, WARNING, ERROR
     'save_to_file': True,       # ذخیره در فایل
     'max_log_size': 10,         # حداکثر حجم فایل لاگ (MB)
 }
+
+# فشرده‌سازی و حذف لاگ‌های قدیمی (housekeeping.py) - swing_logs و CSVهای analytics
+HOUSEKEEPING_CONFIG = {
+    'enable': True,
+    'compression': 'auto',      # 'auto' (zstd اگر نصب باشد، در غیر این صورت gzip)، 'gzip'، 'zstd'
+    'retention_days': 30,       # فایل‌های قدیمی‌تر حذف می‌شوند (None = بدون حذف)
+    'interval_sec': 900,        # فاصله بین دو بررسی
+}
@@ -0,0 +1,254 @@
+"""
+متریک‌های ربات در قالب متنی Prometheus روی یک HTTP محلی (http.server در thread پس‌زمینه).
+
+به‌روزرسانی متریک‌ها در مسیر داغ بدون قفل است (افزایش یک عدد صحیح یا bisect
+روی bucketها، زیر یک میکروثانیه). مقادیر وابسته به ماژول‌های دیگر (عمق صف
+analytics، backlog ایمیل) فقط هنگام scrape از طریق collectorها خوانده می‌شوند.
+
+    curl http://127.0.0.1:9108/metrics
+"""
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# bucketهای زمان (ثانیه) - از 100 میکروثانیه تا 10 ثانیه
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _fmt_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def remove(self, *values):
+        self._children.pop(values, None)
+
+    def clear(self):
+        self._children.clear()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(child.render(self.name, _fmt_labels(self.labelnames, values), self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+    def render(self, name, labels, *_):
+        return [f"{name}{labels} {self.value}"]
+
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, v):
+        self.value = v
+
+    def inc(self, n=1):
+        self.value += n
+
+    def render(self, name, labels, *_):
+        return [f"{name}{labels} {self.value}"]
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, v):
+        self.counts[bisect_left(self.buckets, v)] += 1
+        self.count += 1
+        self.sum += v
+
+    def observe_ns(self, ns):
+        self.observe(ns * 1e-9)
+
+    def render(self, name, labels, labelnames, values):
+        out = []
+        cum = 0
+        for le, c in zip(self.buckets, self.counts):
+            cum += c
+            out.append(f"{name}_bucket{_fmt_labels(labelnames + ('le',), values + (le,))} {cum}")
+        out.append(f"{name}_bucket{_fmt_labels(labelnames + ('le',), values + ('+Inf',))} {self.count}")
+        out.append(f"{name}_sum{labels} {self.sum}")
+        out.append(f"{name}_count{labels} {self.count}")
+        return out
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, n=1):
+        self.labels().inc(n)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, v):
+        self.labels().set(v)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, v):
+        self.labels().observe(v)
+
+    def observe_ns(self, ns):
+        self.labels().observe(ns * 1e-9)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []  # توابعی که هنگام scrape خطوط اضافی برمی‌گردانند
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, fn):
+        self.collectors.append(fn)
+
+    def render(self) -> str:
+        lines = []
+        for m in self.metrics:
+            lines.extend(m.render())
+        for fn in self.collectors:
+            try:
+                lines.extend(fn())
+            except Exception as e:
+                lines.append(f"# collector {getattr(fn, '__name__', fn)} failed: {e}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+_r = REGISTRY.register
+
+CYCLE_SECONDS = _r(Histogram('bot_cycle_seconds', 'Duration of a processed main loop cycle'))
+BAR_FETCH_SECONDS = _r(Histogram('bot_bar_fetch_seconds', 'copy_rates_from_pos latency', ('symbol',)))
+GET_LEGS_SECONDS = _r(Histogram('bot_get_legs_seconds', 'get_legs duration'))
+ORDER_SEND_SECONDS = _r(Histogram('bot_order_send_seconds', 'order_send latency', ('action',)))
+BROKER_CALLS = _r(Counter('bot_broker_calls_total', 'MetaTrader5 API calls', ('call',)))
+OPEN_POSITIONS = _r(Gauge('bot_open_positions', 'Open positions managed by the bot', ('symbol',)))
+POSITION_PROFIT_R = _r(Gauge('bot_position_profit_r', 'Current profit of an open position in R', ('symbol', 'ticket')))
+TRAILING_UPDATES = _r(Counter('bot_trailing_updates_total', 'Trailing stop updates by result', ('result',)))
+CYCLES = _r(Counter('bot_cycles_total', 'Processed main loop cycles'))
+PHASE_SECONDS = _r(Histogram('bot_cycle_phase_seconds', 'Duration of each main loop phase', ('phase',)))
+OVER_BUDGET_CYCLES = _r(Counter('bot_cycles_over_budget_total', 'Processed cycles slower than the configured budget'))
+
+
+def _analytics_collector():
+    from analytics.hooks import writer_stats
+    s = writer_stats()
+    return [
+        "# TYPE bot_analytics_queue_depth gauge",
+        f"bot_analytics_queue_depth {s['queue_depth']}",
+        "# TYPE bot_analytics_rows_dropped_total counter",
+        f"bot_analytics_rows_dropped_total {s['dropped']}",
+    ]
+
+
+def _email_collector():
+    from email_notifier import notifier_stats
+    s = notifier_stats()
+    return [
+        "# TYPE bot_email_backlog gauge",
+        f"bot_email_backlog {s['backlog']}",
+        "# TYPE bot_email_dropped_total counter",
+        f"bot_email_dropped_total {s['dropped']}",
+        "# TYPE bot_email_failed_total counter",
+        f"bot_email_failed_total {s['failed']}",
+    ]
+
+
+REGISTRY.add_collector(_analytics_collector)
+REGISTRY.add_collector(_email_collector)
+
+
+def update_positions(symbol, profits):
+    """profits: {ticket: profit_R} برای پوزیشن‌های باز فعلی؛ تیکت‌های بسته شده حذف می‌شوند."""
+    OPEN_POSITIONS.labels(symbol).set(len(profits))
+    for key in [k for k in POSITION_PROFIT_R._children if k[0] == symbol and k[1] not in profits]:
+        POSITION_PROFIT_R.remove(*key)
+    for ticket, r in profits.items():
+        POSITION_PROFIT_R.labels(symbol, ticket).set(round(r, 4))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_metrics_server(host='127.0.0.1', port=9108):
+    """سرور در یک daemon thread؛ در صورت اشغال بودن پورت None برمی‌گرداند."""
+    try:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        print(f"⚠️ Metrics endpoint disabled ({host}:{port}): {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
@@ -1,16 +1,20 @@
 import MetaTrader5 as mt5
 import pandas as pd
 import pytz
-from datetime import datetime, time
+from datetime import datetime
+from time import perf_counter_ns
 from metatrader5_config import MT5_CONFIG
+import metrics
 from analytics.hooks import log_market, log_trade, log_position_event
+from session_calendar import SessionCalendar
 
 RET_OK = 10009  # mt5.TRADE_RETCODE_DONE
 
 class MT5Connector:
-    def __init__(self):
+    def __init__(self, symbol=None):
         cfg = MT5_CONFIG
-        self.symbol = cfg['symbol']
+        # هر نماد یک کانکتور؛ همه از یک سشن MT5 مشترک استفاده می‌کنند
+        self.symbol = symbol or cfg['symbol']
         self.lot = cfg['lot_size']
         self.deviation = cfg['deviation']
         self.magic = cfg['magic_number']
@@ -21,24 +25,21 @@ class MT5Connector:
         # self.commission_per_lot_side = cfg.get('commission_per_lot_side', 0.0)  # removed
         self.iran_tz = pytz.timezone('Asia/Tehran')
         self.utc_tz = pytz.UTC
+        self._pip_size = None
+        self._digits = None
+        # ساعات معاملاتی یک بار پارس می‌شوند
+        self.session_calendar = SessionCalendar(self.trading_hours, tz=self.iran_tz)
 
     # ---------- Time / Session ----------
     def get_iran_time(self):
         return datetime.now(self.utc_tz).astimezone(self.iran_tz)
 
     def is_trading_time(self):
-        start = time.fromisoformat(self.trading_hours['start'])
-        end = time.fromisoformat(self.trading_hours['end'])
-        now_t = self.get_iran_time().time()
-        if start <= end:
-            return start <= now_t <= end
-        # window passes midnight
-        return now_t >= start or now_t <= end
+        return self.session_calendar.is_in_hours(self.get_iran_time())
 
     def check_weekend(self):
         # Forex shuts late Fri (server time). Simplified: block Saturday/Sunday
-        wd = self.get_iran_time().weekday()  # Monday=0
-        return wd not in (5, 6)  # 5=Saturday,6=Sunday (adjust if broker different)
+        return self.session_calendar.is_weekday_open(self.get_iran_time())
 
     def can_trade(self):
         if not self.check_weekend():
@@ -58,8 +59,12 @@ class MT5Connector:
         return True, "Trading is allowed"
 
     # ---------- Initialization ----------
-    def initialize(self):
-        if not mt5.initialize():
+    def initialize(self, path=None, login=None, password=None, server=None):
+        # path/login/password/server برای اتصال به یک ترمینال/حساب مشخص (اجرای چند حساب)
+        # مقدار خالی ('' در ACCOUNTS_CONFIG) یعنی ورود ذخیره‌شده ترمینال، پس ارسال نمی‌شود
+        kwargs = {k: v for k, v in (('login', login), ('password', password), ('server', server)) if v not in (None, '')}
+        ok = mt5.initialize(path, **kwargs) if path else mt5.initialize(**kwargs)
+        if not ok:
             print("❌ MT5 initialize failed:", mt5.last_error())
             return False
         acc = mt5.account_info()
@@ -72,9 +77,42 @@ class MT5Connector:
     def shutdown(self):
         mt5.shutdown()
 
+    # ---------- Symbol specs ----------
+    def refresh_symbol_specs(self):
+        info = mt5.symbol_info(self.symbol)
+        if not info:
+            return False
+        self._digits = info.digits
+        # برای 5/3 رقمی: 1 pip = 10 * point
+        self._pip_size = info.point * (10.0 if info.digits in (3, 5) else 1.0)
+        return True
+
+    def pip_size(self):
+        if self._pip_size is None and not self.refresh_symbol_specs():
+            return 0.0001
+        return self._pip_size
+
+    def pip_multiplier(self):
+        """ضریب تبدیل اختلاف قیمت به پیپ (EURUSD: 10000، USDJPY: 100)."""
+        return 1.0 / self.pip_size()
+
+    def digits(self):
+        if self._digits is None and not self.refresh_symbol_specs():
+            return 5
+        return self._digits
+
+    def min_stop_distance(self):
+        info = mt5.symbol_info(self.symbol)
+        if not info:
+            return 0.0003
+        point = info.point
+        # حداقل فاصله مجاز بروکر (stops_level) یا 3 پوینت به‌عنوان fallback
+        return max((getattr(info, 'trade_stops_level', 0) or 0) * point, 3 * point)
+
     # ---------- Data ----------
     def get_live_price(self):
         tick = mt5.symbol_info_tick(self.symbol)
+        metrics.BROKER_CALLS.labels('symbol_info_tick').inc()
         if not tick:
             return None
         # try logging market tick
@@ -82,10 +120,11 @@ class MT5Connector:
             info = mt5.symbol_info(self.symbol)
             if info:
                 log_market(self.symbol, getattr(tick, "bid", None), getattr(tick, "ask", None),
-                           getattr(tick, "last", None), info.point, info.digits, source="mt5", session="bot")
+                           getattr(tick, "last", None), info.point, info.digits, source="mt5", session="bot",
+                           tick_time_msc=getattr(tick, "time_msc", None))
         except Exception:
             pass
-        spread = (tick.ask - tick.bid) * 10000
+        spread = (tick.ask - tick.bid) * self.pip_multiplier()
         if spread > self.max_spread:
             print(f"⚠️ Spread {spread:.1f} > max {self.max_spread}")
         utc_time = datetime.fromtimestamp(tick.time, tz=self.utc_tz)
@@ -98,7 +137,10 @@ class MT5Connector:
         }
 
     def get_historical_data(self, timeframe=mt5.TIMEFRAME_M1, count=500):
+        t0 = perf_counter_ns()
         rates = mt5.copy_rates_from_pos(self.symbol, timeframe, 0, count)
+        metrics.BAR_FETCH_SECONDS.labels(self.symbol).observe_ns(perf_counter_ns() - t0)
+        metrics.BROKER_CALLS.labels('copy_rates_from_pos').inc()
         if rates is None:
             return None
         df = pd.DataFrame(rates)
@@ -142,7 +184,7 @@ class MT5Connector:
         for m in modes:
             req = dict(request)
             req["type_filling"] = m
-            res = mt5.order_send(req)
+            res = self._order_send(req, 'deal')
             tried.append((m, getattr(res, 'retcode', None)))
             if res and res.retcode in (RET_OK, mt5.TRADE_RETCODE_PLACED):
                 return res
@@ -150,7 +192,7 @@ class MT5Connector:
         # 2) یک بار بدون type_filling (auto)
         req = dict(request)
         req.pop("type_filling", None)
-        res = mt5.order_send(req)
+        res = self._order_send(req, 'deal')
         tried.append(("auto", getattr(res, 'retcode', None)))
         if res and res.retcode in (RET_OK, mt5.TRADE_RETCODE_PLACED):
             return res
@@ -161,7 +203,7 @@ class MT5Connector:
                 continue
             req = dict(request)
             req["type_filling"] = m
-            res = mt5.order_send(req)
+            res = self._order_send(req, 'deal')
             tried.append((m, getattr(res, 'retcode', None)))
             if res and res.retcode in (RET_OK, mt5.TRADE_RETCODE_PLACED):
                 return res
@@ -222,7 +264,7 @@ class MT5Connector:
         for m in modes:
             req = dict(request)
             req["type_filling"] = m
-            res = mt5.order_send(req)
+            res = self._order_send(req, 'deal')
             tried.append((m, getattr(res, 'retcode', None)))
             if res and res.retcode in (RET_OK, mt5.TRADE_RETCODE_PLACED):
                 return res
@@ -230,7 +272,7 @@ class MT5Connector:
         # 2) یک بار بدون type_filling (auto)
         req = dict(request)
         req.pop("type_filling", None)
-        res = mt5.order_send(req)
+        res = self._order_send(req, 'deal')
         tried.append(("auto", getattr(res, 'retcode', None)))
         if res and res.retcode in (RET_OK, mt5.TRADE_RETCODE_PLACED):
             return res
@@ -241,7 +283,7 @@ class MT5Connector:
                 continue
             req = dict(request)
             req["type_filling"] = m
-            res = mt5.order_send(req)
+            res = self._order_send(req, 'deal')
             tried.append((m, getattr(res, 'retcode', None)))
             if res and res.retcode in (RET_OK, mt5.TRADE_RETCODE_PLACED):
                 return res
@@ -249,6 +291,13 @@ class MT5Connector:
         print(f"[order_send] filling mode attempts: {tried}")
         return res  # آخرین نتیجه
 
+    def _order_send(self, request, action):
+        t0 = perf_counter_ns()
+        res = mt5.order_send(request)
+        metrics.ORDER_SEND_SECONDS.labels(action).observe_ns(perf_counter_ns() - t0)
+        metrics.BROKER_CALLS.labels('order_send').inc()
+        return res
+
     # ---------- Trading ----------
     def open_buy_position(self, tick, sl, tp, comment="", volume=None, risk_pct=None):
         if not tick:
@@ -376,9 +425,10 @@ class MT5Connector:
                 "type_time": mt5.ORDER_TIME_GTC,
                 "type_filling": mt5.ORDER_FILLING_IOC,
             }
-            mt5.order_send(request)
+            self._order_send(request, 'close')
 
     def get_positions(self):
+        metrics.BROKER_CALLS.labels('positions_get').inc()
         return mt5.positions_get(symbol=self.symbol)
 
     # ---------- Diagnostic stubs (used by main/tests) ----------
@@ -483,5 +533,5 @@ class MT5Connector:
             req["sl"] = new_sl
         if new_tp is not None:
             req["tp"] = new_tp
-        res = mt5.order_send(req)
+        res = self._order_send(req, 'sltp')
         return res
\ No newline at end of file
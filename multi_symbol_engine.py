@@ -0,0 +1,419 @@
+"""
+اجرای هم‌زمان استراتژی روی چند نماد در یک پروسه با یک سشن MT5 مشترک.
+
+هر نماد وضعیت مستقل خود را دارد (BotState، position_states، last_swing_type،
+ضریب پیپ) و تاخیر هر دور پردازش آن جداگانه اندازه‌گیری می‌شود
+تا مشخص شود یک پروسه چند نماد را می‌تواند حمل کند.
+
+اجرا:
+    python multi_symbol_engine.py
+"""
+import os
+from collections import deque
+from datetime import datetime
+from time import sleep, perf_counter
+
+import MetaTrader5 as mt5
+import numpy as np
+from colorama import init
+
+from get_legs import get_legs
+from mt5_connector import MT5Connector
+from swing import get_swing_points
+from utils import BotState
+from save_file import log as base_log
+from metatrader5_config import MT5_CONFIG, TRADING_CONFIG, MULTI_SYMBOL_CONFIG, SESSION_CONFIG, TRACE_CONFIG, METRICS_CONFIG, PROFILER_CONFIG
+from email_notifier import send_trade_email_async
+from analytics.hooks import log_signal
+from session_calendar import wait_for_session
+from strategy import apply_swing, advance_fib_state, resolve_entry_stop, manage_open_positions, blocking_position_reason
+from housekeeping import start_housekeeper
+import metrics
+import runtime_profiler
+import decision_trace as dtrace
+
+
+class LatencyStats:
+    """پنجره‌ی غلتان تاخیرها (میلی‌ثانیه) برای محاسبه p50/p95/max."""
+
+    def __init__(self, window=200):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, ms):
+        self.samples.append(ms)
+        self.count += 1
+
+    def summary(self):
+        if not self.samples:
+            return {'count': self.count, 'last_ms': None, 'mean_ms': None, 'p50_ms': None, 'p95_ms': None, 'max_ms': None}
+        arr = np.fromiter(self.samples, dtype=float)
+        p50, p95 = np.percentile(arr, [50, 95])
+        return {
+            'count': self.count,
+            'last_ms': float(arr[-1]),
+            'mean_ms': float(arr.mean()),
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'max_ms': float(arr.max()),
+        }
+
+
+class SymbolRuntime:
+    """وضعیت مستقل یک نماد."""
+
+    def __init__(self, symbol, latency_window=200):
+        self.symbol = symbol
+        self.conn = MT5Connector(symbol)
+        self.state = BotState()
+        self.position_states = {}
+        self.last_swing_type = None
+        self.last_bar_time = None
+        self.pip_multiplier = 10000
+        self.latency = LatencyStats(latency_window)
+        self.tracer = None
+        self.cycles = 0
+
+    def log(self, message, color=None, save_to_file=True):
+        return base_log(f"[{self.symbol}] {message}", color=color, save_to_file=save_to_file, stacklevel=2)
+
+
+class MultiSymbolEngine:
+    def __init__(self, symbols=None, cfg=None):
+        self.cfg = dict(MULTI_SYMBOL_CONFIG, **(cfg or {}))
+        symbols = symbols or self.cfg.get('symbols') or [MT5_CONFIG['symbol']]
+        project_root = os.path.dirname(os.path.abspath(__file__))
+        window = self.cfg.get('latency_window', 200)
+        self.runtimes = [SymbolRuntime(s, window) for s in symbols]
+        if TRACE_CONFIG.get('enable'):
+            trace_dir = os.path.join(project_root, TRACE_CONFIG.get('dir', 'traces'))
+            for rt in self.runtimes:
+                rt.tracer = dtrace.DecisionTrace(trace_dir, rt.symbol, flush_every=TRACE_CONFIG.get('flush_every', 20))
+        self.session = self.runtimes[0].conn  # سشن/حساب مشترک
+        self.window_size = TRADING_CONFIG['window_size']
+        self.timeframe = mt5.TIMEFRAME_M1
+        self.schedule = self.cfg.get('schedule', 'event')
+        self.symbols_per_pass = self.cfg.get('symbols_per_pass', 0) or len(self.runtimes)
+        self.pass_latency = LatencyStats(window)
+        self._rr_offset = 0
+
+    # ---------- Setup ----------
+    def initialize(self):
+        if not self.session.initialize():
+            return False
+        for rt in self.runtimes:
+            rt.conn.check_symbol_properties()
+            rt.pip_multiplier = rt.conn.pip_multiplier()
+            print(f"   {rt.symbol}: pip multiplier={rt.pip_multiplier:g}")
+        return True
+
+    def warmup(self):
+        # قبل از باز شدن جلسه: مشخصات و تاریخچه همه نمادها
+        for rt in self.runtimes:
+            rt.conn.refresh_symbol_specs()
+            rt.conn.get_historical_data(timeframe=self.timeframe, count=self.window_size * 2)
+
+    # ---------- Scheduling / data ----------
+    def _next_batch(self):
+        """نمادهای این دور به ترتیب round-robin (شروع از نماد بعدی در هر دور)."""
+        n = len(self.runtimes)
+        order = self.runtimes[self._rr_offset:] + self.runtimes[:self._rr_offset]
+        if self.schedule == 'round_robin':
+            self._rr_offset = (self._rr_offset + self.symbols_per_pass) % n
+            return order[:self.symbols_per_pass]
+        self._rr_offset = (self._rr_offset + 1) % n
+        return order
+
+    def fetch_bars(self):
+        """
+        مرحله دریافت داده برای همه نمادهای این دور، پیش از هر پردازش.
+        در حالت 'event' ابتدا فقط آخرین کندل خوانده می‌شود و پنجره کامل فقط
+        برای نمادهایی که کندل جدید دارند دریافت می‌شود.
+        خروجی: لیست (runtime, data, fetch_ms)
+        """
+        batch = []
+        for rt in self._next_batch():
+            t0 = perf_counter()
+            if self.schedule == 'event':
+                probe = mt5.copy_rates_from_pos(rt.symbol, self.timeframe, 0, 1)
+                metrics.BROKER_CALLS.labels('copy_rates_from_pos').inc()
+                if probe is None or len(probe) == 0:
+                    continue
+                if int(probe[-1]['time']) == rt.last_bar_time:
+                    continue
+            data = rt.conn.get_historical_data(timeframe=self.timeframe, count=self.window_size * 2)
+            if data is None or len(data) < 3:
+                rt.log("❌ Failed to get data from MT5", color='red')
+                continue
+            bar_time = int(data.index[-1].timestamp())
+            if bar_time == rt.last_bar_time:
+                continue
+            rt.last_bar_time = bar_time
+            batch.append((rt, data, (perf_counter() - t0) * 1000.0))
+        return batch
+
+    # ---------- Strategy ----------
+    def process(self, rt, data, fetch_ms=0.0):
+        t0 = perf_counter()
+        rt.cycles += 1
+        cycle = rt.tracer.begin(rt.cycles) if rt.tracer else None
+        if cycle:
+            cycle.phase_ns[0] = int(fetch_ms * 1e6)
+        data['status'] = np.where(data['open'] > data['close'], 'bearish', 'bullish')
+        state = rt.state
+
+        t_legs = perf_counter()
+        legs = get_legs(data, pip_multiplier=rt.pip_multiplier)
+        metrics.GET_LEGS_SECONDS.observe(perf_counter() - t_legs)
+        if cycle:
+            cycle.mark('legs')
+        is_swing = new_fib = False
+        if len(legs) > 2:
+            legs = legs[-3:]
+            swing_type, is_swing = get_swing_points(data=data, legs=legs)
+            if is_swing:
+                new_swing_type = apply_swing(state, data, legs, swing_type, rt.log)
+                if new_swing_type:
+                    rt.last_swing_type = new_swing_type
+                    new_fib = True
+            if cycle:
+                cycle.mark('swing')
+            if state.fib_levels:
+                advance_fib_state(state, data, rt.last_swing_type, rt.log)
+        elif state.fib_levels:
+            advance_fib_state(state, data, rt.last_swing_type, rt.log)
+        if cycle:
+            cycle.mark('fib')
+            cycle.capture(state, rt.last_swing_type, len(legs), is_swing, new_fib, bar=data.iloc[-2])
+
+        action = dtrace.A_NONE
+        if state.second_touch and rt.last_swing_type == 'bullish':
+            action = self._enter(rt, 'buy')
+        elif state.second_touch and rt.last_swing_type == 'bearish':
+            action = self._enter(rt, 'sell')
+
+        elapsed = perf_counter() - t0
+        rt.latency.add(fetch_ms + elapsed * 1000.0)
+        metrics.CYCLE_SECONDS.observe(elapsed + fetch_ms / 1000.0)
+        metrics.CYCLES.inc()
+        if cycle:
+            cycle.mark('entry')
+            cycle.action = action
+            try:
+                rt.tracer.write(cycle)
+            except Exception:
+                pass
+
+    def _has_blocking_positions(self, rt, direction):
+        if not TRADING_CONFIG.get('prevent_multiple_positions', True):
+            return None
+        return blocking_position_reason(rt.conn.get_positions(), direction,
+                                        TRADING_CONFIG.get('position_check_mode', 'all'))
+
+    def _enter(self, rt, direction):
+        state = rt.state
+        label = direction.upper()
+        skip_reason = self._has_blocking_positions(rt, direction)
+        if skip_reason:
+            rt.log(f"🚫 Skip {label} signal: {skip_reason}", color='yellow')
+            try:
+                send_trade_email_async(
+                    subject=f"SIGNAL SKIPPED - {label} {rt.symbol}",
+                    body=(
+                        f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+                        f"Symbol: {rt.symbol}\n"
+                        f"Signal Type: {label}\n"
+                        f"Reason: {skip_reason}\n"
+                    )
+                )
+            except Exception as _e:
+                rt.log(f'Skip signal email failed: {_e}', color='red')
+            state.reset()
+            return dtrace.A_SKIP_BUY if direction == 'buy' else dtrace.A_SKIP_SELL
+
+        tick = mt5.symbol_info_tick(rt.symbol)
+        if not tick:
+            rt.log(f"❌ No tick for {label} entry", color='red')
+            return dtrace.A_ORDER_FAILED
+        entry_price = tick.ask if direction == 'buy' else tick.bid
+        rt.log(f"{'📈 Buy' if direction == 'buy' else '📉 Sell'} signal triggered | entry={entry_price}", color='green' if direction == 'buy' else 'red')
+
+        try:
+            log_signal(
+                symbol=rt.symbol,
+                strategy="swing_fib_v1",
+                direction=direction,
+                rr=MT5_CONFIG['win_ratio'],
+                entry=entry_price,
+                sl=float(state.fib_levels['1.0']),
+                tp=None,
+                fib=state.fib_levels,
+                confidence=None,
+                features_json=None,
+                note="triggered_by_pullback"
+            )
+        except Exception:
+            pass
+
+        stop, skip_msg = resolve_entry_stop(
+            direction, entry_price, state.fib_levels['1.0'],
+            pip_size=rt.conn.pip_size(),
+            min_dist=rt.conn.min_stop_distance(),
+        )
+        if stop is None:
+            rt.log(skip_msg, color='red')
+            state.reset()
+            return dtrace.A_STOP_REJECTED
+
+        risk_percent = MT5_CONFIG.get('risk_percent', 1.0)
+        open_position = rt.conn.open_buy_position if direction == 'buy' else rt.conn.open_sell_position
+        result = open_position(
+            tick=tick,
+            sl=stop,
+            tp=None,  # بدون TP - Trailing Stop مدیریت می‌کند
+            comment=f"{'Bullish' if direction == 'buy' else 'Bearish'} Swing {rt.last_swing_type}",
+            risk_pct=risk_percent / 100.0
+        )
+        if result and getattr(result, 'retcode', None) == 10009:
+            rt.log(f'✅ {label} order executed: Ticket={result.order} Price={result.price} Volume={result.volume}', color='green')
+            try:
+                send_trade_email_async(
+                    subject=f"NEW {label} ORDER {rt.symbol}",
+                    body=(
+                        f"Time: {datetime.now()}\n"
+                        f"Symbol: {rt.symbol}\n"
+                        f"Entry: {result.price}\n"
+                        f"SL: {stop}\n"
+                        f"Ticket={result.order} Volume={result.volume}\n"
+                    )
+                )
+            except Exception as _e:
+                rt.log(f'Email dispatch failed: {_e}', color='red')
+        elif result:
+            rt.log(f'❌ {label} failed retcode={result.retcode} comment={result.comment}', color='red')
+        else:
+            rt.log(f'❌ {label} failed (no result object)', color='red')
+        state.reset()
+        if result and getattr(result, 'retcode', None) == 10009:
+            return dtrace.A_BUY if direction == 'buy' else dtrace.A_SELL
+        return dtrace.A_ORDER_FAILED
+
+    def manage_positions(self):
+        # یک فراخوانی positions_get برای همه نمادها؛ فقط نمادهای دارای پوزیشن مدیریت می‌شوند
+        positions = mt5.positions_get()
+        open_symbols = {p.symbol for p in positions or ()}
+        for rt in self.runtimes:
+            if rt.symbol in open_symbols:
+                manage_open_positions(rt.conn, rt.position_states, rt.log)
+            else:
+                metrics.update_positions(rt.symbol, {})  # پوزیشن‌های بسته شده از gauge حذف می‌شوند
+
+    # ---------- Latency ----------
+    def latency_report(self):
+        """آمار تاخیر هر نماد و برآورد تعداد نمادی که یک پروسه در هر دور پوشش می‌دهد."""
+        report = {rt.symbol: rt.latency.summary() for rt in self.runtimes}
+        means = [s['mean_ms'] for s in report.values() if s['mean_ms']]
+        budget_ms = float(self.cfg.get('poll_interval', 0.5)) * 1000.0
+        per_symbol_ms = sum(means) / len(means) if means else None
+        report['_pass'] = self.pass_latency.summary()
+        report['_capacity'] = {
+            'budget_ms': budget_ms,
+            'mean_symbol_ms': per_symbol_ms,
+            'max_symbols': int(budget_ms // per_symbol_ms) if per_symbol_ms else None,
+        }
+        return report
+
+    def log_latency(self):
+        report = self.latency_report()
+        for rt in self.runtimes:
+            s = report[rt.symbol]
+            if s['mean_ms'] is None:
+                continue
+            base_log(f"⏱️ [{rt.symbol}] cycles={s['count']} p50={s['p50_ms']:.1f}ms p95={s['p95_ms']:.1f}ms max={s['max_ms']:.1f}ms", color='cyan')
+        cap = report['_capacity']
+        if cap['max_symbols'] is not None:
+            base_log(f"⏱️ pass p95={report['_pass']['p95_ms']:.1f}ms | ~{cap['mean_symbol_ms']:.1f}ms/symbol -> ~{cap['max_symbols']} symbols per {cap['budget_ms']:.0f}ms pass", color='cyan')
+
+    # ---------- Main loop ----------
+    def run(self):
+        poll_interval = float(self.cfg.get('poll_interval', 0.5))
+        report_every = int(self.cfg.get('latency_report_every', 120))
+        last_can_trade_state = None
+        passes = 0
+        profiler = runtime_profiler.from_config(PROFILER_CONFIG, os.path.dirname(os.path.abspath(__file__)), base_log)
+        while True:
+            try:
+                if profiler:
+                    profiler.poll()
+                calendar = self.session.session_calendar
+                in_session = calendar.is_open(self.session.get_iran_time())
+                if in_session:
+                    can_trade, trade_message = self.session.can_trade()
+                else:
+                    can_trade, trade_message = False, "Session closed"
+                if last_can_trade_state is True and not can_trade:
+                    base_log("🧹 Trading hours ended -> resetting all symbol states", color='magenta')
+                    for rt in self.runtimes:
+                        rt.state.reset()
+                last_can_trade_state = can_trade
+                if not can_trade:
+                    base_log(f"⏰ {trade_message}", color='yellow', save_to_file=False)
+                    if in_session:
+                        sleep(60)
+                    else:
+                        wait_for_session(
+                            calendar, self.session.get_iran_time,
+                            warmup_sec=SESSION_CONFIG.get('warmup_sec', 60),
+                            warmup=self.warmup,
+                            max_chunk_sec=SESSION_CONFIG.get('max_sleep_chunk_sec', 900),
+                            log=base_log,
+                        )
+                    continue
+
+                t0 = perf_counter()
+                for rt, data, fetch_ms in self.fetch_bars():
+                    try:
+                        self.process(rt, data, fetch_ms)
+                    except Exception as e:
+                        rt.log(f"❌ Error: {e}", color='red')
+                self.manage_positions()
+                self.pass_latency.add((perf_counter() - t0) * 1000.0)
+
+                passes += 1
+                if report_every and passes % report_every == 0:
+                    self.log_latency()
+                sleep(poll_interval)
+
+            except KeyboardInterrupt:
+                base_log("🛑 Bot stopped by user", color='yellow')
+                for rt in self.runtimes:
+                    rt.conn.close_all_positions()
+                break
+            except Exception as e:
+                base_log(f"❌ Error: {e}", color='red')
+                sleep(5)
+
+        if profiler:
+            profiler.stop()
+        for rt in self.runtimes:
+            if rt.tracer:
+                rt.tracer.close()
+        self.session.shutdown()
+        print("🔌 MT5 connection closed")
+
+
+def main():
+    init(autoreset=True)
+    engine = MultiSymbolEngine()
+    print(f"🚀 Multi-symbol bot: {', '.join(rt.symbol for rt in engine.runtimes)} | schedule={engine.schedule}")
+    if not engine.initialize():
+        print("❌ Failed to connect to MT5")
+        return
+    start_housekeeper(base_log)
+    if METRICS_CONFIG.get('enable'):
+        metrics.start_metrics_server(METRICS_CONFIG.get('host', '127.0.0.1'), METRICS_CONFIG.get('port', 9108))
+    engine.run()
+
+
+if __name__ == "__main__":
+    main()
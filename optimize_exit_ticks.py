@@ -13,6 +13,9 @@ from exit_optimizer_core import (
     compute_metrics,
     save_equity_curve,
     save_r_distribution,
+    DEFAULT_TICK_CACHE_MB,
+    TICKS_CACHE,
+    trade_tick_files,
 )
 
 
@@ -31,6 +34,8 @@ def main():
     parser.add_argument("--params", type=str, required=False, help="JSON string of parameters")
     parser.add_argument("--out_equity", type=str, default=os.path.join(PROJECT_ROOT, "equity_curve_best.png"))
     parser.add_argument("--out_hist", type=str, default=os.path.join(PROJECT_ROOT, "r_distribution_best.png"))
+    parser.add_argument("--tick-cache-mb", type=int, default=DEFAULT_TICK_CACHE_MB, help="memory budget of the tick cache")
+    parser.add_argument("--pin-months", action="store_true", help="never evict the tick months this run needs")
     args = parser.parse_args()
 
     if args.params:
@@ -49,6 +54,9 @@ def main():
 
     params = ExitParams(**p_dict)
     df_report = read_report_csv(REPORT_PATH)
+    TICKS_CACHE.set_budget(args.tick_cache_mb * 1024 * 1024)
+    if args.pin_months:
+        TICKS_CACHE.pin(trade_tick_files(df_report, get_trade_window, PROJECT_ROOT))
     r_values: List[float] = []
     for _, row in df_report.iterrows():
         symbol = str(row["Symbol"]).upper()
@@ -61,6 +69,7 @@ def main():
             continue
         r_values.append(sim.r_total)
 
+    print(TICKS_CACHE.summary())
     metrics = compute_metrics(r_values)
     print(json.dumps(metrics, indent=2))
     save_equity_curve(r_values, args.out_equity)
@@ -0,0 +1,203 @@
+"""
+پروفایل کردن ربات در حال اجرا بدون ری‌استارت.
+
+شروع با ساختن فایل کنترل در پوشه پروژه (روی ویندوز/VPS) یا با سیگنال (لینوکس):
+
+    echo sample 60  > profile.request      # نمونه‌برداری از stack هر 5ms به مدت 60 ثانیه
+    echo cprofile 30 > profile.request     # cProfile روی thread اصلی به مدت 30 ثانیه
+    echo both 30 > profile.request
+    kill -USR1 <pid>                       # حالت و مدت پیش‌فرض PROFILER_CONFIG
+    kill -USR2 <pid>                       # cProfile با مدت پیش‌فرض
+
+خروجی در trading-analytics-logger/data/profiles:
+  profile_<time>.pstats (+ .txt با 40 تابع پرهزینه) برای cProfile و
+  profile_<time>.collapsed (ورودی flamegraph.pl / speedscope) برای نمونه‌بردار.
+
+وقتی پروفایلی فعال نیست، poll() فقط یک مقایسه زمان است و هر check_interval_sec
+یک بار وجود فایل کنترل را بررسی می‌کند.
+"""
+import cProfile
+import io
+import os
+import pstats
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from analytics.hooks import RAW_DIR
+
+PROFILE_DIR = RAW_DIR.parent / "profiles"
+MODES = ('sample', 'cprofile', 'both')
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler:
+    """نمونه‌بردار stack یک thread از طریق sys._current_frames در یک thread پس‌زمینه."""
+
+    def __init__(self, thread_id, interval_sec=0.005):
+        self.thread_id = thread_id
+        self.interval_sec = interval_sec
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval_sec):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def write_collapsed(self, path) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+class RuntimeProfiler:
+    def __init__(self, control_file='profile.request', out_dir=PROFILE_DIR, default_mode='sample',
+                 default_seconds=60, sample_interval_ms=5, check_interval_sec=1.0, log=None):
+        self.control_file = Path(control_file)
+        self.out_dir = Path(out_dir)
+        self.default_mode = default_mode
+        self.default_seconds = float(default_seconds)
+        self.sample_interval_sec = float(sample_interval_ms) / 1000.0
+        self.check_interval_sec = float(check_interval_sec)
+        self.log = log
+        self.active = False
+        self._requested = None
+        self._next_check = 0.0
+        self._deadline = 0.0
+        self._mode = None
+        self._stamp = None
+        self._profile = None
+        self._sampler = None
+
+    def _emit(self, msg, color='magenta'):
+        if self.log:
+            self.log(msg, color=color)
+        else:
+            print(msg)
+
+    # ---------- Triggers ----------
+    def install_signals(self) -> None:
+        """SIGUSR1: حالت پیش‌فرض، SIGUSR2: cProfile (روی ویندوز وجود ندارند)."""
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, lambda *_: self.request(self.default_mode))
+        if hasattr(signal, 'SIGUSR2'):
+            signal.signal(signal.SIGUSR2, lambda *_: self.request('cprofile'))
+
+    def request(self, mode=None, seconds=None) -> None:
+        self._requested = (mode or self.default_mode, seconds or self.default_seconds)
+
+    def _read_control_file(self):
+        try:
+            text = self.control_file.read_text(encoding='utf-8').split()
+            self.control_file.unlink()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            self._emit(f"⚠️ Profiler control file unreadable: {e}", color='yellow')
+            return None
+        mode = text[0].lower() if text else self.default_mode
+        try:
+            seconds = float(text[1]) if len(text) > 1 else self.default_seconds
+        except ValueError:
+            seconds = self.default_seconds
+        return mode, seconds
+
+    # ---------- Main loop hook ----------
+    def poll(self) -> None:
+        """در هر دور حلقه اصلی (از همان thread که باید پروفایل شود) صدا زده می‌شود."""
+        now = time.monotonic()
+        if self.active:
+            if now >= self._deadline:
+                self.stop()
+            return
+        if self._requested is None:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.check_interval_sec
+            self._requested = self._read_control_file()
+            if self._requested is None:
+                return
+        mode, seconds = self._requested
+        self._requested = None
+        self.start(mode, seconds)
+
+    def start(self, mode='sample', seconds=60) -> None:
+        if mode not in MODES:
+            self._emit(f"⚠️ Unknown profiler mode {mode!r}; expected one of {MODES}", color='yellow')
+            return
+        self._mode = mode
+        self._stamp = time.strftime('%Y%m%d_%H%M%S')
+        self._deadline = time.monotonic() + seconds
+        if mode in ('sample', 'both'):
+            self._sampler = StackSampler(threading.get_ident(), self.sample_interval_sec)
+            self._sampler.start()
+        if mode in ('cprofile', 'both'):
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self.active = True
+        self._emit(f"🔬 Profiler started: mode={mode} for {seconds:g}s")
+
+    def stop(self) -> list:
+        """توقف و نوشتن فایل‌ها؛ مسیر فایل‌های نوشته شده را برمی‌گرداند."""
+        if not self.active:
+            return []
+        self.active = False
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        base = self.out_dir / f"profile_{self._stamp}"
+        written = []
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(f"{base}.pstats")
+            buf = io.StringIO()
+            pstats.Stats(self._profile, stream=buf).sort_stats('cumulative').print_stats(40)
+            Path(f"{base}.txt").write_text(buf.getvalue(), encoding='utf-8')
+            written += [f"{base}.pstats", f"{base}.txt"]
+            self._profile = None
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler.write_collapsed(f"{base}.collapsed")
+            written.append(f"{base}.collapsed")
+            self._sampler = None
+        self._emit(f"🔬 Profiler finished ({self._mode}): {', '.join(os.path.basename(p) for p in written)} in {self.out_dir}")
+        return written
+
+
+def from_config(cfg, project_root='.', log=None):
+    if not cfg.get('enable', True):
+        return None
+    profiler = RuntimeProfiler(
+        control_file=os.path.join(project_root, cfg.get('control_file', 'profile.request')),
+        default_mode=cfg.get('default_mode', 'sample'),
+        default_seconds=cfg.get('default_seconds', 60),
+        sample_interval_ms=cfg.get('sample_interval_ms', 5),
+        check_interval_sec=cfg.get('check_interval_sec', 1.0),
+        log=log,
+    )
+    profiler.install_signals()
+    return profiler
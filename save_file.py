@@ -1,17 +1,143 @@
+"""
+لاگ سطح‌بندی شده و صف‌دار ربات.
+
+log() همان امضای قبلی را دارد ولی به جای باز کردن فایل روزانه در هر پیام،
+رکورد را با QueueHandler در صف می‌گذارد و یک QueueListener در پس‌زمینه آن را
+روی کنسول (رنگی) و فایل swing_logs_YYYY-MM-DD.txt (که باز می‌ماند) می‌نویسد.
+اطلاعات محل فراخوانی با stacklevel خود logging گرفته می‌شود و سطح لاگ از
+LOG_CONFIG['log_level'] خوانده می‌شود؛ برای پیام‌های پرحجم هر دور از debug()
+با آرگومان‌های تنبل (lazy) استفاده کنید:
+
+    debug('Start index: %s value: %s', start_index, value, color='yellow')
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
 from datetime import datetime
-from colorama import init, Fore
+
+from colorama import init, Fore, Style
+
+from housekeeping import max_log_bytes, rotate_file
+from metatrader5_config import LOG_CONFIG
 
 # راه‌اندازی colorama
 init(autoreset=True)
 
-def log(msg, level='info', color=None, save_to_file=True):
-    color_prefix = getattr(Fore, color.upper(), '') if color else ''
-    print(f"{color_prefix}{msg}")
+LOGGER_NAME = 'swing'
+LOG_FORMAT = '[%(filename)s:%(funcName)s:%(lineno)d] %(message)s'
+_LEVELS = {
+    'debug': logging.DEBUG,
+    'info': logging.INFO,
+    'warning': logging.WARNING,
+    'warn': logging.WARNING,
+    'error': logging.ERROR,
+    'critical': logging.CRITICAL,
+}
+
+_logger = None
+_listener = None
+
+
+class _ColorConsoleHandler(logging.StreamHandler):
+    def format(self, record):
+        msg = super().format(record)
+        color = getattr(record, 'color', None)
+        prefix = getattr(Fore, color.upper(), '') if color else ''
+        return f"{prefix}{msg}{Style.RESET_ALL}" if prefix else msg
+
+
+class _DailyFileHandler(logging.Handler):
+    """swing_logs_YYYY-MM-DD.txt باز می‌ماند؛ با تغییر روز یا رسیدن به max_log_size چرخش می‌کند."""
+
+    def __init__(self, pattern='swing_logs_{day}.txt', pending=None):
+        super().__init__()
+        self.pattern = pattern
+        self.pending = pending  # صف listener: flush فقط وقتی صف خالی شد
+        self.max_bytes = max_log_bytes()
+        self._day = None
+        self._path = None
+        self._f = None
+
+    def _open(self, day):
+        if self._f:
+            self._f.close()
+        self._day = day
+        self._path = self.pattern.format(day=day)
+        self._f = open(self._path, 'a', encoding='utf-8')
 
-    if save_to_file:
-        log_filename = f"swing_logs_{datetime.now().strftime('%Y-%m-%d')}.txt"
+    def emit(self, record):
+        if not getattr(record, 'save_to_file', True):
+            return
         try:
-            with open(log_filename, 'a', encoding='utf-8') as f:
-                f.write(f"{msg}\n")
-        except Exception as e:
-            print(f"خطا در ذخیره لاگ: {e}")
\ No newline at end of file
+            day = datetime.fromtimestamp(record.created).strftime('%Y-%m-%d')
+            if day != self._day:
+                self._open(day)
+            self._f.write(self.format(record) + '\n')
+            if self.pending is None or self.pending.empty():
+                self._f.flush()
+            if self._f.tell() >= self.max_bytes:
+                self._f.close()
+                rotate_file(self._path)
+                self._f = open(self._path, 'a', encoding='utf-8')
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        if self._f:
+            try:
+                self._f.close()
+            finally:
+                self._f = None
+        super().close()
+
+
+def get_logger() -> logging.Logger:
+    """logger مشترک 'swing' (یک بار پیکربندی می‌شود)."""
+    global _logger, _listener
+    if _logger is not None:
+        return _logger
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(_LEVELS.get(str(LOG_CONFIG.get('log_level', 'INFO')).lower(), logging.INFO))
+    logger.propagate = False
+    q = queue.SimpleQueue()
+    handlers = [_ColorConsoleHandler(sys.stdout)]
+    if LOG_CONFIG.get('save_to_file', True):
+        handlers.append(_DailyFileHandler(pending=q))
+    formatter = logging.Formatter(LOG_FORMAT)
+    for h in handlers:
+        h.setFormatter(formatter)
+    logger.handlers[:] = [logging.handlers.QueueHandler(q)]
+    _listener = logging.handlers.QueueListener(q, *handlers)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    _logger = logger
+    return logger
+
+
+def shutdown_logging():
+    """تخلیه صف و بستن فایل (در خروج برنامه خودکار اجرا می‌شود)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for h in _listener.handlers:
+            h.close()
+        _listener = None
+
+
+def is_enabled(level='debug') -> bool:
+    return get_logger().isEnabledFor(_LEVELS.get(level, logging.INFO))
+
+
+def log(msg, level='info', color=None, save_to_file=True, *args, stacklevel=1):
+    logger = _logger or get_logger()
+    lvl = _LEVELS.get(level, logging.INFO)
+    if logger.isEnabledFor(lvl):
+        logger.log(lvl, msg, *args, extra={'color': color, 'save_to_file': save_to_file}, stacklevel=stacklevel + 1)
+
+
+def debug(msg, *args, color=None, save_to_file=True, stacklevel=1):
+    logger = _logger or get_logger()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(msg, *args, extra={'color': color, 'save_to_file': save_to_file}, stacklevel=stacklevel + 1)
@@ -0,0 +1,91 @@
+"""
+تقویم جلسه معاملاتی از پیش محاسبه شده بر اساس trading_hours و قوانین آخر هفته.
+
+به جای بیدار شدن هر 60 ثانیه و فراخوانی can_trade (پارس دوباره ساعت‌ها و
+IPC به ترمینال)، حلقه اصلی زمان دقیق باز/بسته شدن بعدی را محاسبه می‌کند و
+تا همان لحظه می‌خوابد؛ کمی قبل از باز شدن یک warm-up اجرا می‌شود.
+"""
+from datetime import datetime, time, timedelta
+from time import sleep
+
+import pytz
+
+# مطابق check_weekend: شنبه و یکشنبه (Monday=0)
+WEEKEND_DAYS = (5, 6)
+
+
+class SessionCalendar:
+    def __init__(self, trading_hours, closed_weekdays=WEEKEND_DAYS, tz=None):
+        self.start = time.fromisoformat(trading_hours['start'])
+        self.end = time.fromisoformat(trading_hours['end'])
+        self.closed_weekdays = tuple(closed_weekdays)
+        self.tz = tz or pytz.timezone('Asia/Tehran')
+
+    def is_weekday_open(self, now: datetime) -> bool:
+        return now.weekday() not in self.closed_weekdays
+
+    def is_in_hours(self, now: datetime) -> bool:
+        now_t = now.time()
+        if self.start <= self.end:
+            return self.start <= now_t <= self.end
+        # window passes midnight
+        return now_t >= self.start or now_t <= self.end
+
+    def is_open(self, now: datetime) -> bool:
+        return self.is_weekday_open(now) and self.is_in_hours(now)
+
+    def _boundaries(self, now: datetime, days: int):
+        # تنها لحظه‌هایی که وضعیت می‌تواند تغییر کند: نیمه‌شب، start و کمی بعد از end
+        day0 = now.date()
+        for offset in range(days + 1):
+            d = day0 + timedelta(days=offset)
+            for t, shift in ((time(0, 0), None), (self.start, None), (self.end, timedelta(microseconds=1))):
+                instant = self.tz.localize(datetime.combine(d, t))
+                if shift:
+                    instant += shift
+                if instant > now:
+                    yield instant
+
+    def next_change(self, now: datetime, days: int = 8):
+        """اولین لحظه بعد از now که وضعیت باز/بسته تغییر می‌کند (یا None)."""
+        current = self.is_open(now)
+        for instant in sorted(self._boundaries(now, days)):
+            if self.is_open(instant) != current:
+                return instant
+        return None
+
+    def status(self, now: datetime):
+        """(is_open, next_change)"""
+        return self.is_open(now), self.next_change(now)
+
+
+def sleep_until(target: datetime, now_fn, max_chunk_sec: float = 900.0) -> None:
+    """خواب تا target در تکه‌های محدود تا تغییر ساعت سیستم/suspend اصلاح شود."""
+    while True:
+        remaining = (target - now_fn()).total_seconds()
+        if remaining <= 0:
+            return
+        sleep(min(remaining, max_chunk_sec))
+
+
+def wait_for_session(calendar: SessionCalendar, now_fn, warmup_sec: float = 60.0, warmup=None,
+                     max_chunk_sec: float = 900.0, log=None) -> None:
+    """تا باز شدن جلسه بعدی می‌خوابد؛ warmup_sec ثانیه قبل از آن warmup() اجرا می‌شود."""
+    now = now_fn()
+    if calendar.is_open(now):
+        return
+    next_open = calendar.next_change(now)
+    if next_open is None:
+        sleep(60)
+        return
+    warmup_at = next_open - timedelta(seconds=warmup_sec)
+    if log:
+        log(f"💤 Sleeping until {next_open:%Y-%m-%d %H:%M:%S} (Iran), warm-up at {warmup_at:%H:%M:%S}", color='yellow', save_to_file=False)
+    sleep_until(warmup_at, now_fn, max_chunk_sec)
+    if warmup:
+        try:
+            warmup()
+        except Exception as e:
+            if log:
+                log(f"⚠️ Session warm-up failed: {e}", color='yellow')
+    sleep_until(next_open, now_fn, max_chunk_sec)
@@ -0,0 +1,130 @@
+"""
+Snapshot دوره‌ای و اتمیک وضعیت ربات برای راه‌اندازی مجدد گرم (warm restart).
+
+محتوا: BotState (سطوح فیبو، تاچ‌ها، زمان‌ها)، last_swing_type، position_states
+(شامل ریسک اولیه واقعی که بعد از جابه‌جایی SL توسط trailing از pos.sl قابل
+بازسازی نیست) و پنجره‌ی آخر کندل‌ها. نوشتن روی فایل موقت و سپس os.replace
+انجام می‌شود تا فایل هیچ‌وقت نیمه‌کاره نماند.
+"""
+import os
+import pickle
+import time
+from typing import Optional, Dict, Any, Tuple
+
+import numpy as np
+import pandas as pd
+
+SNAPSHOT_VERSION = 1
+
+BAR_DTYPE = np.dtype([
+    ('time', '<i8'),      # epoch seconds (UTC)
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+])
+
+
+def _bars_to_array(df, max_bars: int) -> Optional[np.ndarray]:
+    if df is None or len(df) == 0:
+        return None
+    tail = df.iloc[-max_bars:]
+    arr = np.empty(len(tail), dtype=BAR_DTYPE)
+    arr['time'] = tail.index.as_unit('s').asi8
+    for col in ('open', 'high', 'low', 'close'):
+        arr[col] = tail[col].to_numpy(dtype=float)
+    return arr
+
+
+def bars_from_array(arr: Optional[np.ndarray], tz) -> Optional[pd.DataFrame]:
+    """پنجره‌ی ذخیره‌شده به همان شکل خروجی get_historical_data (بدون volume) به‌همراه status."""
+    if arr is None or len(arr) == 0:
+        return None
+    index = pd.to_datetime(arr['time'], unit='s', utc=True).tz_convert(tz)
+    df = pd.DataFrame({col: arr[col] for col in ('open', 'high', 'low', 'close')}, index=pd.Index(index, name='time'))
+    df['timestamp'] = df.index
+    df['status'] = np.where(df['open'] > df['close'], 'bearish', 'bullish')
+    return df
+
+
+def save_snapshot(path: str, symbol: str, state, last_swing_type, position_states: Dict[int, Dict[str, Any]],
+                  bars_df=None, last_data_time=None, max_bars: int = 200) -> None:
+    payload = {
+        'version': SNAPSHOT_VERSION,
+        'saved_at': time.time(),
+        'symbol': symbol,
+        'state': state.to_dict(),
+        'last_swing_type': last_swing_type,
+        'position_states': {int(t): dict(st) for t, st in position_states.items()},
+        'bars': _bars_to_array(bars_df, max_bars),
+        'last_data_time': last_data_time,
+    }
+    tmp = f"{path}.tmp"
+    with open(tmp, 'wb') as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_snapshot(path: str, symbol: str, max_age_sec: Optional[float] = None) -> Tuple[Optional[Dict[str, Any]], str]:
+    """خروجی: (payload یا None، دلیل)."""
+    if not os.path.exists(path):
+        return None, "no snapshot file"
+    try:
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+    except Exception as e:
+        return None, f"unreadable snapshot: {e}"
+    if payload.get('version') != SNAPSHOT_VERSION:
+        return None, f"snapshot version {payload.get('version')} != {SNAPSHOT_VERSION}"
+    if payload.get('symbol') != symbol:
+        return None, f"snapshot symbol {payload.get('symbol')} != {symbol}"
+    age = time.time() - float(payload.get('saved_at', 0))
+    if max_age_sec is not None and age > max_age_sec:
+        return None, f"snapshot too old ({age:.0f}s > {max_age_sec}s)"
+    return payload, f"snapshot age {age:.0f}s"
+
+
+def validate_position_states(saved: Dict[int, Dict[str, Any]], live_positions) -> Dict[int, Dict[str, Any]]:
+    """
+    فقط وضعیت تیکت‌هایی که هنوز باز هستند و قیمت ورودشان یکسان است نگه داشته می‌شود.
+    پوزیشن‌های باز بدون snapshot بعداً توسط register_position ثبت می‌شوند.
+    """
+    live = {p.ticket: p for p in (live_positions or ())}
+    restored = {}
+    for ticket, st in (saved or {}).items():
+        pos = live.get(ticket)
+        if pos is None:
+            continue
+        if abs(float(st.get('entry', 0.0)) - float(pos.price_open)) > 1e-9:
+            continue
+        if not st.get('risk'):
+            continue
+        restored[ticket] = st
+    return restored
+
+
+class SnapshotManager:
+    """ذخیره دوره‌ای: بعد از هر تغییر وضعیت (mark_dirty) یا حداکثر هر interval_sec."""
+
+    def __init__(self, path: str, symbol: str, interval_sec: float = 30.0, max_bars: int = 200):
+        self.path = path
+        self.symbol = symbol
+        self.interval_sec = interval_sec
+        self.max_bars = max_bars
+        self._dirty = False
+        self._last_save = 0.0
+
+    def mark_dirty(self) -> None:
+        self._dirty = True
+
+    def maybe_save(self, state, last_swing_type, position_states, bars_df=None, last_data_time=None, force=False) -> bool:
+        now = time.time()
+        if not (force or self._dirty or now - self._last_save >= self.interval_sec):
+            return False
+        save_snapshot(self.path, self.symbol, state, last_swing_type, position_states,
+                      bars_df=bars_df, last_data_time=last_data_time, max_bars=self.max_bars)
+        self._dirty = False
+        self._last_save = now
+        return True
@@ -0,0 +1,285 @@
+import MetaTrader5 as mt5
+from fibo_calculate import fibonacci_retracement
+from metatrader5_config import EXIT_MANAGEMENT_CONFIG
+from analytics.hooks import log_position_event
+import metrics
+
+
+# ---------- Fibonacci state machine ----------
+def apply_swing(state, data, legs, swing_type, log):
+    """
+    Phase 1: ساخت فیبوناچی جدید روی سوینگ تایید شده.
+    اگر فیبو جدید ساخته شد نوع سوینگ را برمی‌گرداند، در غیر این صورت None.
+    """
+    log(f"is_swing: {swing_type}")
+    if swing_type == 'bullish' and data.iloc[-2]['close'] > legs[1]['start_value']:
+        state.reset()
+        state.fib_levels = fibonacci_retracement(start_price=legs[2]['end_value'], end_price=legs[2]['start_value'])
+        state.fib0_time = legs[2]['start']
+        state.fib1_time = legs[2]['end']
+        log(f"📈 New fibonacci created: fib1:{state.fib_levels['1.0']} time:{legs[2]['start']} - fib0.705:{state.fib_levels['0.705']} - fib0:{state.fib_levels['0.0']} time:{legs[2]['end']}", color='green')
+        return swing_type
+
+    if swing_type == 'bearish' and data.iloc[-2]['close'] < legs[1]['start_value']:
+        state.reset()
+        state.fib_levels = fibonacci_retracement(start_price=legs[2]['end_value'], end_price=legs[2]['start_value'])
+        state.fib0_time = legs[2]['start']
+        state.fib1_time = legs[2]['end']
+        log(f"📉 New fibonacci created: fib1:{state.fib_levels['1.0']} time:{legs[2]['start']} - fib0.705:{state.fib_levels['0.705']} - fib0:{state.fib_levels['0.0']} time:{legs[2]['end']}", color='green')
+        return swing_type
+
+    return None
+
+
+def advance_fib_state(state, data, last_swing_type, log):
+    """
+    Phase 2/3: به‌روزرسانی فیبوی فعال با آخرین کندل بسته شده (data.iloc[-2])
+    و ثبت تاچ اول/دوم ناحیه 0.705.
+    """
+    bar = data.iloc[-2]
+    if last_swing_type == 'bullish':
+        if bar['high'] > state.fib_levels['0.0']:
+            state.fib_levels = fibonacci_retracement(start_price=bar['high'], end_price=state.fib_levels['1.0'])
+            state.fib0_time = bar['timestamp']
+            state.first_touch = False
+            state.first_touch_value = None
+            # Should it be reset???
+            log(f"📈 Updated fibonacci: fib1:{state.fib_levels['1.0']} - fib0.705:{state.fib_levels['0.705']} - fib0:{state.fib_levels['0.0']}", color='green')
+        elif bar['low'] < state.fib_levels['1.0']:
+            state.reset()
+            log(f"📈 Price dropped below fib1 on bullish and reset fib levels", color='red')
+        elif bar['low'] <= state.fib_levels['0.705']:
+            log(f"📈 Price touched fib0.705 on bullish -- cache_data status is {bar['status']}", color='red')
+            if not state.first_touch:
+                state.first_touch_value = bar
+                state.first_touch = True
+                log(f"📈 First touch on bullish: {state.first_touch_value['timestamp']}  first touch status is {state.first_touch_value['status']}", color='green')
+            elif state.first_touch and not state.second_touch and bar['status'] != state.first_touch_value['status']:
+                state.second_touch_value = bar
+                state.second_touch = True
+                log(f"📈 Second touch on bullish: {state.second_touch_value['timestamp']}  second touch status is {state.second_touch_value['status']}", color='green')
+
+    elif last_swing_type == 'bearish':
+        if bar['low'] < state.fib_levels['0.0']:
+            state.fib_levels = fibonacci_retracement(start_price=bar['low'], end_price=state.fib_levels['1.0'])
+            state.fib0_time = bar['timestamp']
+            state.first_touch = False
+            state.first_touch_value = None
+            # Should it be reset???
+            log(f"📉 Updated fibonacci: fib1:{state.fib_levels['1.0']} - fib0.705:{state.fib_levels['0.705']} - fib0:{state.fib_levels['0.0']}", color='green')
+        elif bar['high'] > state.fib_levels['1.0']:
+            state.reset()
+            log(f"📉 Price dropped below fib1 on bearish and reset fib levels", color='red')
+        elif bar['high'] >= state.fib_levels['0.705']:
+            log(f"📉 Price touched fib0.705 on bearish -- cache_data status is {bar['status']}", color='red')
+            if not state.first_touch:
+                state.first_touch_value = bar
+                state.first_touch = True
+                log(f"📉 First touch on bearish: {state.first_touch_value['timestamp']}  first touch status is {state.first_touch_value['status']}", color='red')
+            elif state.first_touch and not state.second_touch and bar['status'] != state.first_touch_value['status']:
+                state.second_touch_value = bar
+                state.second_touch = True
+                log(f"📉 Second touch on bearish: {state.second_touch_value['timestamp']}  second touch status is {state.second_touch_value['status']}", color='red')
+
+
+# ---------- Entry guards ----------
+def blocking_position_reason(positions, direction, check_mode='all'):
+    """
+    قاعده position_check_mode برای سیگنال ورود: 'all' با هر پوزیشن باز، 'conflicting'
+    فقط با پوزیشن مخالف جهت سیگنال رد می‌شود. خروجی: skip_reason یا None
+    """
+    if not positions:
+        return None
+    if check_mode == 'all':
+        return f"Position(s) already open (mode: {check_mode})"
+    if check_mode == 'conflicting':
+        opposite = mt5.POSITION_TYPE_SELL if direction == 'buy' else mt5.POSITION_TYPE_BUY
+        if any(p.type == opposite for p in positions):
+            return f"Conflicting {'SELL' if direction == 'buy' else 'BUY'} position(s) detected"
+    return None
+
+
+# ---------- Entry stop ----------
+def resolve_entry_stop(direction, entry_price, fib1, pip_size, min_dist, min_pip_dist=2.0):
+    """
+    SL همیشه روی fib 1.0؛ اگر فاصله کمتر از حداقل مجاز باشد جابه‌جا می‌شود.
+    خروجی: (stop, None) یا (None, skip_reason)
+    """
+    candidate_sl = fib1
+    min_abs_dist = max(min_pip_dist * pip_size, min_dist)
+
+    if direction == 'buy':
+        # گارد جهت - fib 1.0 همیشه باید زیر entry باشد
+        if candidate_sl >= entry_price:
+            return None, "🚫 Skip BUY: fib 1.0 is above entry price"
+        if (entry_price - candidate_sl) < min_abs_dist:
+            adj = entry_price - min_abs_dist
+            if adj <= 0:
+                return None, "🚫 Skip BUY: invalid SL distance"
+            candidate_sl = float(adj)
+        stop = float(candidate_sl)
+        if stop >= entry_price:
+            return None, "🚫 Skip BUY: SL still >= entry after adjust"
+        return stop, None
+
+    # گارد جهت - fib 1.0 همیشه باید بالای entry باشد
+    if candidate_sl <= entry_price:
+        return None, "🚫 Skip SELL: fib 1.0 is below entry price"
+    if (candidate_sl - entry_price) < min_abs_dist:
+        candidate_sl = float(entry_price + min_abs_dist)
+    stop = float(candidate_sl)
+    if stop <= entry_price:
+        return None, "🚫 Skip SELL: SL still <= entry after adjust"
+    return stop, None
+
+
+# ---------- Position management ----------
+def register_position(conn, position_states, pos):
+    # محاسبه R (ریسک اولیه)
+    risk = abs(pos.price_open - pos.sl) if pos.sl else None
+    if not risk or risk == 0:
+        return
+    position_states[pos.ticket] = {
+        'entry': pos.price_open,
+        'risk': risk,
+        'direction': 'buy' if pos.type == mt5.POSITION_TYPE_BUY else 'sell',
+        'done_stages': set(),
+        'base_tp_R': 2.0,  # مقدار پیش‌فرض برای مرجع
+        'commission_locked': False
+    }
+    # رویداد ثبت پوزیشن
+    try:
+        log_position_event(
+            symbol=conn.symbol,
+            ticket=pos.ticket,
+            event='open',
+            direction=position_states[pos.ticket]['direction'],
+            entry=pos.price_open,
+            current_price=pos.price_open,
+            sl=pos.sl,
+            tp=pos.tp,
+            profit_R=0.0,
+            stage=0,
+            risk_abs=risk,
+            locked_R=None,
+            volume=pos.volume,
+            note='position registered'
+        )
+    except Exception:
+        pass
+
+
+def _update_position_metrics(conn, positions, position_states):
+    """gauge پوزیشن‌ها وقتی Trailing اجرا نمی‌شود (سود R از price_current خود پوزیشن)."""
+    profits = {}
+    for pos in positions or ():
+        st = position_states.get(pos.ticket)
+        risk = st['risk'] if st else (abs(pos.price_open - pos.sl) if pos.sl else 0.0)
+        move = pos.price_current - pos.price_open
+        profits[pos.ticket] = (move if pos.type == mt5.POSITION_TYPE_BUY else -move) / risk if risk else 0.0
+    metrics.update_positions(conn.symbol, profits)
+
+
+def manage_open_positions(conn, position_states, log):
+    """
+    مدیریت پوزیشن‌های باز با Trailing Stop
+    فقط از EXIT_MANAGEMENT_CONFIG استفاده می‌کند (DYNAMIC_RISK_CONFIG غیرفعال)
+    """
+    positions = conn.get_positions()
+    # بررسی فعال بودن مدیریت خروج و Trailing Stop؛ gauge پوزیشن‌ها در هر حال به‌روز می‌شود
+    if (not positions or not EXIT_MANAGEMENT_CONFIG.get('enable')
+            or not EXIT_MANAGEMENT_CONFIG.get('trailing_stop', {}).get('enable')):
+        _update_position_metrics(conn, positions, position_states)
+        return
+    tick = mt5.symbol_info_tick(conn.symbol)
+    if not tick:
+        _update_position_metrics(conn, positions, position_states)
+        return
+
+    # تنظیمات Trailing Stop
+    trailing_start_r = EXIT_MANAGEMENT_CONFIG['trailing_stop']['start_r']
+    trailing_gap_r = EXIT_MANAGEMENT_CONFIG['trailing_stop']['gap_r']
+    digits = conn.digits()
+    profits = {}
+
+    for pos in positions:
+        # ثبت پوزیشن اگر جدید است
+        if pos.ticket not in position_states:
+            register_position(conn, position_states, pos)
+
+        st = position_states.get(pos.ticket)
+        if not st:
+            continue
+
+        entry = st['entry']
+        risk = st['risk']
+        direction = st['direction']
+        cur_price = tick.bid if direction == 'buy' else tick.ask
+
+        # محاسبه سود بر حسب R
+        if direction == 'buy':
+            price_profit = cur_price - entry
+        else:
+            price_profit = entry - cur_price
+        profit_R = price_profit / risk if risk else 0.0
+        profits[pos.ticket] = profit_R
+
+        # بررسی فعال شدن Trailing Stop
+        trailing_active = st.get('trailing_active', False)
+
+        # فعال‌سازی Trailing Stop اگر به start_r رسید
+        if not trailing_active and profit_R >= trailing_start_r:
+            st['trailing_active'] = True
+            trailing_active = True
+            log(f'🔥 Trailing Stop ACTIVATED for ticket {pos.ticket} at {profit_R:.2f}R', color='yellow')
+
+        # اگر Trailing فعال است، SL را جابجا کن
+        if trailing_active:
+            # محاسبه Trailing Stop با فاصله gap_r از قیمت فعلی
+            gap = trailing_gap_r * risk
+            if direction == 'buy':
+                trail_sl = cur_price - gap
+            else:
+                trail_sl = cur_price + gap
+
+            trail_sl_r = float(f"{trail_sl:.{digits}f}")
+
+            # فقط اگر SL جدید بهتر از قبلی باشد
+            apply = False
+            if direction == 'buy' and trail_sl_r > pos.sl:
+                apply = True
+            elif direction == 'sell' and trail_sl_r < pos.sl:
+                apply = True
+
+            if not apply:
+                metrics.TRAILING_UPDATES.labels('suppressed').inc()
+            else:
+                res = conn.modify_sl_tp(pos.ticket, new_sl=trail_sl_r, new_tp=pos.tp)
+                ok = res and getattr(res, 'retcode', None) == 10009
+                metrics.TRAILING_UPDATES.labels('sent' if ok else 'failed').inc()
+                if ok:
+                    log(f'⬆️ Trailing Stop updated: ticket={pos.ticket} | Profit: {profit_R:.2f}R | New SL: {trail_sl_r}', color='cyan')
+                    try:
+                        log_position_event(
+                            symbol=conn.symbol,
+                            ticket=pos.ticket,
+                            event='trailing_update',
+                            direction=direction,
+                            entry=entry,
+                            current_price=cur_price,
+                            sl=trail_sl_r,
+                            tp=pos.tp,
+                            profit_R=profit_R,
+                            stage=None,
+                            risk_abs=risk,
+                            locked_R=(trail_sl_r - entry) / risk if direction == 'buy' else (entry - trail_sl_r) / risk,
+                            volume=pos.volume,
+                            note=f'trailing stop update at {profit_R:.2f}R'
+                        )
+                    except Exception:
+                        pass
+
+        # ذخیره وضعیت
+        position_states[pos.ticket] = st
+
+    metrics.update_positions(conn.symbol, profits)
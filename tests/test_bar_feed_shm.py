@@ -0,0 +1,102 @@
+"""
+Seqlock of the bar feed segment: a reader that looks at the buffer between any two
+byte stores of the writer must never get a snapshot with a torn tick or bar count.
+"""
+import os
+import struct
+import sys
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import bar_feed_shm
+from bar_feed_shm import BarFeedPublisher, BarFeedReader
+
+
+class _BytewiseStruct:
+    """struct stand-in that stores every pack_into one byte at a time and runs a hook after each byte.
+
+    The aligned 8-byte seq store stays a single store, as on the hardware the feed runs on.
+    """
+
+    def __init__(self, on_store):
+        self.on_store = on_store
+
+    def pack_into(self, fmt, buf, offset, *args):
+        data = struct.pack(fmt, *args)
+        if fmt == "<Q":
+            buf[offset:offset + len(data)] = data
+            self.on_store()
+            return
+        for i, b in enumerate(data):
+            buf[offset + i] = b
+            self.on_store()
+
+    def __getattr__(self, name):
+        return getattr(struct, name)
+
+
+def _tick(k):
+    return SimpleNamespace(time_msc=1_700_000_000_000 + k, bid=1.0 + k, ask=2.0 + k, last=3.0 + k)
+
+
+def _tick_k(snap):
+    t = snap['tick']
+    k = t['time_msc'] - 1_700_000_000_000
+    assert (t['bid'], t['ask'], t['last']) == (1.0 + k, 2.0 + k, 3.0 + k), f"torn tick {t}"
+    return k
+
+
+@pytest.fixture
+def feed():
+    symbol = f"TEST{os.getpid()}"
+    pub = BarFeedPublisher(symbol, capacity=8)
+    reader = BarFeedReader(symbol)
+    if sys.version_info < (3, 13):
+        # same process: the reader's resource_tracker.unregister also dropped the publisher's entry
+        from multiprocessing import resource_tracker
+        resource_tracker.register(pub.shm._name, "shared_memory")
+    yield pub, reader
+    reader.close()
+    pub.close()
+
+
+def test_reader_never_sees_torn_tick(feed, monkeypatch):
+    pub, reader = feed
+    pub.publish_tick(_tick(0))
+    seen = []
+
+    def check():
+        snap = reader.snapshot(max_retries=1)
+        if snap is not None:
+            seen.append(_tick_k(snap))
+
+    monkeypatch.setattr(bar_feed_shm, "struct", _BytewiseStruct(check))
+    for k in range(1, 4):
+        pub.publish_tick(_tick(k))
+    monkeypatch.undo()
+
+    assert seen and seen[-1] == 3
+    assert seen == sorted(seen)
+    assert _tick_k(reader.snapshot()) == 3
+
+
+def test_reader_never_sees_count_without_bars(feed, monkeypatch):
+    pub, reader = feed
+    index = pd.date_range("2024-01-01", periods=8, freq="min")
+    df = pd.DataFrame({c: range(1, 9) for c in ('open', 'high', 'low', 'close', 'volume')}, index=index, dtype=float)
+    pub.publish_bars(df.iloc[:2])
+
+    def check():
+        snap = reader.snapshot(max_retries=1)
+        if snap is not None:
+            bars = snap['bars']
+            assert len(bars) in (2, 5)
+            assert list(bars['close']) == list(range(1, len(bars) + 1))
+
+    monkeypatch.setattr(bar_feed_shm, "struct", _BytewiseStruct(check))
+    pub.publish_bars(df.iloc[:5])
+    monkeypatch.undo()
+
+    assert len(reader.snapshot()['bars']) == 5
@@ -0,0 +1,150 @@
+"""
+EmailNotifier against a local SMTP stand-in: one persistent session, digest batching,
+the priority drop policy of a full queue and reconnecting after the server hangs up.
+"""
+import email
+from email import policy
+import socketserver
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+try:
+    import email_config  # noqa: F401  local credentials, not part of the repo
+except ImportError:
+    _cfg = types.ModuleType("email_config")
+    _cfg.EMAIL_HOST_PASSWORD_KEY = ""
+    _cfg.EMAIL_HOST_USER_NAME = ""
+    _cfg.EMAIL_RECIPIENT_USER_NAME = ""
+    sys.modules["email_config"] = _cfg
+
+import email_notifier
+from email_notifier import EmailNotifier, _SmtpSession, _build_message
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            cmd = line.decode(errors="replace").strip().upper()
+            if cmd.startswith(("EHLO", "HELO")):
+                self.reply("250 sink")
+            elif cmd.startswith(("MAIL", "RCPT", "RSET", "NOOP")):
+                self.reply("250 OK")
+            elif cmd == "DATA":
+                self.reply("354 end with <CRLF>.<CRLF>")
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b".\r\n", b""):
+                        break
+                    data.append(chunk[1:] if chunk.startswith(b"..") else chunk)
+                server.messages.append(email.message_from_bytes(b"".join(data), policy=policy.default))
+                self.reply("250 queued")
+                if len(server.messages) == server.hang_up_at:
+                    return  # like a server closing an idle session
+            elif cmd == "QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("502 not implemented")
+
+
+class _SmtpSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _SmtpHandler)
+        self.messages = []
+        self.connections = 0
+        self.hang_up_at = None   # close the connection after this many messages
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    monkeypatch.setattr(email_notifier, "SENDER", "bot@example.com")
+    monkeypatch.setattr(email_notifier, "RECIPIENT", "ops@example.com")
+    monkeypatch.setattr(email_notifier, "PASSWORD", "")
+    server = _SmtpSink()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _notifier(sink, **cfg):
+    return EmailNotifier({'host': '127.0.0.1', 'port': sink.server_address[1], 'use_ssl': False,
+                          'timeout_sec': 5, 'max_retries': 2, **cfg})
+
+
+def _wait_for(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_session_is_reused_and_reconnects_after_hang_up(sink):
+    sink.hang_up_at = 3
+    session = _SmtpSession('127.0.0.1', sink.server_address[1], use_ssl=False, timeout=5)
+    session.send(_build_message("one", "1"))
+    session.send(_build_message("two", "2"))
+    assert session.connects == 1 and sink.connections == 1
+
+    session.send(_build_message("three", "3"))
+    session.send(_build_message("four", "4"))
+    session.close()
+
+    assert session.connects == 2 and sink.connections == 2
+    assert [m["Subject"] for m in sink.messages] == ["one", "two", "three", "four"]
+
+
+def test_messages_in_window_go_out_as_one_digest(sink):
+    notifier = _notifier(sink, batch_window_sec=30.0)
+    for n in range(3):
+        assert notifier.submit(f"status {n}", f"body {n}")
+    notifier.close()
+
+    assert len(sink.messages) == 1
+    digest = sink.messages[0]
+    assert digest["Subject"].startswith("[digest] 3 notifications")
+    assert all(f"status {n}" in digest.get_content() for n in range(3))
+    stats = notifier.stats()
+    assert (stats['sent'], stats['digests'], stats['connects']) == (3, 1, 1)
+
+
+def test_high_priority_skips_the_batch_window(sink):
+    notifier = _notifier(sink, batch_window_sec=30.0)
+    notifier.submit("ORDER FILLED - BUY EURUSD", "filled")
+    assert _wait_for(lambda: len(sink.messages) == 1)
+    assert sink.messages[0]["Subject"] == "ORDER FILLED - BUY EURUSD"
+    notifier.close()
+
+
+def test_full_queue_drops_lowest_priority_first(sink):
+    notifier = _notifier(sink, batch_window_sec=30.0, queue_size=2)
+    assert notifier.submit("status a", "a")
+    assert notifier.submit("SIGNAL SKIPPED - b", "b")
+    assert notifier.submit("status c", "c")              # evicts the skipped signal
+    assert not notifier.submit("SIGNAL SKIPPED - d", "d")  # nothing less important to evict
+    notifier.close()
+
+    assert notifier.stats()['dropped'] == 2
+    content = sink.messages[0].get_content()
+    assert "status a" in content and "status c" in content
+    assert "SIGNAL SKIPPED" not in content
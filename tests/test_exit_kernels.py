@@ -0,0 +1,68 @@
+"""
+The vectorized exit kernels must reproduce the original per-tick loop exactly:
+simulate_trade, evaluate_profile and evaluate_profile_batch against
+simulate_trade_reference on fuzzed tick paths (NaN ticks, stops on either side).
+"""
+import math
+
+import numpy as np
+import pandas as pd
+
+import exit_optimizer_core as core
+import excursion_profile as ep
+
+GRID = {
+    "scaleout_r": [None, 0.5, 1.0],
+    "scaleout_frac": [0.0, 0.5],
+    "be_trigger_r": [None, 0.2, 0.7],
+    "be_back_r": [0.0, 0.1],
+    "tp_r": [None, 1.2, 2.0],
+    "trailing_start_r": [None, 0.5, 1.5],
+    "trailing_gap_r": [0.0, 0.4, 0.7],
+}
+
+
+def _same(a, b):
+    return a == b or (isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b))
+
+
+def _trades(n_trades=24, seed=3):
+    rng = np.random.default_rng(seed)
+    for trial in range(n_trades):
+        n = int(rng.integers(1, 400))
+        mid = 1.1 + np.cumsum(rng.choice([-1, 0, 1], size=n) * 0.0001 * rng.integers(1, 4))
+        bid, ask = np.round(mid, 5), np.round(mid + 0.0002, 5)
+        if trial % 4 == 0:
+            bid[rng.integers(0, n, size=max(1, n // 10))] = np.nan
+            ask[rng.integers(0, n, size=max(1, n // 10))] = np.nan
+        ticks = pd.DataFrame({"time": pd.date_range("2025-01-01", periods=n, freq="s"), "bid": bid, "ask": ask})
+        typ = "buy" if trial % 2 else "sell"
+        entry = 1.1 + (0.0002 if typ == "sell" else 0.0)
+        dist = 0.002 * (1 if trial % 7 else -0.5)  # some stops start on the profit side
+        sl = entry - dist if typ == "buy" else entry + dist
+        yield pd.Series({"Price": entry, "S / L": sl, "Type": typ}), ticks
+
+
+def test_kernels_match_reference_loop():
+    combos = [core.ExitParams(**d) for d in core.grid_space_iter(GRID)]
+    checked = 0
+    for t, (row, ticks) in enumerate(_trades()):
+        params = combos[t % 15::15]
+        path = core.prepare_trade(row, ticks)
+        prof = ep.build_profile(path) if path is not None else None
+        batch = ep.evaluate_profile_batch(prof, core.params_array(params)) if prof is not None else None
+        for j, p in enumerate(params):
+            ref = core.simulate_trade_reference(row, ticks, p)
+            fast = core.simulate_trade(row, ticks, p)
+            assert (ref is None) == (fast is None)
+            if ref is None:
+                continue
+            prof_res = ep.evaluate_profile(prof, p)
+            for res in (fast, prof_res):
+                assert _same(res.r_total, ref.r_total), (t, p, ref, res)
+                assert (res.exit_reason, res.n_events) == (ref.exit_reason, ref.n_events), (t, p, ref, res)
+            r, code, n_events = batch[0][j], batch[1][j], batch[2][j]
+            assert _same(float(r), ref.r_total), (t, p, ref, r)
+            assert (core.EXIT_REASONS[code], int(n_events)) == (ref.exit_reason, ref.n_events), (t, p, ref)
+            checked += 1
+    assert checked > 500
@@ -0,0 +1,376 @@
+"""
+ضبط پیوسته تیک‌ها با copy_ticks_from برای بهینه‌ساز خروج (مستقل از حلقه ترید).
+
+get_live_price فقط وقتی تیک ثبت می‌کند که صدا زده شود؛ این پروسه از یک cursor
+(آخرین time_msc ذخیره شده) همه‌ی تیک‌ها را می‌کشد و در فایل‌های باینری روزانه
+با رکورد ثابت می‌نویسد:
+
+    <ticks_dir>/raw/<SYMBOL>/<SYMBOL>_<YYYY-MM-DD>.bin   رکوردهای TICK_DTYPE
+    <ticks_dir>/raw/<SYMBOL>/<SYMBOL>_<YYYY-MM-DD>.idx   (minute, offset) برای هر دقیقه
+
+بعد از بسته شدن هر روز فایل ماهانه Ticks_<SYMBOL>_<YYYY>_<MM>.csv و نسخه‌ی
+memory-map آن در ticks/store (tick_store) که load_ticks_for_window می‌خواند دوباره
+ساخته می‌شوند. زمان‌ها همان زمان سرور
+بروکر هستند (مثل ReportHistory.csv).
+
+اجرا:
+    python tick_recorder.py                       # نمادهای TICK_RECORDER_CONFIG
+    python tick_recorder.py --symbols EURUSD GBPUSD
+    python tick_recorder.py --roll EURUSD 2025-01  # فقط ساخت فایل ماهانه (بدون MT5)
+"""
+import argparse
+import glob
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import MetaTrader5 as mt5
+except ImportError:  # حالت --roll روی سیستم بدون ترمینال
+    mt5 = None
+
+from metatrader5_config import TICK_RECORDER_CONFIG
+from save_file import log
+from tick_store import month_from_frame, source_stamp, store_base, write_month
+
+TICK_DTYPE = np.dtype([
+    ('time_msc', '<i8'),   # epoch ms (زمان سرور)
+    ('bid', '<f8'),
+    ('ask', '<f8'),
+    ('last', '<f8'),
+    ('volume', '<f8'),
+    ('flags', '<u4'),
+])
+INDEX_DTYPE = np.dtype([
+    ('minute', '<i8'),     # time_msc // 60000
+    ('offset', '<i8'),     # شماره اولین رکورد آن دقیقه در .bin
+])
+MS_PER_DAY = 86_400_000
+
+
+def _day_str(time_msc: int) -> str:
+    return datetime.fromtimestamp(time_msc / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def raw_dir(ticks_dir: str, symbol: str) -> str:
+    return os.path.join(ticks_dir, 'raw', symbol)
+
+
+def daily_base(ticks_dir: str, symbol: str, day: str) -> str:
+    return os.path.join(raw_dir(ticks_dir, symbol), f"{symbol}_{day}")
+
+
+def monthly_csv_path(ticks_dir: str, symbol: str, year: int, month: int) -> str:
+    return os.path.join(ticks_dir, f"Ticks_{symbol}_{year:04d}_{month:02d}.csv")
+
+
+class DailyTickFile:
+    """فایل روزانه فقط-افزودنی؛ رکورد ناقص انتهای فایل (کرش وسط نوشتن) حذف می‌شود."""
+
+    def __init__(self, base: str):
+        self.base = base
+        self.bin_path = base + '.bin'
+        self.idx_path = base + '.idx'
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        size = os.path.getsize(self.bin_path) if os.path.exists(self.bin_path) else 0
+        self.count = size // TICK_DTYPE.itemsize
+        if size % TICK_DTYPE.itemsize:
+            with open(self.bin_path, 'r+b') as f:
+                f.truncate(self.count * TICK_DTYPE.itemsize)
+        self.last_minute = self._last_indexed_minute()
+        self._bin = open(self.bin_path, 'ab')
+        self._idx = open(self.idx_path, 'ab')
+
+    def _last_indexed_minute(self) -> Optional[int]:
+        if not os.path.exists(self.idx_path):
+            return None
+        n = os.path.getsize(self.idx_path) // INDEX_DTYPE.itemsize
+        with open(self.idx_path, 'r+b') as f:
+            f.truncate(n * INDEX_DTYPE.itemsize)
+        if n == 0:
+            return None
+        idx = np.fromfile(self.idx_path, dtype=INDEX_DTYPE)
+        # ورودی‌های index که به رکورد نوشته نشده اشاره می‌کنند کنار گذاشته می‌شوند
+        valid = idx[idx['offset'] < self.count]
+        if len(valid) != len(idx):
+            with open(self.idx_path, 'wb') as f:
+                valid.tofile(f)
+        return int(valid['minute'][-1]) if len(valid) else None
+
+    def tail(self, n: int = 1) -> np.ndarray:
+        if self.count == 0:
+            return np.empty(0, dtype=TICK_DTYPE)
+        mm = np.memmap(self.bin_path, dtype=TICK_DTYPE, mode='r', shape=(self.count,))
+        out = np.array(mm[-n:])
+        del mm
+        return out
+
+    def append(self, ticks: np.ndarray) -> None:
+        if len(ticks) == 0:
+            return
+        minutes = ticks['time_msc'] // 60000
+        starts = np.flatnonzero(np.r_[True, minutes[1:] != minutes[:-1]])
+        if self.last_minute is not None and minutes[0] == self.last_minute:
+            starts = starts[1:]
+        if len(starts):
+            entries = np.empty(len(starts), dtype=INDEX_DTYPE)
+            entries['minute'] = minutes[starts]
+            entries['offset'] = self.count + starts
+            self._bin.write(ticks.tobytes())
+            self._bin.flush()
+            self._idx.write(entries.tobytes())
+            self._idx.flush()
+            self.last_minute = int(entries['minute'][-1])
+        else:
+            self._bin.write(ticks.tobytes())
+            self._bin.flush()
+        self.count += len(ticks)
+
+    def close(self) -> None:
+        self._bin.close()
+        self._idx.close()
+
+
+def read_daily(base: str, start_msc: Optional[int] = None, end_msc: Optional[int] = None) -> np.ndarray:
+    """تیک‌های [start_msc, end_msc] یک فایل روزانه؛ index فقط دقیقه‌های لازم را memory-map می‌کند."""
+    bin_path = base + '.bin'
+    if not os.path.exists(bin_path):
+        return np.empty(0, dtype=TICK_DTYPE)
+    count = os.path.getsize(bin_path) // TICK_DTYPE.itemsize
+    if count == 0:
+        return np.empty(0, dtype=TICK_DTYPE)
+    mm = np.memmap(bin_path, dtype=TICK_DTYPE, mode='r', shape=(count,))
+    lo, hi = 0, count
+    if os.path.exists(base + '.idx'):
+        idx = np.fromfile(base + '.idx', dtype=INDEX_DTYPE)
+        idx = idx[idx['offset'] < count]
+        if len(idx):
+            if start_msc is not None:
+                i = int(np.searchsorted(idx['minute'], start_msc // 60000, side='right')) - 1
+                lo = int(idx['offset'][i]) if i >= 0 else 0
+            if end_msc is not None:
+                j = int(np.searchsorted(idx['minute'], end_msc // 60000, side='right'))
+                hi = int(idx['offset'][j]) if j < len(idx) else count
+    window = mm[lo:hi]
+    t = window['time_msc']
+    a = 0 if start_msc is None else int(np.searchsorted(t, start_msc, side='left'))
+    b = len(t) if end_msc is None else int(np.searchsorted(t, end_msc, side='right'))
+    return np.array(window[a:b])
+
+
+def roll_month(ticks_dir: str, symbol: str, year: int, month: int) -> Optional[str]:
+    """ساخت Ticks_<SYMBOL>_<YYYY>_<MM>.csv از فایل‌های روزانه (نوشتن اتمیک)."""
+    pattern = daily_base(ticks_dir, symbol, f"{year:04d}-{month:02d}-*") + '.bin'
+    bases = [p[:-4] for p in sorted(glob.glob(pattern))]
+    parts = [read_daily(b) for b in bases]
+    parts = [p for p in parts if len(p)]
+    if not parts:
+        return None
+    ticks = np.concatenate(parts)
+    df = pd.DataFrame({
+        'time': pd.to_datetime(ticks['time_msc'], unit='ms'),
+        'bid': ticks['bid'],
+        'ask': ticks['ask'],
+        'last': ticks['last'],
+        'volume': ticks['volume'],
+    })
+    out = monthly_csv_path(ticks_dir, symbol, year, month)
+    tmp = out + '.tmp'
+    df.to_csv(tmp, index=False, date_format='%Y-%m-%d %H:%M:%S.%f')
+    os.replace(tmp, out)
+    try:
+        # همان ترتیبی که parse_ticks_csv هنگام خواندن CSV می‌سازد
+        write_month(store_base(out), month_from_frame(df.sort_values('time')), source_stamp(out))
+    except OSError as e:  # store باز در بهینه‌ساز (ویندوز): در اولین خواندن دوباره ساخته می‌شود
+        log(f"⚠️ Tick store not updated for {os.path.basename(out)}: {e}", color='yellow', save_to_file=False)
+    return out
+
+
+def _to_tick_records(raw) -> np.ndarray:
+    out = np.empty(len(raw), dtype=TICK_DTYPE)
+    for name in TICK_DTYPE.names:
+        out[name] = raw[name]
+    return out
+
+
+class SymbolCursor:
+    """آخرین time_msc ذخیره شده و تعداد تیک‌های ذخیره شده با همان time_msc."""
+
+    def __init__(self, last_msc: int = 0, same_count: int = 0):
+        self.last_msc = last_msc
+        self.same_count = same_count
+
+    def dedup(self, ticks: np.ndarray) -> np.ndarray:
+        """copy_ticks_from از ثانیه cursor شروع می‌کند؛ تیک‌های تکراری حذف می‌شوند."""
+        t = ticks['time_msc']
+        lo = int(np.searchsorted(t, self.last_msc, side='left'))
+        hi = int(np.searchsorted(t, self.last_msc, side='right'))
+        return ticks[min(lo + self.same_count, hi):]
+
+    def advance(self, new: np.ndarray) -> None:
+        if len(new) == 0:
+            return
+        last = int(new['time_msc'][-1])
+        tail_equal = len(new) - int(np.searchsorted(new['time_msc'], last, side='left'))
+        if last == self.last_msc:
+            self.same_count += tail_equal
+        else:
+            self.last_msc = last
+            self.same_count = tail_equal
+
+
+class TickRecorder:
+    def __init__(self, symbols: List[str], ticks_dir: str, poll_interval: float = 0.2,
+                 batch_size: int = 100000, lookback_min: int = 10, roll_on_day_change: bool = True):
+        self.symbols = list(symbols)
+        self.ticks_dir = ticks_dir
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.lookback_min = lookback_min
+        self.roll_on_day_change = roll_on_day_change
+        self.cursors: Dict[str, SymbolCursor] = {}
+        self.files: Dict[str, DailyTickFile] = {}
+        self.days: Dict[str, str] = {}
+        self.recorded: Dict[str, int] = {s: 0 for s in self.symbols}
+        self._path = None
+
+    # ---------- Connection ----------
+    def initialize(self, path=None) -> bool:
+        self._path = path
+        ok = mt5.initialize(path) if path else mt5.initialize()
+        if not ok:
+            log(f"❌ Tick recorder: MT5 initialize failed: {mt5.last_error()}", color='red')
+            return False
+        for sym in self.symbols:
+            mt5.symbol_select(sym, True)
+        return True
+
+    def reconnect(self) -> bool:
+        mt5.shutdown()
+        delay = 1.0
+        while not self.initialize(self._path):
+            time.sleep(delay)
+            delay = min(delay * 2, 60.0)
+        log("🔌 Tick recorder reconnected", color='green', save_to_file=False)
+        return True
+
+    # ---------- Cursor ----------
+    def _recover_cursor(self, symbol: str) -> SymbolCursor:
+        bases = sorted(glob.glob(os.path.join(raw_dir(self.ticks_dir, symbol), f"{symbol}_*.bin")))
+        for bin_path in reversed(bases):
+            f = DailyTickFile(bin_path[:-4])
+            tail = f.tail(1000)
+            f.close()
+            if len(tail):
+                last = int(tail['time_msc'][-1])
+                same = len(tail) - int(np.searchsorted(tail['time_msc'], last, side='left'))
+                return SymbolCursor(last, same)
+        start = int((time.time() - self.lookback_min * 60) * 1000)
+        tick = mt5.symbol_info_tick(symbol) if mt5 else None
+        if tick and getattr(tick, 'time_msc', 0):
+            # ساعت سرور با ساعت سیستم فرق دارد؛ از زمان آخرین تیک بروکر استفاده می‌شود
+            start = int(tick.time_msc) - self.lookback_min * 60_000
+        return SymbolCursor(start, 0)
+
+    def _file_for(self, symbol: str, day: str) -> DailyTickFile:
+        prev_day = self.days.get(symbol)
+        if prev_day == day:
+            return self.files[symbol]
+        if symbol in self.files:
+            self.files[symbol].close()
+            if self.roll_on_day_change and prev_day:
+                self._roll(symbol, prev_day)
+        self.files[symbol] = DailyTickFile(daily_base(self.ticks_dir, symbol, day))
+        self.days[symbol] = day
+        return self.files[symbol]
+
+    def _roll(self, symbol: str, day: str) -> None:
+        y, m = int(day[:4]), int(day[5:7])
+        try:
+            out = roll_month(self.ticks_dir, symbol, y, m)
+            if out:
+                log(f"📦 Rolled {symbol} ticks into {out}", color='cyan', save_to_file=False)
+        except Exception as e:
+            log(f"⚠️ Monthly roll failed for {symbol} {day}: {e}", color='yellow')
+
+    # ---------- Recording ----------
+    def _write(self, symbol: str, ticks: np.ndarray) -> None:
+        days = ticks['time_msc'] // MS_PER_DAY
+        cuts = np.flatnonzero(days[1:] != days[:-1]) + 1
+        for part in np.split(ticks, cuts):
+            self._file_for(symbol, _day_str(int(part['time_msc'][0]))).append(part)
+
+    def poll_symbol(self, symbol: str) -> Optional[int]:
+        """None یعنی خطای ارتباط؛ در غیر این صورت تعداد تیک‌های جدید."""
+        cursor = self.cursors.get(symbol)
+        if cursor is None:
+            cursor = self.cursors[symbol] = self._recover_cursor(symbol)
+        total = 0
+        while True:
+            raw = mt5.copy_ticks_from(symbol, cursor.last_msc // 1000, self.batch_size, mt5.COPY_TICKS_ALL)
+            if raw is None:
+                return None
+            if len(raw) == 0:
+                break
+            ticks = cursor.dedup(_to_tick_records(raw))
+            if len(ticks):
+                self._write(symbol, ticks)
+                cursor.advance(ticks)
+                total += len(ticks)
+            if len(raw) < self.batch_size or len(ticks) == 0:
+                break
+        self.recorded[symbol] += total
+        return total
+
+    def run(self) -> None:
+        log(f"🎙️ Tick recorder: {', '.join(self.symbols)} -> {os.path.abspath(self.ticks_dir)}", color='green', save_to_file=False)
+        last_report = time.time()
+        try:
+            while True:
+                for sym in self.symbols:
+                    if self.poll_symbol(sym) is None:
+                        log(f"⚠️ copy_ticks_from failed for {sym}: {mt5.last_error()}", color='yellow')
+                        self.reconnect()
+                        break
+                if time.time() - last_report >= 300:
+                    stats = ', '.join(f"{s}={n}" for s, n in self.recorded.items())
+                    log(f"🎙️ Ticks recorded: {stats}", color='cyan', save_to_file=False)
+                    last_report = time.time()
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            log("🛑 Tick recorder stopped by user", color='yellow', save_to_file=False)
+        finally:
+            for f in self.files.values():
+                f.close()
+            mt5.shutdown()
+
+
+def main():
+    cfg = TICK_RECORDER_CONFIG
+    parser = argparse.ArgumentParser(description="Record every MT5 tick into daily binary files")
+    parser.add_argument("--symbols", nargs="+", default=cfg['symbols'])
+    parser.add_argument("--ticks-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), cfg['ticks_dir']))
+    parser.add_argument("--path", default=None, help="terminal64.exe path (optional)")
+    parser.add_argument("--roll", nargs=2, metavar=("SYMBOL", "YYYY-MM"), help="build the monthly CSV and exit")
+    args = parser.parse_args()
+
+    if args.roll:
+        sym, ym = args.roll
+        out = roll_month(args.ticks_dir, sym.upper(), int(ym[:4]), int(ym[5:7]))
+        print(f"✅ {out}" if out else f"❌ No daily files for {sym} {ym}")
+        return
+
+    rec = TickRecorder([s.upper() for s in args.symbols], args.ticks_dir, poll_interval=cfg['poll_interval'],
+                       batch_size=cfg['batch_size'], lookback_min=cfg['lookback_min'],
+                       roll_on_day_change=cfg['roll_on_day_change'])
+    if not rec.initialize(args.path):
+        return
+    rec.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+ذخیره‌ی تیک‌های ماهانه به صورت ستون‌های .npy تا بهینه‌ساز خروج به جای parse کردن
+CSV آن‌ها را memory-map کند.
+
+برای هر فایل ماهانه ticks/<NAME>.csv (یا نسخه فشرده‌ی housekeeping):
+
+    ticks/store/<NAME>.time.npy   int64 ns (زمان سرور، مرتب)
+    ticks/store/<NAME>.bid.npy    float64
+    ticks/store/<NAME>.ask.npy    float64
+    ticks/store/<NAME>.idx.npy    (minute, offset) اولین تیک هر دقیقه
+    ticks/store/<NAME>.json       اندازه و mtime فایل CSV منبع
+
+اگر CSV منبع عوض شود (tick_recorder ماه را دوباره ساخته یا housekeeping فشرده کرده)
+store در اولین خواندن دوباره ساخته می‌شود. یک پنجره زمانی با index دقیقه‌ها و دو
+searchsorted پیدا می‌شود و خروجی آن view روی memmap است (بدون کپی).
+
+اجرا:
+    python tick_store.py                    # تبدیل همه فایل‌های ماهانه پوشه ticks
+    python tick_store.py --symbols EURUSD
+"""
+import argparse
+import glob
+import json
+import os
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from housekeeping import COMPRESSED_SUFFIXES
+
+STORE_VERSION = 1
+COLUMNS = ('time', 'bid', 'ask')
+INDEX_DTYPE = np.dtype([
+    ('minute', '<i8'),     # time_ns // NS_PER_MINUTE
+    ('offset', '<i8'),     # شماره اولین تیک آن دقیقه
+])
+NS_PER_MINUTE = 60_000_000_000
+
+
+def parse_ticks_csv(path: str) -> pd.DataFrame:
+    """فایل CSV ماهانه با ستون‌های time/bid/ask، مرتب بر اساس زمان."""
+    df = pd.read_csv(path)
+    for c in ["time", "bid", "ask"]:
+        if c not in df.columns:
+            raise ValueError(f"Missing required ticks column: {c} in {path}")
+    df["time"] = pd.to_datetime(df["time"], errors="coerce")
+    df = df.dropna(subset=["time"]).copy()
+    return df.sort_values("time")
+
+
+def store_base(csv_path: str) -> str:
+    name = os.path.basename(csv_path)
+    for s in COMPRESSED_SUFFIXES:
+        if name.endswith(s):
+            name = name[:-len(s)]
+    if name.endswith('.csv'):
+        name = name[:-4]
+    return os.path.join(os.path.dirname(csv_path), 'store', name)
+
+
+def source_stamp(csv_path: str) -> dict:
+    st = os.stat(csv_path)
+    return {'version': STORE_VERSION, 'source': os.path.basename(csv_path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+@dataclass
+class MonthTicks:
+    time: np.ndarray   # int64 ns
+    bid: np.ndarray
+    ask: np.ndarray
+    idx: np.ndarray    # INDEX_DTYPE
+
+    def __len__(self) -> int:
+        return self.time.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.time.nbytes + self.bid.nbytes + self.ask.nbytes + self.idx.nbytes
+
+    def position(self, t_ns: int, side: str) -> int:
+        """np.searchsorted(self.time, t_ns, side) که فقط تیک‌های یک دقیقه را می‌خواند."""
+        n = self.time.size
+        if n == 0:
+            return 0
+        minute = t_ns // NS_PER_MINUTE
+        j = int(np.searchsorted(self.idx['minute'], minute, side='left'))
+        k = int(np.searchsorted(self.idx['minute'], minute, side='right'))
+        lo = int(self.idx['offset'][j]) if j < len(self.idx) else n
+        hi = int(self.idx['offset'][k]) if k < len(self.idx) else n
+        return lo + int(np.searchsorted(self.time[lo:hi], t_ns, side=side))
+
+    def window(self, start_ns: int, end_ns: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """تیک‌های [start_ns, end_ns] به صورت view (بدون کپی)."""
+        lo, hi = self.position(start_ns, 'left'), self.position(end_ns, 'right')
+        hi = max(hi, lo)
+        return self.time[lo:hi], self.bid[lo:hi], self.ask[lo:hi]
+
+
+def build_index(times: np.ndarray) -> np.ndarray:
+    minutes = times // NS_PER_MINUTE
+    starts = np.flatnonzero(np.r_[True, minutes[1:] != minutes[:-1]]) if times.size else np.zeros(0, dtype=np.int64)
+    idx = np.empty(len(starts), dtype=INDEX_DTYPE)
+    idx['minute'] = minutes[starts]
+    idx['offset'] = starts
+    return idx
+
+
+def month_from_frame(df: pd.DataFrame) -> MonthTicks:
+    times = df["time"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+    return MonthTicks(np.ascontiguousarray(times), df["bid"].to_numpy(dtype=np.float64),
+                      df["ask"].to_numpy(dtype=np.float64), build_index(times))
+
+
+def write_month(base: str, month: MonthTicks, stamp: dict) -> None:
+    """نوشتن اتمیک ستون‌ها؛ فایل json در آخر نوشته می‌شود تا store نیمه‌کاره معتبر دیده نشود."""
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    if os.path.exists(base + '.json'):
+        os.remove(base + '.json')
+    for col, arr in zip(COLUMNS + ('idx',), (month.time, month.bid, month.ask, month.idx)):
+        tmp = f"{base}.{col}.tmp.npy"
+        np.save(tmp, arr)
+        os.replace(tmp, f"{base}.{col}.npy")
+    with open(base + '.json.tmp', 'w', encoding='utf-8') as f:
+        json.dump({**stamp, 'n': len(month)}, f)
+    os.replace(base + '.json.tmp', base + '.json')
+
+
+def read_month(base: str) -> MonthTicks:
+    with open(base + '.json', encoding='utf-8') as f:
+        n = json.load(f)['n']
+    mode = 'r' if n else None  # آرایه خالی را نمی‌توان memory-map کرد
+    return MonthTicks(*(np.load(f"{base}.{col}.npy", mmap_mode=mode) for col in COLUMNS + ('idx',)))
+
+
+def is_fresh(base: str, stamp: dict) -> bool:
+    try:
+        with open(base + '.json', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return all(meta.get(k) == v for k, v in stamp.items())
+
+
+def open_month(csv_path: str, convert: bool = True) -> MonthTicks:
+    """
+    تیک‌های یک فایل ماهانه از store (memmap)؛ اگر store وجود ندارد یا کهنه است CSV خوانده
+    می‌شود و (با convert=True) store ساخته می‌شود.
+    """
+    base = store_base(csv_path)
+    stamp = source_stamp(csv_path)
+    if is_fresh(base, stamp):
+        try:
+            return read_month(base)
+        except (OSError, ValueError, KeyError):
+            pass  # فایل ناقص: دوباره ساخته می‌شود
+    month = month_from_frame(parse_ticks_csv(csv_path))
+    if convert:
+        try:
+            write_month(base, month, stamp)
+            return read_month(base)
+        except OSError:
+            pass  # پوشه فقط-خواندنی یا فایل باز در ویندوز: همان آرایه‌های حافظه
+    return month
+
+
+def merge_sorted(parts: List[Tuple[np.ndarray, ...]]) -> Tuple[np.ndarray, ...]:
+    """
+    ادغام k تکه مرتب (time, bid, ask) بدون sort دوباره. تکه‌های پشت سر هم (حالت معمول
+    ماه‌های متوالی) فقط به هم چسبانده می‌شوند؛ تکه‌های هم‌پوشان دو به دو با searchsorted
+    ادغام می‌شوند (در تساوی زمان، تکه قبلی اول می‌آید).
+    """
+    parts = [p for p in parts if p[0].size]
+    if not parts:
+        return np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+    if len(parts) == 1:
+        return parts[0]
+    if all(parts[i][0][-1] <= parts[i + 1][0][0] for i in range(len(parts) - 1)):
+        return tuple(np.concatenate([p[c] for p in parts]) for c in range(len(COLUMNS)))
+    merged = tuple(np.array(c) for c in parts[0])
+    for part in parts[1:]:
+        t_a, t_b = merged[0], part[0]
+        pos_b = np.searchsorted(t_a, t_b, side='right') + np.arange(t_b.size)
+        take_a = np.ones(t_a.size + t_b.size, dtype=bool)
+        take_a[pos_b] = False
+        out = []
+        for a, b in zip(merged, part):
+            col = np.empty(take_a.size, dtype=a.dtype)
+            col[take_a] = a
+            col[pos_b] = b
+            out.append(col)
+        merged = tuple(out)
+    return merged
+
+
+def monthly_csv_files(ticks_dir: str, symbols: Optional[List[str]] = None) -> List[str]:
+    files = []
+    for pattern in ('Ticks_*_????_??.csv', '*_????_??_ticks.csv'):
+        for suffix in ('',) + COMPRESSED_SUFFIXES:
+            files.extend(glob.glob(os.path.join(ticks_dir, pattern + suffix)))
+    if symbols:
+        wanted = {s.upper() for s in symbols}
+        files = [f for f in files
+                 if any(os.path.basename(f).startswith((f"Ticks_{s}_", f"{s}_")) for s in wanted)]
+    return sorted(set(files))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert monthly tick CSVs into the memory-mapped tick store")
+    parser.add_argument("--ticks-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "ticks"))
+    parser.add_argument("--symbols", nargs="*", default=None)
+    parser.add_argument("--force", action="store_true", help="rebuild even if the store is up to date")
+    args = parser.parse_args()
+
+    files = monthly_csv_files(args.ticks_dir, args.symbols)
+    if not files:
+        print(f"❌ No monthly tick files in {args.ticks_dir}")
+        return
+    for path in files:
+        base = store_base(path)
+        if not args.force and is_fresh(base, source_stamp(path)):
+            print(f"⏭️ {os.path.basename(path)} up to date")
+            continue
+        month = month_from_frame(parse_ticks_csv(path))
+        write_month(base, month, source_stamp(path))
+        print(f"✅ {os.path.basename(path)} -> {os.path.basename(base)}.*.npy ({len(month)} ticks, {month.nbytes / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
@@ -14,3 +14,13 @@ class BotState:
         self.fib0_time = None
         self.fib1_time = None
         # self.current_swing = False
+
+    def to_dict(self):
+        """کپی وضعیت برای snapshot (first/second_touch_value کندل pandas هستند)."""
+        return {k: (dict(v) if k == 'fib_levels' and v else v) for k, v in vars(self).items()}
+
+    def load_dict(self, data):
+        self.reset()
+        for k, v in data.items():
+            if hasattr(self, k):
+                setattr(self, k, v)